@@ -0,0 +1,267 @@
+"""Admission control: bounded concurrency per request class and per user.
+
+Every request except ``/health`` and ``/metrics`` is classified as *light*
+(metadata reads and small writes) or *heavy* (file content in or out, batch
+operations, folder moves, search, upload parts). Each class has its own
+global in-flight limit, so heavy work can never take the slots light
+requests need. A request over its class limit waits in a bounded FIFO queue
+for at most ``ADMISSION_QUEUE_TIMEOUT_MS``; a full queue or a timeout
+answers ``503``. A user already at their own limit for the class gets ``429``
+straight away: one client's parallel uploads are refused before they reach
+the threadpool or the SQLite writer instead of slowing down everyone else.
+
+Request bodies count against global and per-user budgets of in-flight
+upload bytes, reserved from ``Content-Length`` when the request arrives
+(bytes beyond it are counted as they stream in). A body larger than a
+budget is still admitted while nothing else is in flight. Every rejection
+carries ``Retry-After``.
+
+Users are identified by the user id in a valid bearer token (verified once
+per token, without a database lookup); other requests by client address.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Dict, Optional, Tuple
+
+from app.auth import token_subject
+from app.metrics import Counter, Histogram
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "1").lower() in ("1", "true", "yes")
+ADMISSION_LIGHT_LIMIT = int(os.getenv("ADMISSION_LIGHT_LIMIT", "128"))
+ADMISSION_HEAVY_LIMIT = int(os.getenv("ADMISSION_HEAVY_LIMIT", "16"))
+ADMISSION_USER_LIGHT_LIMIT = int(os.getenv("ADMISSION_USER_LIGHT_LIMIT", "32"))
+ADMISSION_USER_HEAVY_LIMIT = int(os.getenv("ADMISSION_USER_HEAVY_LIMIT", "4"))
+ADMISSION_LIGHT_QUEUE = int(os.getenv("ADMISSION_LIGHT_QUEUE", "256"))
+ADMISSION_HEAVY_QUEUE = int(os.getenv("ADMISSION_HEAVY_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "2000")) / 1000
+ADMISSION_UPLOAD_BYTES = int(os.getenv("ADMISSION_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+ADMISSION_USER_UPLOAD_BYTES = int(os.getenv("ADMISSION_USER_UPLOAD_BYTES", str(256 * 1024 * 1024)))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+LIGHT = "light"
+HEAVY = "heavy"
+
+EXEMPT_PATHS = frozenset(["/health", "/metrics"])
+
+# (method, path) of routes that move file content or touch whole subtrees
+HEAVY_ROUTES = [
+    (method, re.compile(pattern))
+    for method, pattern in [
+        ("POST", r"/files(/upload)?/?"),
+        ("POST", r"/files/batch/[^/]+"),
+        ("GET", r"/files/\d+/(download|content)"),
+        ("PUT", r"/uploads/[^/]+/parts/\d+"),
+        ("POST", r"/uploads/[^/]+/complete"),
+        ("POST", r"/folders/\d+/move"),
+        ("GET", r"/search/?"),
+        ("GET", r"/admin/.*"),
+    ]
+]
+
+ADMISSION_REJECTED = Counter(
+    "http_admission_rejected_total", "Requests refused by admission control.", ("class", "reason")
+)
+ADMISSION_WAIT = Histogram(
+    "http_admission_wait_seconds", "Time admitted requests queued for a slot.", ("class",)
+)
+
+
+def classify(method: str, path: str) -> str:
+    for route_method, pattern in HEAVY_ROUTES:
+        if method == route_method and pattern.fullmatch(path):
+            return HEAVY
+    return LIGHT
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, detail: str, reason: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.reason = reason
+
+
+class RequestClass:
+    """Global slots for one class, with a bounded queue of waiting requests."""
+
+    def __init__(self, name: str, limit: int, max_queue: int, user_limit: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.user_limit = user_limit
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.queued = 0
+
+    async def acquire(self, timeout: float) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked():
+            if self.queued >= self.max_queue:
+                raise Rejected(503, "Server busy, try again later", "queue_full")
+            start = time.perf_counter()
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise Rejected(503, "Server busy, try again later", "queue_timeout")
+            finally:
+                self.queued -= 1
+            ADMISSION_WAIT.observe(time.perf_counter() - start, self.name)
+        else:
+            await self._semaphore.acquire()
+            ADMISSION_WAIT.observe(0.0, self.name)
+        self.running += 1
+
+    def release(self) -> None:
+        self.running -= 1
+        self._semaphore.release()
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        light: Tuple[int, int, int] = (ADMISSION_LIGHT_LIMIT, ADMISSION_LIGHT_QUEUE, ADMISSION_USER_LIGHT_LIMIT),
+        heavy: Tuple[int, int, int] = (ADMISSION_HEAVY_LIMIT, ADMISSION_HEAVY_QUEUE, ADMISSION_USER_HEAVY_LIMIT),
+        upload_bytes: int = ADMISSION_UPLOAD_BYTES,
+        user_upload_bytes: int = ADMISSION_USER_UPLOAD_BYTES,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self.classes = {LIGHT: RequestClass(LIGHT, *light), HEAVY: RequestClass(HEAVY, *heavy)}
+        self.upload_bytes = upload_bytes
+        self.user_upload_bytes = user_upload_bytes
+        self.queue_timeout = queue_timeout
+        self.bytes_in_flight = 0
+        # per client: in-flight requests per class and upload bytes; dropped when idle
+        self._clients: Dict[str, Dict[str, int]] = {}
+
+    async def admit(self, kind: str, client: str, body_bytes: int) -> None:
+        """Reserve a slot and ``body_bytes`` for ``client`` or raise ``Rejected``."""
+        request_class = self.classes[kind]
+        usage = self._clients.get(client) or {LIGHT: 0, HEAVY: 0, "bytes": 0}
+        if usage[kind] >= request_class.user_limit:
+            raise Rejected(429, "Too many concurrent requests", "user_limit")
+        if body_bytes and usage["bytes"] and usage["bytes"] + body_bytes > self.user_upload_bytes:
+            raise Rejected(429, "Too many uploads in progress", "user_bytes")
+        if body_bytes and self.bytes_in_flight and self.bytes_in_flight + body_bytes > self.upload_bytes:
+            raise Rejected(503, "Server busy with uploads, try again later", "upload_bytes")
+        self._clients[client] = usage
+        usage[kind] += 1
+        self.add_bytes(client, body_bytes)
+        try:
+            await request_class.acquire(self.queue_timeout)
+        except BaseException:
+            self._finish(kind, client, body_bytes)
+            raise
+
+    def add_bytes(self, client: str, amount: int) -> None:
+        self._clients[client]["bytes"] += amount
+        self.bytes_in_flight += amount
+
+    def release(self, kind: str, client: str, body_bytes: int) -> None:
+        self.classes[kind].release()
+        self._finish(kind, client, body_bytes)
+
+    def _finish(self, kind: str, client: str, body_bytes: int) -> None:
+        usage = self._clients[client]
+        usage[kind] -= 1
+        usage["bytes"] -= body_bytes
+        self.bytes_in_flight -= body_bytes
+        if not any(usage.values()):
+            del self._clients[client]
+
+    def in_flight(self) -> int:
+        """Requests admitted or waiting for a slot, across both classes."""
+        return sum(cls.running + cls.queued for cls in self.classes.values())
+
+    def stats(self) -> dict:
+        stats = {"upload_bytes": self.bytes_in_flight, "clients": len(self._clients)}
+        for name, request_class in self.classes.items():
+            stats[f"{name}_running"] = request_class.running
+            stats[f"{name}_queued"] = request_class.queued
+        return stats
+
+
+admission = AdmissionController()
+
+
+def _client_key(scope) -> str:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            user_id = token_subject(value.decode("latin-1"))
+            if user_id is not None:
+                return f"user:{user_id}"
+            break
+    client = scope.get("client")
+    return f"addr:{client[0]}" if client else "addr:unknown"
+
+
+def _has_header(scope, header: bytes) -> bool:
+    return any(name == header for name, _ in scope.get("headers", ()))
+
+
+def _content_length(scope) -> int:
+    for name, value in scope.get("headers", ()):
+        if name == b"content-length":
+            try:
+                return max(int(value), 0)
+            except ValueError:
+                return 0
+    return 0
+
+
+async def _reject(send, rejected: Rejected, has_body: bool) -> None:
+    body = json.dumps({"detail": rejected.detail}).encode()
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(ADMISSION_RETRY_AFTER).encode()),
+    ]
+    if has_body:
+        # closing the connection spares the server reading an upload it refused
+        headers.append((b"connection", b"close"))
+    await send({"type": "http.response.start", "status": rejected.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying ``admission`` to every HTTP request."""
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        kind = classify(scope["method"], scope["path"])
+        client = _client_key(scope)
+        reserved = _content_length(scope)
+        try:
+            await self.controller.admit(kind, client, reserved)
+        except Rejected as rejected:
+            ADMISSION_REJECTED.inc(kind, rejected.reason)
+            await _reject(send, rejected, reserved > 0 or _has_header(scope, b"transfer-encoding"))
+            return
+        received = 0
+
+        async def receive_counted():
+            # chunked bodies (or lying Content-Length) are accounted as they arrive
+            nonlocal received, reserved
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > reserved:
+                    self.controller.add_bytes(client, received - reserved)
+                    reserved = received
+            return message
+
+        try:
+            await self.app(scope, receive_counted, send)
+        finally:
+            self.controller.release(kind, client, reserved)
@@ -1,24 +1,117 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
 import os
+import secrets
+import threading
+import time
 
-import sqlite3
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 
-from app.database import get_db
+from app.database import get_async_db
+from app.tracing import span
 
 # Config
 SECRET_KEY = os.getenv("JWT_SECRET", "devsecret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # empty disables the /admin endpoints
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
+class PrincipalCache:
+    """
+    Bounded LRU cache of authenticated principals keyed by bearer token.
+    Entries expire after ``ttl`` seconds or when the token itself expires,
+    whichever comes first.
+    """
+
+    def __init__(self, max_size: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, Tuple[float, dict]] = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+    def put(self, token: str, user: dict, token_exp: Optional[float] = None) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (expires_at, user)
+            self._tokens_by_user.setdefault(user["id"], set()).add(token)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop every cached principal for ``user_id`` (call after changing or deleting a user)."""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, token: str) -> None:
+        _, user = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(user["id"])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user["id"]]
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidate_user(user_id: int) -> None:
+    principal_cache.invalidate_user(user_id)
+
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -41,19 +134,46 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_user_by_email(email: str):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, email, password_hash FROM users WHERE email = ?", (email,))
-        row = cursor.fetchone()
-        return row
+async def get_user_by_email(email: str):
+    async with get_async_db() as db:
+        return await db.fetchone("SELECT id, email, password_hash FROM users WHERE email = ?", (email,))
+
 
+async def get_user_by_id(user_id: int):
+    async with get_async_db() as db:
+        return await db.fetchone("SELECT id, email FROM users WHERE id = ?", (user_id,))
 
-def get_user_by_id(user_id: int):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, email FROM users WHERE id = ?", (user_id,))
-        return cursor.fetchone()
+
+# Verified token -> (exp, user id), so that token_subject decodes each token once
+_subjects: OrderedDict[str, Tuple[float, int]] = OrderedDict()
+_subjects_lock = threading.Lock()
+
+
+def token_subject(authorization: Optional[str]) -> Optional[int]:
+    """User id of a valid ``Authorization: Bearer`` value, else None (no database lookup)."""
+    scheme, _, token = (authorization or "").partition(" ")
+    token = token.strip()
+    if scheme.lower() != "bearer" or not token:
+        return None
+    now = time.time()
+    with _subjects_lock:
+        entry = _subjects.get(token)
+        if entry is not None and entry[0] > now:
+            _subjects.move_to_end(token)
+            return entry[1]
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = int(payload.get("sub"))
+        expires_at = float(payload.get("exp") or now + AUTH_CACHE_TTL)
+    except (JWTError, TypeError, ValueError):
+        return None
+    if AUTH_CACHE_SIZE > 0:
+        with _subjects_lock:
+            _subjects[token] = (expires_at, user_id)
+            _subjects.move_to_end(token)
+            while len(_subjects) > AUTH_CACHE_SIZE:
+                _subjects.popitem(last=False)
+    return user_id
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
@@ -62,21 +182,29 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # sanitize token (remove accidental whitespace/newlines)
+    token_clean = token.replace("\n", "").replace("\r", "").strip()
+    user = principal_cache.get(token_clean)
+    if user is not None:
+        return user
     try:
-        # sanitize token (remove accidental whitespace/newlines)
-        token_clean = token.replace("\n", "").replace("\r", "").strip()
-        print(f"DEBUG: token length={len(token)} cleaned_length={len(token_clean)}")
-        payload = jwt.decode(token_clean, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"DEBUG: jwt payload={payload}")
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            print("DEBUG: token missing 'sub' claim")
-            raise credentials_exception
-    except JWTError:
-        import traceback
-        print("DEBUG: JWT decode failed:\n" + traceback.format_exc())
+        with span("auth.decode"):
+            payload = jwt.decode(token_clean, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = int(payload.get("sub"))
+    except (JWTError, TypeError, ValueError):
         raise credentials_exception
-    user = get_user_by_id(user_id)
-    if user is None:
+    with span("auth.user_lookup"):
+        row = await get_user_by_id(user_id)
+    if row is None:
         raise credentials_exception
+    user = {"id": row["id"], "email": row["email"]}
+    principal_cache.put(token_clean, user, payload.get("exp"))
     return user
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Guard for operator endpoints: the ``X-Admin-Token`` header must equal ``ADMIN_TOKEN``."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
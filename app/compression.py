@@ -0,0 +1,163 @@
+"""Storage codecs for blob content.
+
+Blobs are compressed on write with a codec picked from the file's MIME type
+(``MIME_POLICY``): text-like formats compress well, while media and archive
+formats, or content whose leading bytes look like one, are stored as-is. Types
+with no policy are probed by compressing a sample. A compressed result is only
+kept if it saves at least ``1 - STORAGE_COMPRESSION_MAX_RATIO`` of the size.
+
+Only stdlib codecs are used (zlib, lzma). The codec is recorded per blob in
+``blobs.codec`` (migration 009), and ``DecodingReader`` decompresses while
+streaming, with bounded output per read.
+"""
+
+import lzma
+import os
+import zlib
+from typing import Optional, Tuple
+
+IDENTITY = "identity"
+ZLIB = "zlib"
+LZMA = "lzma"
+
+STORAGE_COMPRESSION = os.getenv("STORAGE_COMPRESSION", "1").lower() in ("1", "true", "yes")
+STORAGE_COMPRESSION_MIN_SIZE = int(os.getenv("STORAGE_COMPRESSION_MIN_SIZE", "512"))
+STORAGE_COMPRESSION_MAX_RATIO = float(os.getenv("STORAGE_COMPRESSION_MAX_RATIO", "0.9"))
+
+PROBE_SIZE = 64 * 1024
+
+# (MIME type or prefix ending in "/", codec, level); first match wins
+MIME_POLICY = [
+    ("image/svg+xml", ZLIB, 9),
+    ("text/", ZLIB, 6),
+    ("application/json", ZLIB, 6),
+    ("application/x-ndjson", ZLIB, 6),
+    ("application/xml", ZLIB, 6),
+    ("application/javascript", ZLIB, 6),
+    ("application/sql", ZLIB, 6),
+    ("application/x-sh", ZLIB, 6),
+    ("application/x-yaml", ZLIB, 6),
+    ("application/x-tar", LZMA, 6),
+    ("application/x-sqlite3", LZMA, 6),
+    ("image/bmp", ZLIB, 6),
+    ("image/tiff", ZLIB, 6),
+    ("audio/x-wav", ZLIB, 6),
+]
+
+# Already compressed; never worth another pass
+INCOMPRESSIBLE_TYPES = (
+    "image/", "video/", "audio/", "font/woff",
+    "application/zip", "application/gzip", "application/x-gzip", "application/x-bzip2",
+    "application/x-xz", "application/x-7z-compressed", "application/x-rar-compressed",
+    "application/vnd.rar", "application/zstd", "application/pdf", "application/epub+zip",
+    "application/java-archive", "application/vnd.openxmlformats-officedocument.",
+    "application/vnd.oasis.opendocument.",
+)
+
+COMPRESSED_MAGIC = (
+    b"\x1f\x8b",  # gzip
+    b"PK\x03\x04",  # zip, docx, xlsx, jar, ...
+    b"\x89PNG",
+    b"\xff\xd8\xff",  # jpeg
+    b"GIF8",
+    b"\xfd7zXZ\x00",  # xz
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"BZh",
+    b"7z\xbc\xaf\x27\x1c",
+    b"Rar!",
+    b"OggS",
+    b"fLaC",
+    b"%PDF",
+)
+
+
+def _policy(mime_type: Optional[str]) -> Optional[Tuple[str, int]]:
+    """``(codec, level)``, ``(IDENTITY, 0)`` for known-incompressible types, None if unknown."""
+    if mime_type:
+        for pattern, codec, level in MIME_POLICY:
+            if mime_type == pattern or (pattern.endswith("/") and mime_type.startswith(pattern)):
+                return codec, level
+        if mime_type.startswith(INCOMPRESSIBLE_TYPES):
+            return IDENTITY, 0
+    return None
+
+
+def choose_codec(mime_type: Optional[str], size: int, head: bytes) -> Tuple[str, int]:
+    """Pick ``(codec, level)`` for content of ``size`` bytes starting with ``head``."""
+    if not STORAGE_COMPRESSION or size < STORAGE_COMPRESSION_MIN_SIZE or head.startswith(COMPRESSED_MAGIC):
+        return IDENTITY, 0
+    policy = _policy(mime_type)
+    if policy is not None:
+        return policy
+    # unknown type: only compress if a fast pass over a sample pays off
+    sample = head[:PROBE_SIZE]
+    if len(zlib.compress(sample, 1)) <= len(sample) * STORAGE_COMPRESSION_MAX_RATIO:
+        return ZLIB, 6
+    return IDENTITY, 0
+
+
+def make_compressor(codec: str, level: int):
+    if codec == ZLIB:
+        return zlib.compressobj(level)
+    if codec == LZMA:
+        return lzma.LZMACompressor(preset=level)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == IDENTITY:
+        return data
+    if codec == ZLIB:
+        return zlib.decompress(data)
+    if codec == LZMA:
+        return lzma.decompress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def worth_keeping(stored_size: int, size: int) -> bool:
+    return stored_size <= size * STORAGE_COMPRESSION_MAX_RATIO
+
+
+class DecodingReader:
+    """File-like reader that decompresses ``raw`` (anything with ``read(n)``) on the fly.
+
+    ``read(size)`` returns at most ``size`` decoded bytes, so highly
+    compressible content never expands into memory all at once.
+    """
+
+    def __init__(self, raw, codec: str, read_size: int = 1024 * 1024):
+        self._raw = raw
+        self._codec = codec
+        self._read_size = read_size
+        self._pending = b""
+        self._raw_eof = False
+        if codec == ZLIB:
+            self._decoder = zlib.decompressobj()
+        elif codec == LZMA:
+            self._decoder = lzma.LZMADecompressor()
+        else:
+            raise ValueError(f"Unknown codec: {codec}")
+
+    def _decode(self, size: int) -> bytes:
+        decoder = self._decoder
+        if self._codec == ZLIB:
+            data = decoder.unconsumed_tail + self._pending
+            self._pending = b""
+            if not data:
+                return decoder.flush() if self._raw_eof else b""
+            return decoder.decompress(data, size)
+        if decoder.eof:
+            return b""
+        if self._pending or not decoder.needs_input:
+            data, self._pending = self._pending, b""
+            return decoder.decompress(data, size)
+        return b""
+
+    def read(self, size: int) -> bytes:
+        while True:
+            out = self._decode(size)
+            if out or self._raw_eof:
+                return out
+            self._pending = self._raw.read(self._read_size)
+            if not self._pending:
+                self._raw_eof = True
@@ -0,0 +1,46 @@
+"""ETag helpers for conditional GET requests.
+
+ETags are strong validators built from data that is already on the row being
+looked up: the content SHA-256 for raw downloads, or the trigger-maintained
+``version`` / ``listing_version`` counters (migration 008) for metadata and
+listings. Handlers compute them before touching blobs or child rows, so a
+matching ``If-None-Match`` is answered with ``304`` from a single indexed
+lookup.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+
+# Authenticated responses: cacheable by the client only, revalidated every time
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Opaque strong ETag for the given version-identifying parts."""
+    digest = hashlib.blake2b("|".join(str(part) for part in parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as RFC 9110 prescribes for ``If-None-Match``."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def etag_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
@@ -1,27 +1,522 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
 import os
 import sqlite3
-from contextlib import contextmanager
-from typing import Generator
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, List, Optional, Tuple
+
+from app.metrics import DB_ACQUIRE, DB_BUSY, DB_COMMITS, DB_LOCK_WAIT, DB_ROWS, DB_STATEMENT, METRICS_ENABLED, statement_kind
+from app.tracing import TRACING_ENABLED, record_sql
 
 DATABASE_PATH = os.getenv("DATABASE_PATH", "app.db")
 
+# Sharding: with DB_SHARDS > 1, DATABASE_PATH is a catalog holding ``users``
+# (and ``items``), and each user's folders, files and blobs live in one of
+# DB_SHARDS shard files chosen by a hash of the user id. Every database gets
+# the full schema. The shard count cannot change once data has been written.
+DB_SHARDS = max(1, int(os.getenv("DB_SHARDS", "1")))
+DB_SHARD_PATH = os.getenv("DB_SHARD_PATH", "{root}-shard{n}{ext}")  # {root}/{ext} split from DATABASE_PATH
+
+# Pool / connection tuning
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-16000"))  # negative = KiB
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(128 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Dedicated executors for async access (see get_async_db)
+DB_READ_WORKERS = int(os.getenv("DB_READ_WORKERS", "12"))
+DB_WRITE_WORKERS = int(os.getenv("DB_WRITE_WORKERS", str(max(4, DB_SHARDS))))
+
+
+def shard_path(shard: int) -> str:
+    if DB_SHARDS == 1:
+        return DATABASE_PATH
+    root, ext = os.path.splitext(DATABASE_PATH)
+    return DB_SHARD_PATH.format(root=root, ext=ext, n=shard)
+
+
+def shard_paths() -> List[str]:
+    return [shard_path(n) for n in range(DB_SHARDS)]
+
+
+def all_database_paths() -> List[str]:
+    """The catalog followed by every shard (just ``DATABASE_PATH`` when unsharded)."""
+    return list(dict.fromkeys([DATABASE_PATH, *shard_paths()]))
+
+
+def shard_for(user_id: int) -> int:
+    """Shard holding ``user_id``'s data; stable across processes and restarts."""
+    if DB_SHARDS == 1:
+        return 0
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % DB_SHARDS
+
+
+def database_path(user_id: Optional[int] = None, shard: Optional[int] = None) -> str:
+    """Path of the catalog, or of the shard for ``user_id`` (or shard index ``shard``)."""
+    if user_id is not None:
+        shard = shard_for(user_id)
+    return DATABASE_PATH if shard is None else shard_path(shard)
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor recording statement time, rows fetched and busy errors (app.metrics)
+    and a span per statement (app.tracing)."""
+
+    _statement = "other"
+
+    def execute(self, sql, parameters=()):
+        self._statement = statement_kind(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.OperationalError as exc:
+            if "locked" in str(exc) or "busy" in str(exc):
+                DB_BUSY.inc(self._statement)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_STATEMENT.observe(elapsed, self._statement)
+            record_sql(sql, start, elapsed)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._statement = statement_kind(sql)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.OperationalError as exc:
+            if "locked" in str(exc) or "busy" in str(exc):
+                DB_BUSY.inc(self._statement)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_STATEMENT.observe(elapsed, self._statement)
+            record_sql(sql, start, elapsed)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            DB_ROWS.inc(self._statement)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        if rows:
+            DB_ROWS.inc(self._statement, amount=len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if rows:
+            DB_ROWS.inc(self._statement, amount=len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        DB_ROWS.inc(self._statement)
+        return row
+
 
-def get_connection() -> sqlite3.Connection:
-    """Create a new database connection."""
-    conn = sqlite3.connect(DATABASE_PATH)
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including ``execute`` shortcuts, are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def get_connection(path: Optional[str] = None) -> sqlite3.Connection:
+    """Create a new connection to ``path`` (default: the catalog)."""
+    conn = sqlite3.connect(
+        path or DATABASE_PATH,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        factory=InstrumentedConnection if METRICS_ENABLED or TRACING_ENABLED else sqlite3.Connection,
+    )
     conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
+    # Applied once per physical connection; pooled connections keep them.
+    conn.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
     return conn
 
 
+class ConnectionPool:
+    """Bounded pool of reusable SQLite connections.
+
+    Connections are opened lazily up to ``max_size`` and handed out LIFO, so a
+    threadpool worker that releases a connection usually gets the same (warm)
+    one back on its next request. Callers block for at most ``timeout``
+    seconds when every connection is checked out.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT):
+        self.path = path or DATABASE_PATH
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle: List[sqlite3.Connection] = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        # metrics
+        self.acquired = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def acquire(self) -> sqlite3.Connection:
+        start = time.perf_counter()
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._size >= self.max_size:
+                        raise PoolTimeout("Timed out waiting for a database connection")
+            self.acquired += 1
+            if waited:
+                elapsed = time.perf_counter() - start
+                self.waits += 1
+                self.wait_time_total += elapsed
+                self.wait_time_max = max(self.wait_time_max, elapsed)
+        if conn is None:
+            try:
+                conn = get_connection(self.path)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False) -> None:
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Close idle connections and refuse new checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._size -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_max": self.wait_time_max,
+            }
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pool_lock = threading.Lock()
+
+
+def get_pool(path: Optional[str] = None) -> ConnectionPool:
+    """Return the process-wide pool for ``path`` (default: the catalog), creating it on first use."""
+    path = path or DATABASE_PATH
+    pool = _pools.get(path)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+def close_pool() -> None:
+    """Close every pool (called on application shutdown)."""
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def pool_stats() -> dict:
+    """Stats summed over the catalog and shard pools."""
+    get_pool()
+    with _pool_lock:
+        pools = list(_pools.values())
+    total: dict = {}
+    for stats in (pool.stats() for pool in pools):
+        for key, value in stats.items():
+            total[key] = max(total.get(key, 0), value) if key == "wait_time_max" else total.get(key, 0) + value
+    return total
+
+
 @contextmanager
-def get_db() -> Generator[sqlite3.Connection, None, None]:
-    """Context manager for database connections."""
-    conn = get_connection()
+def get_db(user_id: Optional[int] = None, shard: Optional[int] = None) -> Generator[sqlite3.Connection, None, None]:
+    """Context manager for pooled connections to the catalog, or to ``user_id``'s shard."""
+    pool = get_pool(database_path(user_id, shard))
+    start = time.perf_counter()
+    conn = pool.acquire()
+    _record_wait("sync", time.perf_counter() - start)
+    discard = False
     try:
         yield conn
-        conn.commit()
+        _commit(conn)
     except Exception:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            discard = True
         raise
     finally:
-        conn.close()
+        if not discard and conn.in_transaction:
+            # e.g. cancelled mid-request; never hand out a dirty connection
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        pool.release(conn, discard=discard)
+
+
+# Per-request accounting of time spent waiting for the database, reported by
+# app.server_timing. Holds a dict while a request is being timed, else None.
+_request_timing: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "db_request_timing", default=None
+)
+
+
+def begin_request_timing() -> Tuple[contextvars.Token, Dict[str, float]]:
+    """Start accounting for the current request; returns ``(token, timings)``."""
+    timing = {"db_wait": 0.0, "db_lock": 0.0}
+    return _request_timing.set(timing), timing
+
+
+def end_request_timing(token: contextvars.Token) -> None:
+    _request_timing.reset(token)
+
+
+def _add_timing(key: str, seconds: float) -> None:
+    timing = _request_timing.get()
+    if timing is not None:
+        timing[key] = timing.get(key, 0.0) + seconds
+
+
+def _record_wait(mode: str, seconds: float) -> None:
+    """Account connection acquisition time to the request and to metrics."""
+    _add_timing("db_wait", seconds)
+    DB_ACQUIRE.observe(seconds, mode)
+
+
+def _record_lock_wait(stage: str, seconds: float) -> None:
+    _add_timing("db_lock", seconds)
+    DB_LOCK_WAIT.observe(seconds, stage)
+
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(write: bool = False) -> ThreadPoolExecutor:
+    """Return the reader or writer executor, creating it on first use."""
+    kind = "write" if write else "read"
+    executor = _executors.get(kind)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(kind)
+            if executor is None:
+                workers = DB_WRITE_WORKERS if write else DB_READ_WORKERS
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"db-{kind}")
+                _executors[kind] = executor
+    return executor
+
+
+def shutdown_executors() -> None:
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=True)
+        _executors.clear()
+
+
+async def run_in_executor(executor: ThreadPoolExecutor, fn: Callable, *args, **kwargs) -> Any:
+    """Run ``fn`` on ``executor``, carrying over the caller's context variables."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+class AsyncConnection:
+    """
+    Awaitable wrapper around a pooled connection.
+    Every call that touches SQLite runs on the executor the connection was
+    opened with; cursor attributes such as ``lastrowid`` and ``rowcount`` can
+    be read directly from the returned cursor.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, executor: ThreadPoolExecutor):
+        self.connection = conn
+        self._executor = executor
+
+    def cursor(self) -> sqlite3.Cursor:
+        return self.connection.cursor()
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking helper (e.g. one taking a cursor) on the executor."""
+        return await run_in_executor(self._executor, fn, *args, **kwargs)
+
+    async def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return await self.run(self.connection.execute, sql, params)
+
+    async def executemany(self, sql: str, seq_of_params) -> sqlite3.Cursor:
+        return await self.run(self.connection.executemany, sql, seq_of_params)
+
+    async def fetchone(self, sql: str, params=()) -> Optional[sqlite3.Row]:
+        return await self.run(lambda: self.connection.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params=()) -> List[sqlite3.Row]:
+        return await self.run(lambda: self.connection.execute(sql, params).fetchall())
+
+
+def _commit(conn: sqlite3.Connection) -> None:
+    if conn.in_transaction:
+        conn.commit()
+        DB_COMMITS.inc()
+
+
+def _finish(pool: ConnectionPool, conn: sqlite3.Connection, commit: bool) -> None:
+    discard = False
+    try:
+        if commit:
+            _commit(conn)
+    finally:
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        pool.release(conn, discard=discard)
+
+
+def _checkout(pool: ConnectionPool, write: bool) -> sqlite3.Connection:
+    conn = pool.acquire()
+    if write:
+        # Take the writer lock up front: the wait is measurable here, and a
+        # read-then-write transaction cannot fail later with SQLITE_BUSY_SNAPSHOT.
+        start = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            pool.release(conn)
+            raise
+        finally:
+            _record_lock_wait("begin", time.perf_counter() - start)
+    return conn
+
+
+def _release_abandoned(pool: ConnectionPool) -> Callable:
+    def callback(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            _finish(pool, future.result(), False)
+    return callback
+
+
+_write_locks: Dict[str, asyncio.Lock] = {}
+_write_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_write_lock(path: str) -> asyncio.Lock:
+    """Per-event-loop lock serializing this process's write transactions on ``path``."""
+    global _write_lock_loop
+    loop = asyncio.get_running_loop()
+    if _write_lock_loop is not loop:
+        _write_locks.clear()
+        _write_lock_loop = loop
+    lock = _write_locks.get(path)
+    if lock is None:
+        lock = _write_locks[path] = asyncio.Lock()
+    return lock
+
+
+def write_in_progress(path: str) -> bool:
+    """True while a write transaction of this process holds or is queued for ``path``."""
+    return _get_write_lock(path).locked()
+
+
+@asynccontextmanager
+async def get_async_db(
+    write: bool = False, user_id: Optional[int] = None, shard: Optional[int] = None
+) -> AsyncGenerator[AsyncConnection, None]:
+    """
+    Async counterpart of ``get_db``.
+    Work runs on a dedicated reader or writer executor (``DB_READ_WORKERS`` /
+    ``DB_WRITE_WORKERS``) instead of Starlette's shared threadpool; pass
+    ``write=True`` for transactions that modify data; those are serialized
+    per process and database and start with ``BEGIN IMMEDIATE``. Pass the
+    owner's ``user_id`` for folder, file and upload data; without it (and
+    without a ``shard`` index) the connection is to the catalog.
+    """
+    pool = get_pool(database_path(user_id, shard))
+    executor = get_executor(write)
+    # SQLite admits one writer at a time. Queue writers on the event loop so
+    # that executor threads never sit in BEGIN IMMEDIATE's busy handler while
+    # the transaction holding the lock waits for a free thread.
+    write_lock = _get_write_lock(pool.path) if write else None
+    if write_lock is not None:
+        start = time.perf_counter()
+        await write_lock.acquire()
+        _record_lock_wait("queue", time.perf_counter() - start)
+    try:
+        start = time.perf_counter()
+        acquiring = asyncio.ensure_future(run_in_executor(executor, _checkout, pool, write))
+        try:
+            conn = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(_release_abandoned(pool))
+            raise
+        finally:
+            _record_wait("write" if write else "read", time.perf_counter() - start)
+        try:
+            yield AsyncConnection(conn, executor)
+        except BaseException:
+            # shield: a cancelled request must still roll back and return the connection
+            await asyncio.shield(run_in_executor(executor, _finish, pool, conn, False))
+            raise
+        else:
+            await asyncio.shield(run_in_executor(executor, _finish, pool, conn, True))
+    finally:
+        if write_lock is not None:
+            write_lock.release()
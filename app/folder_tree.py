@@ -0,0 +1,173 @@
+"""Folder hierarchy queries backed by the ``folder_closure`` table.
+
+Every folder has one closure row per ancestor (including itself at depth 0),
+maintained by triggers on ``folders`` (see migration 005), so subtree and
+ancestor lookups are single indexed statements regardless of tree depth.
+
+Folders also carry recursive aggregates (``total_size``, ``file_count``,
+``folder_count``) kept current by triggers (see migration 011);
+``recompute_aggregates`` rebuilds them from scratch.
+
+Deleting a folder only tombstones it (``deleted_at``, migration 013); the
+``live_folders`` and ``live_files`` views hide everything below a tombstone
+until ``purge_batch`` has removed it, a bounded batch at a time.
+"""
+
+import json
+import sqlite3
+from typing import List, Tuple
+
+
+def get_ancestors(cursor: sqlite3.Cursor, folder_id: int, user_id: int) -> List[dict]:
+    """Return the path from the root down to ``folder_id`` (inclusive), ``user_id``'s folders only."""
+    cursor.execute(
+        "SELECT f.id, f.name FROM folder_closure c JOIN folders f ON f.id = c.ancestor_id "
+        "WHERE c.descendant_id = ? AND f.user_id = ? ORDER BY c.depth DESC",
+        (folder_id, user_id),
+    )
+    return [{"id": r["id"], "name": r["name"]} for r in cursor.fetchall()]
+
+
+def get_path_versions(cursor: sqlite3.Cursor, folder_id: int, user_id: int) -> List[Tuple[int, int]]:
+    """Return ``(id, version)`` for ``folder_id`` and each of its ancestors owned by ``user_id``.
+
+    Any rename or move along the path changes one of these versions.
+    """
+    cursor.execute(
+        "SELECT f.id, f.version FROM folder_closure c JOIN folders f ON f.id = c.ancestor_id "
+        "WHERE c.descendant_id = ? AND f.user_id = ? ORDER BY c.depth",
+        (folder_id, user_id),
+    )
+    return [(r[0], r[1]) for r in cursor.fetchall()]
+
+
+def is_descendant(cursor: sqlite3.Cursor, folder_id: int, ancestor_id: int) -> bool:
+    """True if ``folder_id`` is ``ancestor_id`` or lies somewhere below it."""
+    cursor.execute(
+        "SELECT 1 FROM folder_closure WHERE ancestor_id = ? AND descendant_id = ?",
+        (ancestor_id, folder_id),
+    )
+    return cursor.fetchone() is not None
+
+
+def is_live_folder(cursor: sqlite3.Cursor, folder_id: int, user_id: int) -> bool:
+    """True if ``user_id`` owns ``folder_id`` and it is not (under) a tombstone."""
+    cursor.execute("SELECT 1 FROM live_folders WHERE id = ? AND user_id = ?", (folder_id, user_id))
+    return cursor.fetchone() is not None
+
+
+def tombstone_folder(cursor: sqlite3.Cursor, folder_id: int, user_id: int, now: int) -> int:
+    """Hide a folder and everything below it, and queue the subtree for purging.
+
+    The ``folders_tombstone`` trigger takes the subtree out of the ancestors'
+    aggregates. Returns the id of the ``purge_jobs`` row.
+    """
+    cursor.execute("UPDATE folders SET deleted_at = ? WHERE id = ?", (now, folder_id))
+    cursor.execute(
+        "INSERT INTO purge_jobs (user_id, folder_id, created_at) VALUES (?, ?, ?)",
+        (user_id, folder_id, now),
+    )
+    return cursor.lastrowid
+
+
+def _subtree_weight(cursor: sqlite3.Cursor, folder_id: int):
+    """``(parent_folder_id, (total_size, file_count, folder_count + 1))``, or None if the folder is gone."""
+    cursor.execute(
+        "SELECT parent_folder_id, total_size, file_count, folder_count + 1 FROM folders WHERE id = ?",
+        (folder_id,),
+    )
+    row = cursor.fetchone()
+    return (row[0], (row[1], row[2], row[3])) if row is not None else None
+
+
+def purge_batch(cursor: sqlite3.Cursor, folder_id: int, user_id: int, limit: int) -> Tuple[int, int, bool]:
+    """Delete up to ``limit`` files and ``limit`` folders from the bottom of a tombstoned subtree.
+
+    Only folders without subfolders are deleted, so the closure rows the
+    aggregate triggers walk are intact for every delete (see migration 011).
+    Those triggers also subtract from the ancestors above the tombstone,
+    which already lost the subtree when it was tombstoned; whatever the batch
+    removed from the tombstone is added back to them.
+
+    Returns ``(files_deleted, folders_deleted, done)``; ``done`` once the
+    tombstone itself is gone.
+    """
+    before = _subtree_weight(cursor, folder_id)
+    if before is None:
+        return 0, 0, True
+    parent_id, weight_before = before
+    cursor.execute(
+        "SELECT c.descendant_id FROM folder_closure c WHERE c.ancestor_id = ? AND NOT EXISTS "
+        "(SELECT 1 FROM folders WHERE user_id = ? AND parent_folder_id = c.descendant_id) LIMIT ?",
+        (folder_id, user_id, limit),
+    )
+    leaves = json.dumps([row[0] for row in cursor.fetchall()])
+    cursor.execute(
+        "DELETE FROM files WHERE id IN (SELECT id FROM files WHERE user_id = ? AND parent_folder_id IN "
+        "(SELECT value FROM json_each(?)) LIMIT ?)",
+        (user_id, leaves, limit),
+    )
+    files_deleted = cursor.rowcount
+    folders_deleted = 0
+    if files_deleted < limit:  # the leaves are empty now
+        cursor.execute(
+            "DELETE FROM folders WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+            (user_id, leaves),
+        )
+        folders_deleted = cursor.rowcount
+    after = _subtree_weight(cursor, folder_id)
+    weight_after = after[1] if after is not None else (0, 0, 0)
+    delta = [b - a for b, a in zip(weight_before, weight_after)]
+    if parent_id is not None and any(delta):
+        cursor.execute(
+            "UPDATE folders SET total_size = total_size + ?, file_count = file_count + ?, "
+            "folder_count = folder_count + ? "
+            "WHERE id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = ?)",
+            (*delta, parent_id),
+        )
+    return files_deleted, folders_deleted, after is None
+
+
+def recompute_aggregates(cursor: sqlite3.Cursor, user_id: int, fix: bool = True) -> List[dict]:
+    """Recompute the aggregates of every live folder owned by ``user_id``.
+
+    Subtrees below a tombstone are not counted, and folders in them are
+    skipped: they are on their way out. Returns the folders whose stored
+    values were wrong, with both values; with ``fix`` they are corrected in
+    place.
+    """
+    cursor.execute(
+        "WITH direct AS ("
+        "  SELECT parent_folder_id AS folder_id, SUM(size) AS bytes, COUNT(*) AS files FROM files"
+        "  WHERE user_id = ? AND parent_folder_id IS NOT NULL GROUP BY parent_folder_id"
+        "), hidden AS ("
+        "  SELECT c.descendant_id AS id FROM folders t JOIN folder_closure c ON c.ancestor_id = t.id"
+        "  WHERE t.user_id = ? AND t.deleted_at IS NOT NULL"
+        ") "
+        "SELECT f.id, f.total_size, f.file_count, f.folder_count, "
+        "COALESCE(SUM(d.bytes), 0) AS actual_size, COALESCE(SUM(d.files), 0) AS actual_files, "
+        "COUNT(*) - 1 AS actual_folders "
+        "FROM folders f JOIN folder_closure c ON c.ancestor_id = f.id "
+        "LEFT JOIN direct d ON d.folder_id = c.descendant_id "
+        "WHERE f.user_id = ? AND f.id NOT IN (SELECT id FROM hidden) "
+        "AND c.descendant_id NOT IN (SELECT id FROM hidden) GROUP BY f.id",
+        (user_id, user_id, user_id),
+    )
+    drifted = [
+        {
+            "id": r[0],
+            "stored": {"total_size": r[1], "file_count": r[2], "folder_count": r[3]},
+            "actual": {"total_size": r[4], "file_count": r[5], "folder_count": r[6]},
+        }
+        for r in cursor.fetchall()
+        if (r[1], r[2], r[3]) != (r[4], r[5], r[6])
+    ]
+    if fix and drifted:
+        cursor.executemany(
+            "UPDATE folders SET total_size = ?, file_count = ?, folder_count = ? WHERE id = ?",
+            [
+                (d["actual"]["total_size"], d["actual"]["file_count"], d["actual"]["folder_count"], d["id"])
+                for d in drifted
+            ],
+        )
+    return drifted
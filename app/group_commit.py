@@ -0,0 +1,177 @@
+"""Group commit for small metadata writes.
+
+With ``GROUP_COMMIT=1``, writes submitted through ``run_write`` are queued per
+database file and applied by one flusher task: it waits up to
+``GROUP_COMMIT_WINDOW_MS`` for more operations (or until it has
+``GROUP_COMMIT_MAX_OPS``), then runs the whole batch in a single
+``BEGIN IMMEDIATE`` transaction with one commit. Each operation runs inside
+its own savepoint, so one that raises (a 404, a constraint violation) is
+rolled back alone and its caller gets the exception; the others commit.
+Callers only resume once the batch has committed.
+
+Operations are blocking functions taking a cursor, like the helpers passed
+to ``AsyncConnection.run``, and run in the submitting request's context so
+their SQL still shows up in its trace. Without ``GROUP_COMMIT`` ``run_write``
+is a plain write transaction per call.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional
+
+from app.database import database_path, get_async_db, shard_for
+from app.metrics import Histogram
+
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_OPS = int(os.getenv("GROUP_COMMIT_MAX_OPS", "64"))
+
+GROUP_COMMIT_BATCH = Histogram(
+    "db_group_commit_batch_size", "Operations applied per group commit.", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _Operation:
+    __slots__ = ("fn", "args", "context", "future")
+
+    def __init__(self, fn: Callable, args: tuple, future: asyncio.Future):
+        self.fn = fn
+        self.args = args
+        self.context = contextvars.copy_context()
+        self.future = future
+
+
+def _apply(cursor: sqlite3.Cursor, batch: List[_Operation]) -> list:
+    """Run every operation in its own savepoint; returns ``(ok, result or exception)`` per operation."""
+    outcomes = []
+    for op in batch:
+        cursor.execute("SAVEPOINT group_op")
+        try:
+            result = op.context.run(op.fn, cursor, *op.args)
+        except Exception as exc:
+            cursor.execute("ROLLBACK TO group_op")
+            cursor.execute("RELEASE group_op")
+            outcomes.append((False, exc))
+        else:
+            cursor.execute("RELEASE group_op")
+            outcomes.append((True, result))
+    return outcomes
+
+
+class GroupCommitter:
+    """Queue and flusher task for one database file."""
+
+    def __init__(self, shard: Optional[int], window: float = GROUP_COMMIT_WINDOW_MS / 1000,
+                 max_ops: int = GROUP_COMMIT_MAX_OPS):
+        self.shard = shard  # None: the catalog
+        self.window = window
+        self.max_ops = max_ops
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, fn: Callable, *args) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Operation(fn, args, future))
+        return await future
+
+    async def _collect(self) -> List[_Operation]:
+        """Wait for an operation, then for more until the window ends or the batch is full.
+
+        A ``None`` in the queue (from ``close``) ends the batch and the flusher.
+        """
+        op = await self._queue.get()
+        if op is None:
+            self._closing = True
+            return []
+        batch = [op]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_ops:
+            if not self._queue.empty():
+                op = self._queue.get_nowait()
+            else:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    op = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if op is None:
+                self._closing = True
+                break
+            batch.append(op)
+        return batch
+
+    async def _flush(self, batch: List[_Operation]) -> None:
+        try:
+            async with get_async_db(write=True, shard=self.shard) as db:
+                outcomes = await db.run(_apply, db.cursor(), batch)
+        except Exception as exc:
+            # BEGIN or COMMIT failed: nothing in the batch was written
+            outcomes = [(False, exc)] * len(batch)
+        GROUP_COMMIT_BATCH.observe(len(batch))
+        for op, (ok, value) in zip(batch, outcomes):
+            if op.future.done():  # the caller was cancelled
+                continue
+            if ok:
+                op.future.set_result(value)
+            else:
+                op.future.set_exception(value)
+
+    async def _run(self) -> None:
+        while not self._closing:
+            batch = await self._collect()
+            if not batch:
+                continue
+            try:
+                await self._flush(batch)
+            except Exception:
+                logger.exception("Group commit flush failed")
+
+    async def close(self) -> None:
+        """Stop the flusher once the operations already queued have been applied."""
+        self._queue.put_nowait(None)
+        await self._task
+
+
+_committers: Dict[str, GroupCommitter] = {}
+_committers_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_committer(user_id: Optional[int] = None) -> GroupCommitter:
+    """The committer for the catalog or ``user_id``'s shard, on the running loop."""
+    global _committers_loop
+    loop = asyncio.get_running_loop()
+    if _committers_loop is not loop:
+        _committers.clear()
+        _committers_loop = loop
+    path = database_path(user_id)
+    committer = _committers.get(path)
+    if committer is None:
+        committer = _committers[path] = GroupCommitter(shard_for(user_id) if user_id is not None else None)
+    return committer
+
+
+async def run_write(fn: Callable, *args, user_id: Optional[int] = None) -> Any:
+    """Run ``fn(cursor, *args)`` in a write transaction on the catalog or ``user_id``'s shard.
+
+    With ``GROUP_COMMIT`` the transaction is shared with other queued writes.
+    """
+    if GROUP_COMMIT:
+        return await get_committer(user_id).submit(fn, *args)
+    async with get_async_db(write=True, user_id=user_id) as db:
+        return await db.run(fn, db.cursor(), *args)
+
+
+async def close_committers() -> None:
+    """Flush and stop every committer (called on application shutdown)."""
+    for committer in list(_committers.values()):
+        await committer.close()
+    _committers.clear()
@@ -1,8 +1,52 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
-from app.routes import health_router, items_router, auth_router, folders_router, files_router
+from app.admission import ADMISSION_CONTROL, AdmissionMiddleware
+from app.database import close_pool, shutdown_executors
+from app.group_commit import close_committers
+from app.metrics import METRICS_ENABLED, MetricsMiddleware
+from app.passwords import password_hasher
+from app.purge import run_purge
+from app.server_timing import SERVER_TIMING, ServerTimingMiddleware
+from app.tracing import TRACING_ENABLED, TracingMiddleware, stop_trace_log
+from app.upload_sessions import UPLOAD_CLEANUP_INTERVAL, run_cleanup
+from app.vacuum import VACUUM_INTERVAL, run_vacuum
+from app.routes import health_router, items_router, auth_router, folders_router, files_router, metrics_router, uploads_router, search_router, admin_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    cleanup = asyncio.create_task(run_cleanup()) if UPLOAD_CLEANUP_INTERVAL > 0 else None
+    purge = asyncio.create_task(run_purge())
+    vacuum = asyncio.create_task(run_vacuum()) if VACUUM_INTERVAL > 0 else None
+    yield
+    for task in (cleanup, purge, vacuum):
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+    await close_committers()
+    password_hasher.shutdown()
+    shutdown_executors()
+    close_pool()
+    stop_trace_log()
+
+
+app = FastAPI(title="Backend Exercise API", version="1.0.0", lifespan=lifespan)
 
-app = FastAPI(title="Backend Exercise API", version="1.0.0")
+# Added first so it runs innermost: rejected requests still show up in
+# metrics, traces and Server-Timing
+if ADMISSION_CONTROL:
+    app.add_middleware(AdmissionMiddleware)
+if SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
 
 # Register routers
 app.include_router(health_router)
@@ -10,6 +54,10 @@ app.include_router(items_router)
 app.include_router(auth_router)
 app.include_router(folders_router)
 app.include_router(files_router)
+app.include_router(metrics_router)
+app.include_router(uploads_router)
+app.include_router(search_router)
+app.include_router(admin_router)
 
 
 if __name__ == "__main__":
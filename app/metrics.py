@@ -0,0 +1,238 @@
+"""In-process metrics exposed at ``/metrics`` in Prometheus text format.
+
+A small dependency-free registry of counters, gauges and fixed-bucket
+histograms. Recording an observation is a dict lookup and a few additions
+under a lock, cheap enough to leave on in production (``METRICS_ENABLED=0``
+turns off the HTTP middleware and SQL instrumentation).
+
+HTTP series are labelled by route template (``/files/{file_id}``), never by
+raw path, to keep cardinality bounded.
+"""
+
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+STATEMENT_KINDS = frozenset(
+    ["select", "insert", "update", "delete", "with", "begin", "commit", "rollback", "savepoint", "release", "pragma"]
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class CallbackMetric(Metric):
+    """Gauge or counter whose values are read from ``callback`` at scrape time.
+
+    ``callback`` returns ``{label_values_tuple: value}``.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Dict[Tuple[str, ...], float]],
+                 labelnames: Sequence[str] = (), kind: str = "gauge"):
+        self.kind = kind
+        self.callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in sorted(self.callback().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(state[-1])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+HTTP_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "HTTP response body size.", ("method", "route"), buckets=SIZE_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+
+DB_ACQUIRE = Histogram(
+    "db_connection_acquire_seconds",
+    "Time to obtain a pooled connection, including executor queueing (mode: sync, read, write).",
+    ("mode",),
+)
+DB_LOCK_WAIT = Histogram(
+    "db_write_lock_wait_seconds",
+    "Time write transactions waited for the writer lock (stage: queue = in-process queue, begin = BEGIN IMMEDIATE).",
+    ("stage",),
+)
+DB_STATEMENT = Histogram(
+    "db_statement_duration_seconds", "SQL execute() time, up to the first result row.", ("statement",)
+)
+DB_ROWS = Counter("db_rows_returned_total", "Rows fetched from SQL statements.", ("statement",))
+DB_COMMITS = Counter(
+    "db_commits_total", "Committed write transactions; with DB_SYNCHRONOUS=FULL each one is a WAL fsync."
+)
+DB_FREE_PAGES = Gauge("db_freelist_pages", "Unused pages inside the database file, as of the last vacuum check.", ("database",))
+DB_VACUUMED_PAGES = Counter(
+    "db_vacuum_pages_total", "Free pages returned to the filesystem by incremental vacuum.", ("database",)
+)
+DB_BUSY = Counter(
+    "db_busy_errors_total", "Statements that failed with 'database is locked' after the busy timeout.", ("statement",)
+)
+
+
+def statement_kind(sql: str) -> str:
+    """Low-cardinality label for a SQL statement: its leading keyword."""
+    words = sql.split(None, 1)
+    kind = words[0].lower() if words else ""
+    return kind if kind in STATEMENT_KINDS else "other"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, status and response size."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # the router stores the matched route in the (shared) scope
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route, str(status))
+            HTTP_DURATION.observe(time.perf_counter() - start, method, route)
+            HTTP_RESPONSE_SIZE.observe(size, method, route)
@@ -0,0 +1,97 @@
+"""Asynchronous password hashing.
+
+bcrypt is deliberately slow and only partially releases the GIL, so running it
+inline in ``/auth/register`` and ``/auth/login`` ties up a threadpool slot and
+competes with every other route for the interpreter. ``PasswordHasher`` pushes
+that work to a bounded process pool, caps how many hashes run at once, and
+sheds load with ``503`` once too many are waiting.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.auth import hash_password, verify_password
+from app.tracing import span
+
+# 0 workers hashes in the regular threadpool instead of a process pool
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(max(PASSWORD_HASH_WORKERS, 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        concurrency: int = PASSWORD_HASH_CONCURRENCY,
+        max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+    ):
+        self.workers = workers
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.queued = 0
+        self.rejected = 0
+
+    async def hash(self, password: str) -> str:
+        with span("password.hash"):
+            return await self._submit(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        with span("password.verify"):
+            return await self._submit(verify_password, password, hashed)
+
+    async def _submit(self, fn, *args):
+        if self.running + self.queued >= self.concurrency + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many concurrent authentication requests",
+                headers={"Retry-After": "1"},
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(fn, *args)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,98 @@
+"""Background purge of deleted folders.
+
+``DELETE /folders/{id}`` only tombstones the folder and records a
+``purge_jobs`` row (see ``app.folder_tree.tombstone_folder``). ``run_purge``,
+started by the application lifespan, removes each tombstoned subtree bottom-up
+with ``purge_batch``: every batch is its own short write transaction, and the
+worker sleeps ``PURGE_PAUSE`` between batches so that request writes queued
+on the write lock get their turn.
+
+Jobs live in the database, so the worker picks up pending ones on every
+shard when it starts (after a restart) and every ``PURGE_INTERVAL`` seconds;
+``notify`` wakes it as soon as a folder is deleted. Batches are idempotent,
+so several processes working on the same job do no harm.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from app.folder_tree import purge_batch
+
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+PURGE_PAUSE = float(os.getenv("PURGE_PAUSE_MS", "10")) / 1000
+PURGE_INTERVAL = float(os.getenv("PURGE_INTERVAL", "60"))
+
+PENDING = "pending"
+DONE = "done"
+
+logger = logging.getLogger(__name__)
+
+_wakeup: Optional[asyncio.Event] = None
+
+
+def notify() -> None:
+    """Wake the worker (called after a folder has been tombstoned)."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def pending_jobs(cursor: sqlite3.Cursor, limit: int = 100) -> list:
+    cursor.execute(
+        "SELECT id, user_id, folder_id FROM purge_jobs WHERE status = ? ORDER BY id LIMIT ?", (PENDING, limit)
+    )
+    return cursor.fetchall()
+
+
+def run_job_batch(cursor: sqlite3.Cursor, job_id: int, folder_id: int, user_id: int,
+                  limit: int = PURGE_BATCH_SIZE) -> bool:
+    """Purge one batch of a job and record its progress; True once the job is done."""
+    files_deleted, folders_deleted, done = purge_batch(cursor, folder_id, user_id, limit)
+    cursor.execute(
+        "UPDATE purge_jobs SET files_deleted = files_deleted + ?, folders_deleted = folders_deleted + ?, "
+        "status = ?, finished_at = ? WHERE id = ?",
+        (files_deleted, folders_deleted, DONE if done else PENDING, int(time.time()) if done else None, job_id),
+    )
+    return done
+
+
+async def purge_pending() -> int:
+    """Run every pending job on every shard to completion; returns how many finished."""
+    from app.database import DB_SHARDS, get_async_db
+
+    finished = 0
+    for shard in range(DB_SHARDS):
+        async with get_async_db(shard=shard) as db:
+            jobs = await db.run(pending_jobs, db.cursor())
+        for job in jobs:
+            done = False
+            while not done:
+                async with get_async_db(write=True, shard=shard) as db:
+                    done = await db.run(run_job_batch, db.cursor(), job["id"], job["folder_id"], job["user_id"])
+                await asyncio.sleep(PURGE_PAUSE)
+            finished += 1
+    return finished
+
+
+async def run_purge(interval: float = PURGE_INTERVAL) -> None:
+    """Background task started by the application lifespan."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        _wakeup.clear()
+        try:
+            finished = await purge_pending()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Folder purge failed")
+        else:
+            if finished:
+                logger.info("Purged %d deleted folders", finished)
+        try:
+            await asyncio.wait_for(_wakeup.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
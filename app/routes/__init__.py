@@ -3,5 +3,9 @@ from app.routes.items import router as items_router
 from app.routes.auth import router as auth_router
 from app.routes.folders import router as folders_router
 from app.routes.files import router as files_router
+from app.routes.metrics import router as metrics_router
+from app.routes.uploads import router as uploads_router
+from app.routes.search import router as search_router
+from app.routes.admin import router as admin_router
 
-__all__ = ["health_router", "items_router", "auth_router", "folders_router", "files_router"]
+__all__ = ["health_router", "items_router", "auth_router", "folders_router", "files_router", "metrics_router", "uploads_router", "search_router", "admin_router"]
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends
+import os
+
+from app.auth import require_admin
+from app.database import database_path, get_async_db
+from app.vacuum import (
+    OPTIMIZE_INTERVAL,
+    VACUUM_INTERVAL,
+    VACUUM_MIN_FREE_PAGES,
+    VACUUM_STEP_PAGES,
+    databases,
+    page_fragmentation,
+    storage_stats,
+)
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/storage")
+async def get_storage(fragmentation: bool = False):
+    """
+    Size and free space of every database file. With ``fragmentation`` also
+    report, per table and index, how scattered its pages are (reads the
+    whole file, so it is slow on large databases).
+    """
+    results = []
+    for label, shard in databases():
+        path = database_path(shard=shard)
+        async with get_async_db(shard=shard) as db:
+            stats = await db.run(storage_stats, db.cursor())
+            if fragmentation:
+                stats["fragmentation"] = await db.run(page_fragmentation, db.cursor())
+        wal = path + "-wal"
+        stats["file_bytes"] = os.path.getsize(path)
+        stats["wal_bytes"] = os.path.getsize(wal) if os.path.exists(wal) else 0
+        results.append({"database": label, "path": path, **stats})
+    return {
+        "databases": results,
+        "vacuum": {
+            "interval": VACUUM_INTERVAL,
+            "step_pages": VACUUM_STEP_PAGES,
+            "min_free_pages": VACUUM_MIN_FREE_PAGES,
+            "optimize_interval": OPTIMIZE_INTERVAL,
+        },
+    }
@@ -2,8 +2,9 @@ from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel, EmailStr
 from datetime import timedelta
 
-from app.auth import hash_password, verify_password, create_access_token, get_user_by_email
-from app.database import get_db
+from app.auth import create_access_token, get_user_by_email
+from app.database import get_async_db
+from app.passwords import password_hasher
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -19,25 +20,26 @@ class LoginRequest(BaseModel):
 
 
 @router.post("/register", status_code=201)
-def register(req: RegisterRequest):
+async def register(req: RegisterRequest):
     # Check existing
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE email = ?", (req.email,))
-        if cursor.fetchone():
+    async with get_async_db() as db:
+        if await db.fetchone("SELECT id FROM users WHERE email = ?", (req.email,)):
             raise HTTPException(status_code=400, detail="Email already registered")
-        pw_hash = hash_password(req.password)
-        cursor.execute("INSERT INTO users (email, password_hash) VALUES (?, ?)", (req.email, pw_hash))
-        user_id = cursor.lastrowid
-        return {"id": user_id, "email": req.email}
+    pw_hash = await password_hasher.hash(req.password)
+    async with get_async_db(write=True) as db:
+        # Re-check inside the write transaction; hashing happened outside it
+        if await db.fetchone("SELECT id FROM users WHERE email = ?", (req.email,)):
+            raise HTTPException(status_code=400, detail="Email already registered")
+        cursor = await db.execute("INSERT INTO users (email, password_hash) VALUES (?, ?)", (req.email, pw_hash))
+        return {"id": cursor.lastrowid, "email": req.email}
 
 
 @router.post("/login")
-def login(req: LoginRequest):
-    user = get_user_by_email(req.email)
+async def login(req: LoginRequest):
+    user = await get_user_by_email(req.email)
     if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
-    if not verify_password(req.password, user["password_hash"]):
+    if not await password_hasher.verify(req.password, user["password_hash"]):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     access_token_expires = timedelta(minutes=60)
     token = create_access_token({"sub": user["id"]}, expires_delta=access_token_expires)
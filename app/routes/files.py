@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
+from urllib.parse import quote
 import base64
+import json
 import mimetypes
+import re
 
 from app.auth import get_current_user
-from app.database import get_db
-import sqlite3
+from app.conditional import etag_headers, etag_matches, make_etag, not_modified
+from app.database import get_async_db
+from app.folder_tree import is_live_folder
+from app.group_commit import run_write
+from app.storage import SpooledUpload, aiter_blob_content, encode_content, insert_file, read_blob
 
 router = APIRouter(prefix="/files", tags=["files"])
 
@@ -21,86 +29,375 @@ class FileRename(BaseModel):
     name: str
 
 
+MAX_BATCH_SIZE = 10000
+
+# int-range ("first-[last]") or suffix-range ("-length"), digits only
+_RANGE_RE = re.compile(r"(\d+)-(\d*)|-(\d+)")
+
+
+class BatchUpload(BaseModel):
+    files: List[FileUpload] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class BatchIds(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class BatchMove(BatchIds):
+    parent_folder_id: Optional[int] = None
+
+
+async def _require_parent(db, parent_folder_id: Optional[int], user_id: int) -> None:
+    if parent_folder_id is not None and not await db.run(is_live_folder, db.cursor(), parent_folder_id, user_id):
+        raise HTTPException(status_code=400, detail="Destination folder not found")
+
+
 @router.post("")
-def upload_file(req: FileUpload, user=Depends(get_current_user)):
+async def upload_file(req: FileUpload, user=Depends(get_current_user)):
     user_id = user["id"]
     try:
         decoded = base64.b64decode(req.content)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid base64 content")
-    size = len(decoded)
     mime_type, _ = mimetypes.guess_type(req.name)
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO files (name, content, size, mime_type, user_id, parent_folder_id) VALUES (?, ?, ?, ?, ?, ?)",
-            (req.name, sqlite3.Binary(decoded), size, mime_type, user_id, req.parent_folder_id),
+    # compress before taking the writer lock
+    content = await run_in_threadpool(encode_content, decoded, mime_type)
+    async with get_async_db(write=True, user_id=user_id) as db:
+        await _require_parent(db, req.parent_folder_id, user_id)
+        return await db.run(
+            insert_file,
+            db.cursor(),
+            name=req.name,
+            data=content,
+            mime_type=mime_type,
+            user_id=user_id,
+            parent_folder_id=req.parent_folder_id,
+        )
+
+
+@router.post("/upload")
+async def upload_file_stream(
+    request: Request,
+    name: str,
+    parent_folder_id: Optional[int] = None,
+    user=Depends(get_current_user),
+):
+    """
+    Upload raw file bytes as the request body (no base64).
+    The body is consumed in chunks, so memory use does not grow with file size.
+    """
+    user_id = user["id"]
+    mime_type, _ = mimetypes.guess_type(name)
+    if mime_type is None:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip()
+        if content_type and content_type != "application/octet-stream":
+            mime_type = content_type
+    with SpooledUpload() as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        with await run_in_threadpool(encode_content, upload, mime_type) as content:
+            async with get_async_db(write=True, user_id=user_id) as db:
+                await _require_parent(db, parent_folder_id, user_id)
+                return await db.run(
+                    insert_file,
+                    db.cursor(),
+                    name=name,
+                    data=content,
+                    mime_type=mime_type,
+                    user_id=user_id,
+                    parent_folder_id=parent_folder_id,
+                )
+
+
+# Batch operations. Declared before the /{file_id} routes so that
+# /batch/... is not captured by /{file_id}/move.
+# Ownership is checked for the whole list with one query (ids are passed as a
+# JSON array and expanded with json_each), and each batch is one transaction.
+
+def _owned_ids(cursor, user_id: int, ids: List[int]) -> set:
+    cursor.execute(
+        "SELECT id FROM live_files WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+        (user_id, json.dumps(ids)),
+    )
+    return {r["id"] for r in cursor.fetchall()}
+
+
+def _live_parents(cursor, user_id: int, ids: List[int]) -> set:
+    cursor.execute(
+        "SELECT id FROM live_folders WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+        (user_id, json.dumps(ids)),
+    )
+    return {r["id"] for r in cursor.fetchall()}
+
+
+def _unique(ids: List[int]) -> List[int]:
+    return list(dict.fromkeys(ids))
+
+
+def _encode_batch(files: List[FileUpload]) -> list:
+    """Decode and compress every entry; runs before the write transaction."""
+    encoded = []
+    for item in files:
+        try:
+            decoded = base64.b64decode(item.content)
+        except Exception:
+            encoded.append(None)
+            continue
+        mime_type, _ = mimetypes.guess_type(item.name)
+        encoded.append((mime_type, encode_content(decoded, mime_type)))
+    return encoded
+
+
+def _insert_batch(cursor, user_id: int, files: List[FileUpload], encoded: list) -> list:
+    parent_ids = _unique([item.parent_folder_id for item in files if item.parent_folder_id is not None])
+    parents = _live_parents(cursor, user_id, parent_ids) if parent_ids else set()
+    results = []
+    for index, (item, entry) in enumerate(zip(files, encoded)):
+        if entry is None:
+            results.append({"index": index, "name": item.name, "status": "error", "detail": "Invalid base64 content"})
+            continue
+        if item.parent_folder_id is not None and item.parent_folder_id not in parents:
+            results.append({"index": index, "name": item.name, "status": "error", "detail": "Parent folder not found"})
+            continue
+        mime_type, content = entry
+        meta = insert_file(
+            cursor,
+            name=item.name,
+            data=content,
+            mime_type=mime_type,
+            user_id=user_id,
+            parent_folder_id=item.parent_folder_id,
+        )
+        results.append({"index": index, "status": "created", **meta})
+    return results
+
+
+@router.post("/batch/upload")
+async def batch_upload(req: BatchUpload, user=Depends(get_current_user)):
+    """
+    Upload several base64-encoded files in one transaction.
+    Returns one result per input file, in order; invalid entries are skipped.
+    """
+    user_id = user["id"]
+    encoded = await run_in_threadpool(_encode_batch, req.files)
+    async with get_async_db(write=True, user_id=user_id) as db:
+        results = await db.run(_insert_batch, db.cursor(), user_id, req.files, encoded)
+    return {"results": results}
+
+
+@router.post("/batch/get")
+async def batch_get_metadata(req: BatchIds, user=Depends(get_current_user)):
+    """Fetch metadata for many files at once. Missing or foreign ids are reported as not_found."""
+    user_id = user["id"]
+    ids = _unique(req.ids)
+    async with get_async_db(user_id=user_id) as db:
+        rows = await db.fetchall(
+            "SELECT id, name, size, mime_type FROM live_files WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+            (user_id, json.dumps(ids)),
+        )
+        found = {r["id"]: dict(r) for r in rows}
+    results = [
+        {"status": "ok", **found[file_id]} if file_id in found else {"id": file_id, "status": "not_found"}
+        for file_id in ids
+    ]
+    return {"results": results}
+
+
+@router.post("/batch/move")
+async def batch_move(req: BatchMove, user=Depends(get_current_user)):
+    """Move many files into one folder (or to the root) in a single transaction."""
+    user_id = user["id"]
+    ids = _unique(req.ids)
+    async with get_async_db(write=True, user_id=user_id) as db:
+        await _require_parent(db, req.parent_folder_id, user_id)
+        owned = await db.run(_owned_ids, db.cursor(), user_id, ids)
+        await db.execute(
+            "UPDATE files SET parent_folder_id = ? WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+            (req.parent_folder_id, user_id, json.dumps([i for i in ids if i in owned])),
+        )
+    results = [{"id": file_id, "status": "moved" if file_id in owned else "not_found"} for file_id in ids]
+    return {"parent_folder_id": req.parent_folder_id, "results": results}
+
+
+@router.post("/batch/delete")
+async def batch_delete(req: BatchIds, user=Depends(get_current_user)):
+    """Delete many files in a single transaction."""
+    user_id = user["id"]
+    ids = _unique(req.ids)
+    async with get_async_db(write=True, user_id=user_id) as db:
+        owned = await db.run(_owned_ids, db.cursor(), user_id, ids)
+        await db.execute(
+            "DELETE FROM files WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+            (user_id, json.dumps([i for i in ids if i in owned])),
         )
-        file_id = cursor.lastrowid
-        return {"id": file_id, "name": req.name, "size": size, "mime_type": mime_type}
+    results = [{"id": file_id, "status": "deleted" if file_id in owned else "not_found"} for file_id in ids]
+    return {"results": results}
 
 
 @router.get("/{file_id}")
-def get_file_metadata(file_id: int, user=Depends(get_current_user)):
+async def get_file_metadata(
+    file_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user=Depends(get_current_user),
+):
     user_id = user["id"]
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, size, mime_type FROM files WHERE id = ? AND user_id = ?", (file_id, user_id))
-        row = cursor.fetchone()
+    async with get_async_db(user_id=user_id) as db:
+        row = await db.fetchone(
+            "SELECT id, name, size, mime_type, version FROM live_files WHERE id = ? AND user_id = ?", (file_id, user_id)
+        )
         if row is None:
             raise HTTPException(status_code=404, detail="File not found")
-        return {"id": row["id"], "name": row["name"], "size": row["size"], "mime_type": row["mime_type"]}
+    etag = make_etag("file", file_id, row["version"])
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers.update(etag_headers(etag))
+    return {"id": row["id"], "name": row["name"], "size": row["size"], "mime_type": row["mime_type"]}
 
 
 @router.get("/{file_id}/download")
-def download_file(file_id: int, user=Depends(get_current_user)):
+async def download_file(
+    file_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user=Depends(get_current_user),
+):
     user_id = user["id"]
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name, content, mime_type FROM files WHERE id = ? AND user_id = ?", (file_id, user_id))
-        row = cursor.fetchone()
+    async with get_async_db(user_id=user_id) as db:
+        row = await db.fetchone(
+            "SELECT name, mime_type, blob_id, version FROM live_files WHERE id = ? AND user_id = ?", (file_id, user_id)
+        )
         if row is None:
             raise HTTPException(status_code=404, detail="File not found")
-        content_b64 = base64.b64encode(row["content"]).decode("utf-8")
-        return {"name": row["name"], "mime_type": row["mime_type"], "content": content_b64}
+        # checked before the blob is read
+        etag = make_etag("download", file_id, row["version"])
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        content = await db.run(read_blob, db.cursor(), row["blob_id"])
+    response.headers.update(etag_headers(etag))
+    content_b64 = base64.b64encode(content).decode("utf-8")
+    return {"name": row["name"], "mime_type": row["mime_type"], "content": content_b64}
 
 
-@router.patch("/{file_id}")
-def rename_file(file_id: int, req: FileRename, user=Depends(get_current_user)):
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single ``bytes=`` range into a half-open ``(start, end)`` pair.
+    Returns None when the header should be ignored (multiple ranges, an
+    unknown unit or an invalid range, RFC 9110 section 14.2) and raises 416
+    when a valid range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    match = _RANGE_RE.fullmatch(spec.strip())
+    if match is None:
+        return None
+    first, last, suffix = match.groups()
+    if first is not None:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last) + 1, size) if last else size
+        satisfiable = start < size
+    else:
+        length = int(suffix)
+        start, end = max(size - length, 0), size
+        satisfiable = length > 0
+    if not satisfiable:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+@router.get("/{file_id}/content")
+async def stream_file(file_id: int, request: Request, user=Depends(get_current_user)):
+    """
+    Stream the raw file bytes in chunks.
+    Supports single-range ``Range`` requests (206 Partial Content), with
+    ``If-Range``, and ``If-None-Match`` against the content-hash ETag.
+    """
     user_id = user["id"]
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM files WHERE id = ? AND user_id = ?", (file_id, user_id))
-        if cursor.fetchone() is None:
+    async with get_async_db(user_id=user_id) as db:
+        row = await db.fetchone(
+            "SELECT name, size, mime_type, blob_id, checksum, version FROM live_files WHERE id = ? AND user_id = ?",
+            (file_id, user_id),
+        )
+        if row is None:
             raise HTTPException(status_code=404, detail="File not found")
-        cursor.execute("UPDATE files SET name = ? WHERE id = ?", (req.name, file_id))
-        return {"id": file_id, "name": req.name}
+    # identical bytes have the same ETag regardless of name or location
+    etag = f'"{row["checksum"]}"' if row["checksum"] else make_etag("content", file_id, row["version"])
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    blob_id = row["blob_id"]
+    size = (row["size"] or 0) if blob_id is not None else 0
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(row['name'])}",
+        **etag_headers(etag),
+    }
+    media_type = row["mime_type"] or "application/octet-stream"
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # a stale If-Range validator means the client's partial copy is outdated: send everything
+    if range_header and size and (if_range is None or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, size)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        if not size:
+            return Response(status_code=200, headers=headers, media_type=media_type)
+        return StreamingResponse(aiter_blob_content(user_id, blob_id), headers=headers, media_type=media_type)
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start)
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    return StreamingResponse(
+        aiter_blob_content(user_id, blob_id, start, end), status_code=206, headers=headers, media_type=media_type
+    )
+
+
+def _require_file(cursor, file_id: int, user_id: int) -> None:
+    cursor.execute("SELECT id FROM live_files WHERE id = ? AND user_id = ?", (file_id, user_id))
+    if cursor.fetchone() is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+
+def _rename_file(cursor, file_id: int, user_id: int, name: str) -> None:
+    _require_file(cursor, file_id, user_id)
+    cursor.execute("UPDATE files SET name = ? WHERE id = ?", (name, file_id))
+
+
+def _delete_file(cursor, file_id: int, user_id: int) -> None:
+    _require_file(cursor, file_id, user_id)
+    cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+
+def _move_file(cursor, file_id: int, user_id: int, parent_folder_id: Optional[int]) -> None:
+    _require_file(cursor, file_id, user_id)
+    # if parent_folder_id is provided, ensure it belongs to the user
+    if parent_folder_id is not None and not is_live_folder(cursor, parent_folder_id, user_id):
+        raise HTTPException(status_code=400, detail="Destination folder not found")
+    cursor.execute("UPDATE files SET parent_folder_id = ? WHERE id = ?", (parent_folder_id, file_id))
+
+
+@router.patch("/{file_id}")
+async def rename_file(file_id: int, req: FileRename, user=Depends(get_current_user)):
+    user_id = user["id"]
+    await run_write(_rename_file, file_id, user_id, req.name, user_id=user_id)
+    return {"id": file_id, "name": req.name}
 
 
 @router.delete("/{file_id}")
-def delete_file(file_id: int, user=Depends(get_current_user)):
+async def delete_file(file_id: int, user=Depends(get_current_user)):
     user_id = user["id"]
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM files WHERE id = ? AND user_id = ?", (file_id, user_id))
-        if cursor.fetchone() is None:
-            raise HTTPException(status_code=404, detail="File not found")
-        cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
-        return {"detail": "File deleted"}
+    await run_write(_delete_file, file_id, user_id, user_id=user_id)
+    return {"detail": "File deleted"}
 
 
 @router.post("/{file_id}/move")
-def move_file(file_id: int, parent_folder_id: Optional[int] = None, user=Depends(get_current_user)):
+async def move_file(file_id: int, parent_folder_id: Optional[int] = None, user=Depends(get_current_user)):
     user_id = user["id"]
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM files WHERE id = ? AND user_id = ?", (file_id, user_id))
-        if cursor.fetchone() is None:
-            raise HTTPException(status_code=404, detail="File not found")
-        # if parent_folder_id is provided, ensure it belongs to the user
-        if parent_folder_id is not None:
-            cursor.execute("SELECT id FROM folders WHERE id = ? AND user_id = ?", (parent_folder_id, user_id))
-            if cursor.fetchone() is None:
-                raise HTTPException(status_code=400, detail="Destination folder not found")
-        cursor.execute("UPDATE files SET parent_folder_id = ? WHERE id = ?", (parent_folder_id, file_id))
-        return {"id": file_id, "parent_folder_id": parent_folder_id}
+    await run_write(_move_file, file_id, user_id, parent_folder_id, user_id=user_id)
+    return {"id": file_id, "parent_folder_id": parent_folder_id}
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response, status
+import time
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 
 from app.auth import get_current_user
-from app.database import get_db
+from app.conditional import etag_headers, etag_matches, make_etag, not_modified
+from app.database import get_async_db
+from app.folder_tree import get_ancestors, get_path_versions, is_descendant, tombstone_folder
+from app.group_commit import run_write
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, cursor_key, decode_cursor, next_cursor
+from app.purge import notify as notify_purge
 
 router = APIRouter(prefix="/folders", tags=["folders"])
 
@@ -17,65 +23,236 @@ class FolderRename(BaseModel):
     name: str
 
 
+# (first page, next page) statements per sort order; keyset conditions keep
+# every page an index range scan regardless of how deep into the folder it is
+SUBFOLDER_PAGE_SQL = {
+    "name": (
+        "SELECT id, name FROM folders WHERE user_id = ? AND parent_folder_id = ? AND deleted_at IS NULL "
+        "ORDER BY name, id LIMIT ?",
+        "SELECT id, name FROM folders WHERE user_id = ? AND parent_folder_id = ? AND deleted_at IS NULL "
+        "AND (name, id) > (?, ?) ORDER BY name, id LIMIT ?",
+    ),
+    "id": (
+        "SELECT id, name FROM folders WHERE user_id = ? AND parent_folder_id = ? AND deleted_at IS NULL "
+        "ORDER BY id LIMIT ?",
+        "SELECT id, name FROM folders WHERE user_id = ? AND parent_folder_id = ? AND deleted_at IS NULL "
+        "AND id > ? ORDER BY id LIMIT ?",
+    ),
+}
+
+FILE_PAGE_SQL = {
+    "name": (
+        "SELECT id, name, size, mime_type FROM files WHERE user_id = ? AND parent_folder_id = ? "
+        "ORDER BY name, id LIMIT ?",
+        "SELECT id, name, size, mime_type FROM files WHERE user_id = ? AND parent_folder_id = ? AND (name, id) > (?, ?) "
+        "ORDER BY name, id LIMIT ?",
+    ),
+    "id": (
+        "SELECT id, name, size, mime_type FROM files WHERE user_id = ? AND parent_folder_id = ? "
+        "ORDER BY id LIMIT ?",
+        "SELECT id, name, size, mime_type FROM files WHERE user_id = ? AND parent_folder_id = ? AND id > ? "
+        "ORDER BY id LIMIT ?",
+    ),
+}
+
+
+async def _list_page(
+    kind: str,
+    statements,
+    folder_id: int,
+    user_id: int,
+    sort: str,
+    limit: int,
+    cursor: Optional[str],
+    if_none_match: Optional[str],
+):
+    """
+    Return ``(etag, page)``; ``page`` is None when ``if_none_match`` matches.
+    A page only depends on the folder's direct children, so its ETag is
+    derived from ``listing_version`` and the page parameters.
+    """
+    position = decode_cursor(cursor, sort)
+    async with get_async_db(user_id=user_id) as db:
+        row = await db.fetchone("SELECT listing_version FROM live_folders WHERE id = ? AND user_id = ?", (folder_id, user_id))
+        if row is None:
+            raise HTTPException(status_code=404, detail="Folder not found")
+        etag = make_etag(kind, folder_id, row["listing_version"], sort, limit, cursor)
+        if etag_matches(if_none_match, etag):
+            return etag, None
+        first_page, next_page = statements[sort]
+        if position is None:
+            rows = await db.fetchall(first_page, (user_id, folder_id, limit + 1))
+        else:
+            rows = await db.fetchall(next_page, (user_id, folder_id, *cursor_key(position, sort), limit + 1))
+    return etag, ([dict(r) for r in rows[:limit]], next_cursor(rows, limit, sort))
+
+
+def _create_folder(cursor, user_id: int, name: str, parent_folder_id: Optional[int]) -> int:
+    if parent_folder_id is not None:
+        _require_folder(cursor, parent_folder_id, user_id, 400, "Parent folder not found")
+    cursor.execute(
+        "INSERT INTO folders (name, user_id, parent_folder_id) VALUES (?, ?, ?)",
+        (name, user_id, parent_folder_id),
+    )
+    return cursor.lastrowid
+
+
+def _require_folder(cursor, folder_id: int, user_id: int, status_code: int = 404, detail: str = "Folder not found"):
+    cursor.execute("SELECT id FROM live_folders WHERE id = ? AND user_id = ?", (folder_id, user_id))
+    if cursor.fetchone() is None:
+        raise HTTPException(status_code=status_code, detail=detail)
+
+
+def _rename_folder(cursor, folder_id: int, user_id: int, name: str) -> None:
+    _require_folder(cursor, folder_id, user_id)
+    cursor.execute("UPDATE folders SET name = ? WHERE id = ?", (name, folder_id))
+
+
+def _move_folder(cursor, folder_id: int, user_id: int, parent_folder_id: Optional[int]) -> None:
+    _require_folder(cursor, folder_id, user_id)
+    if parent_folder_id is not None:
+        _require_folder(cursor, parent_folder_id, user_id, 400, "Destination folder not found")
+        if is_descendant(cursor, parent_folder_id, folder_id):
+            raise HTTPException(status_code=400, detail="Cannot move a folder into itself or one of its subfolders")
+    cursor.execute("UPDATE folders SET parent_folder_id = ? WHERE id = ?", (parent_folder_id, folder_id))
+
+
+def _delete_folder(cursor, folder_id: int, user_id: int) -> int:
+    _require_folder(cursor, folder_id, user_id)
+    return tombstone_folder(cursor, folder_id, user_id, int(time.time()))
+
+
 @router.post("")
-def create_folder(req: FolderCreate, user=Depends(get_current_user)):
+async def create_folder(req: FolderCreate, user=Depends(get_current_user)):
+    user_id = user["id"]
+    folder_id = await run_write(_create_folder, user_id, req.name, req.parent_folder_id, user_id=user_id)
+    return {"id": folder_id, "name": req.name, "parent_folder_id": req.parent_folder_id}
+
+
+# Declared before the /{folder_id} routes so that /jobs/... is not captured by them
+@router.get("/jobs/{job_id}")
+async def get_purge_job(job_id: int, user=Depends(get_current_user)):
+    """Progress of the background purge started by deleting a folder."""
     user_id = user["id"]
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO folders (name, user_id, parent_folder_id) VALUES (?, ?, ?)",
-            (req.name, user_id, req.parent_folder_id),
+    async with get_async_db(user_id=user_id) as db:
+        row = await db.fetchone(
+            "SELECT id, folder_id, status, files_deleted, folders_deleted, created_at, finished_at "
+            "FROM purge_jobs WHERE id = ? AND user_id = ?",
+            (job_id, user_id),
         )
-        folder_id = cursor.lastrowid
-        return {"id": folder_id, "name": req.name, "parent_folder_id": req.parent_folder_id}
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return dict(row)
 
 
 @router.get("/{folder_id}")
-def get_folder(folder_id: int, user=Depends(get_current_user)):
+async def get_folder(
+    folder_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user=Depends(get_current_user),
+):
     user_id = user["id"]
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, parent_folder_id FROM folders WHERE id = ? AND user_id = ?", (folder_id, user_id))
-        row = cursor.fetchone()
+    async with get_async_db(user_id=user_id) as db:
+        row = await db.fetchone(
+            "SELECT id, name, parent_folder_id, listing_version, total_size, file_count, folder_count "
+            "FROM live_folders WHERE id = ? AND user_id = ?",
+            (folder_id, user_id),
+        )
         if row is None:
             raise HTTPException(status_code=404, detail="Folder not found")
+        # children via listing_version, own name/parent and breadcrumb names via
+        # path versions, and anything deeper in the subtree via the aggregates
+        path_versions = await db.run(get_path_versions, db.cursor(), folder_id, user_id)
+        aggregates = {key: row[key] for key in ("total_size", "file_count", "folder_count")}
+        etag = make_etag("folder", folder_id, row["listing_version"], path_versions, *aggregates.values())
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers.update(etag_headers(etag))
         # list subfolders
-        cursor.execute("SELECT id, name FROM folders WHERE parent_folder_id = ? AND user_id = ?", (folder_id, user_id))
-        subfolders = [dict(id=r["id"], name=r["name"]) for r in cursor.fetchall()]
+        rows = await db.fetchall(
+            "SELECT id, name FROM folders WHERE parent_folder_id = ? AND user_id = ? AND deleted_at IS NULL",
+            (folder_id, user_id),
+        )
+        subfolders = [dict(id=r["id"], name=r["name"]) for r in rows]
         # list files
-        cursor.execute("SELECT id, name, size, mime_type FROM files WHERE parent_folder_id = ? AND user_id = ?", (folder_id, user_id))
-        files = [dict(id=r["id"], name=r["name"], size=r["size"], mime_type=r["mime_type"]) for r in cursor.fetchall()]
-        return {"id": row["id"], "name": row["name"], "parent_folder_id": row["parent_folder_id"], "subfolders": subfolders, "files": files}
+        rows = await db.fetchall("SELECT id, name, size, mime_type FROM files WHERE parent_folder_id = ? AND user_id = ?", (folder_id, user_id))
+        files = [dict(id=r["id"], name=r["name"], size=r["size"], mime_type=r["mime_type"]) for r in rows]
+        path = await db.run(get_ancestors, db.cursor(), folder_id, user_id)
+        return {"id": row["id"], "name": row["name"], "parent_folder_id": row["parent_folder_id"], **aggregates, "path": path, "subfolders": subfolders, "files": files}
+
+
+@router.get("/{folder_id}/subfolders")
+async def list_subfolders(
+    folder_id: int,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal["name", "id"] = "name",
+    if_none_match: Optional[str] = Header(None),
+    user=Depends(get_current_user),
+):
+    """
+    List a folder's direct subfolders one page at a time.
+    Pass the returned ``next_cursor`` back as ``cursor`` to get the next page.
+    """
+    etag, page = await _list_page(
+        "subfolders", SUBFOLDER_PAGE_SQL, folder_id, user["id"], sort, limit, cursor, if_none_match
+    )
+    if page is None:
+        return not_modified(etag)
+    response.headers.update(etag_headers(etag))
+    subfolders, next_page = page
+    return {"folder_id": folder_id, "subfolders": subfolders, "next_cursor": next_page}
+
+
+@router.get("/{folder_id}/files")
+async def list_files(
+    folder_id: int,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal["name", "id"] = "name",
+    if_none_match: Optional[str] = Header(None),
+    user=Depends(get_current_user),
+):
+    """
+    List the files directly inside a folder one page at a time.
+    Pass the returned ``next_cursor`` back as ``cursor`` to get the next page.
+    """
+    etag, page = await _list_page(
+        "files", FILE_PAGE_SQL, folder_id, user["id"], sort, limit, cursor, if_none_match
+    )
+    if page is None:
+        return not_modified(etag)
+    response.headers.update(etag_headers(etag))
+    files, next_page = page
+    return {"folder_id": folder_id, "files": files, "next_cursor": next_page}
 
 
 @router.patch("/{folder_id}")
-def rename_folder(folder_id: int, req: FolderRename, user=Depends(get_current_user)):
+async def rename_folder(folder_id: int, req: FolderRename, user=Depends(get_current_user)):
     user_id = user["id"]
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM folders WHERE id = ? AND user_id = ?", (folder_id, user_id))
-        if cursor.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Folder not found")
-        cursor.execute("UPDATE folders SET name = ? WHERE id = ?", (req.name, folder_id))
-        return {"id": folder_id, "name": req.name}
+    await run_write(_rename_folder, folder_id, user_id, req.name, user_id=user_id)
+    return {"id": folder_id, "name": req.name}
 
 
-@router.delete("/{folder_id}")
-def delete_folder(folder_id: int, user=Depends(get_current_user)):
+@router.delete("/{folder_id}", status_code=status.HTTP_202_ACCEPTED)
+async def delete_folder(folder_id: int, response: Response, user=Depends(get_current_user)):
+    """
+    Delete a folder with everything in it. The folder disappears at once;
+    its contents are purged in the background, and the returned job reports
+    the progress.
+    """
     user_id = user["id"]
-    with get_db() as conn:
-        cursor = conn.cursor()
-        # Check ownership
-        cursor.execute("SELECT id FROM folders WHERE id = ? AND user_id = ?", (folder_id, user_id))
-        if cursor.fetchone() is None:
-            raise HTTPException(status_code=404, detail="Folder not found")
-        # Recursive delete: delete subfolders and files
-        def recursive_delete(fid):
-            cursor.execute("SELECT id FROM folders WHERE parent_folder_id = ? AND user_id = ?", (fid, user_id))
-            for r in cursor.fetchall():
-                recursive_delete(r["id"])
-            cursor.execute("DELETE FROM files WHERE parent_folder_id = ? AND user_id = ?", (fid, user_id))
-            cursor.execute("DELETE FROM folders WHERE id = ? AND user_id = ?", (fid, user_id))
-
-        recursive_delete(folder_id)
-        return {"detail": "Folder and its contents deleted (recursive)"}
+    job_id = await run_write(_delete_folder, folder_id, user_id, user_id=user_id)
+    notify_purge()
+    response.headers["Location"] = f"/folders/jobs/{job_id}"
+    return {"detail": "Folder deleted; its contents are being purged", "job_id": job_id, "status": "pending"}
+
+
+@router.post("/{folder_id}/move")
+async def move_folder(folder_id: int, parent_folder_id: Optional[int] = None, user=Depends(get_current_user)):
+    user_id = user["id"]
+    await run_write(_move_folder, folder_id, user_id, parent_folder_id, user_id=user_id)
+    return {"id": folder_id, "parent_folder_id": parent_folder_id}
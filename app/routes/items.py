@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
+from typing import Optional
 
-from app.database import get_db
+from app.database import get_async_db
+from app.group_commit import run_write
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, next_cursor
 
 router = APIRouter(prefix="/items", tags=["items"])
 
@@ -19,34 +22,54 @@ class ItemResponse(BaseModel):
     name: str
 
 
+def _insert_item(cursor, name: str) -> int:
+    cursor.execute("INSERT INTO items (name) VALUES (?)", (name,))
+    return cursor.lastrowid
+
+
+def _update_item(cursor, item_id: int, name: str) -> None:
+    # Check if item exists
+    cursor.execute("SELECT id FROM items WHERE id = ?", (item_id,))
+    if cursor.fetchone() is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    cursor.execute("UPDATE items SET name = ? WHERE id = ?", (name, item_id))
+
+
+def _delete_item(cursor, item_id: int) -> None:
+    # Check if item exists
+    cursor.execute("SELECT id FROM items WHERE id = ?", (item_id,))
+    if cursor.fetchone() is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
+
+
 @router.get("")
-def list_items():
+async def list_items(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
     """
-    List all items from the database.
+    List items from the database, one page at a time in id order.
+    Pass the returned ``next_cursor`` back as ``cursor`` to get the next page.
     Uses raw SQL query (no ORM).
     """
+    position = decode_cursor(cursor)
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name FROM items ORDER BY id")
-            rows = cursor.fetchall()
-            items = [{"id": row["id"], "name": row["name"]} for row in rows]
-            return {"items": items}
+        async with get_async_db() as db:
+            after_id = position["i"] if position is not None else 0
+            rows = await db.fetchall("SELECT id, name FROM items WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit + 1))
+            items = [{"id": row["id"], "name": row["name"]} for row in rows[:limit]]
+            return {"items": items, "next_cursor": next_cursor(rows, limit)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @router.get("/{item_id}")
-def get_item(item_id: int):
+async def get_item(item_id: int):
     """
     Get a single item by ID.
     Uses raw SQL query (no ORM).
     """
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name FROM items WHERE id = ?", (item_id,))
-            row = cursor.fetchone()
+        async with get_async_db() as db:
+            row = await db.fetchone("SELECT id, name FROM items WHERE id = ?", (item_id,))
             if row is None:
                 raise HTTPException(status_code=404, detail="Item not found")
             return {"id": row["id"], "name": row["name"]}
@@ -57,37 +80,27 @@ def get_item(item_id: int):
 
 
 @router.post("", status_code=201)
-def create_item(item: ItemCreate):
+async def create_item(item: ItemCreate):
     """
     Create a new item.
     Uses raw SQL query (no ORM).
     """
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO items (name) VALUES (?)", (item.name,))
-            item_id = cursor.lastrowid
-            return {"id": item_id, "name": item.name}
+        item_id = await run_write(_insert_item, item.name)
+        return {"id": item_id, "name": item.name}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @router.put("/{item_id}")
-def update_item(item_id: int, item: ItemUpdate):
+async def update_item(item_id: int, item: ItemUpdate):
     """
     Update an existing item.
     Uses raw SQL query (no ORM).
     """
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            # Check if item exists
-            cursor.execute("SELECT id FROM items WHERE id = ?", (item_id,))
-            if cursor.fetchone() is None:
-                raise HTTPException(status_code=404, detail="Item not found")
-            # Update the item
-            cursor.execute("UPDATE items SET name = ? WHERE id = ?", (item.name, item_id))
-            return {"id": item_id, "name": item.name}
+        await run_write(_update_item, item_id, item.name)
+        return {"id": item_id, "name": item.name}
     except HTTPException:
         raise
     except Exception as e:
@@ -95,21 +108,14 @@ def update_item(item_id: int, item: ItemUpdate):
 
 
 @router.delete("/{item_id}", status_code=204)
-def delete_item(item_id: int):
+async def delete_item(item_id: int):
     """
     Delete an item.
     Uses raw SQL query (no ORM).
     """
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            # Check if item exists
-            cursor.execute("SELECT id FROM items WHERE id = ?", (item_id,))
-            if cursor.fetchone() is None:
-                raise HTTPException(status_code=404, detail="Item not found")
-            # Delete the item
-            cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
-            return None
+        await run_write(_delete_item, item_id)
+        return None
     except HTTPException:
         raise
     except Exception as e:
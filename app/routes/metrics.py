@@ -0,0 +1,57 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.admission import admission
+from app.auth import principal_cache
+from app.database import pool_stats
+from app.metrics import REGISTRY, CallbackMetric
+from app.passwords import password_hasher
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _pool_connections() -> dict:
+    stats = pool_stats()
+    return {("idle",): stats["idle"], ("in_use",): stats["in_use"], ("max",): stats["max_size"]}
+
+
+# Snapshot gauges read from the components' own counters at scrape time
+CallbackMetric("db_pool_connections", "Pooled SQLite connections by state.", _pool_connections, ("state",))
+CallbackMetric(
+    "db_pool_waits_total", "Connection checkouts that had to wait for a free connection.",
+    lambda: {(): pool_stats()["waits"]}, kind="counter",
+)
+CallbackMetric(
+    "auth_cache_events_total", "Principal cache lookups and evictions.",
+    lambda: {(key,): value for key, value in principal_cache.stats().items() if key in ("hits", "misses", "evictions")},
+    ("event",), kind="counter",
+)
+CallbackMetric(
+    "password_hash_tasks", "bcrypt operations running or queued.",
+    lambda: {("running",): password_hasher.running, ("queued",): password_hasher.queued},
+    ("state",),
+)
+CallbackMetric(
+    "password_hash_rejected_total", "bcrypt operations rejected with 503 because the queue was full.",
+    lambda: {(): password_hasher.rejected}, kind="counter",
+)
+CallbackMetric(
+    "http_admission_requests", "Requests holding or waiting for an admission slot.",
+    lambda: {
+        (kind, state): admission.stats()[f"{kind}_{state}"]
+        for kind in admission.classes for state in ("running", "queued")
+    },
+    ("class", "state"),
+)
+CallbackMetric(
+    "http_admission_upload_bytes", "Request body bytes reserved by admitted requests.",
+    lambda: {(): admission.stats()["upload_bytes"]},
+)
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Runtime metrics in Prometheus text exposition format."""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
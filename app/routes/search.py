@@ -0,0 +1,87 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Literal, Optional
+import json
+
+from app.auth import get_current_user
+from app.database import get_async_db
+from app.pagination import decode_cursor, encode_cursor
+from app.search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, build_query, file_rowid, query_terms, rank_floors, search, snippets
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("")
+async def search_items(
+    q: str = Query(..., min_length=1, max_length=500),
+    kind: Literal["all", "file", "folder"] = Query("all", alias="type"),
+    prefix: bool = True,
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user),
+):
+    """
+    Search the caller's file and folder names (and the text of text files).
+    Every term must match; with ``prefix`` terms also match longer words.
+    Results are ranked best first; only the newest ``SEARCH_MAX_RANKED``
+    matches of each type are ranked, older ones follow unranked (``score``
+    null). Pass ``next_cursor`` back as ``cursor`` for the next page.
+    """
+    user_id = user["id"]
+    terms = query_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Query has no searchable terms")
+    match = build_query(user_id, terms, prefix)
+    position = decode_cursor(cursor, "rank")
+    after = None
+    if position is not None:
+        floors = position.get("f")
+        if (
+            not (position.get("k") is None or isinstance(position["k"], (int, float)))
+            or not isinstance(floors, list) or len(floors) != 2 or not all(isinstance(f, int) for f in floors)
+        ):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = (position["k"], position["i"])
+
+    async with get_async_db(user_id=user_id) as db:
+        # later pages keep the first page's candidate set
+        floors = position["f"] if position is not None else await db.run(rank_floors, db.cursor(), match, kind)
+        hits = await db.run(search, db.cursor(), match, kind, limit + 1, floors, after)
+        page = hits[:limit]
+        file_ids = [r["rowid"] // 2 for r in page if r["rowid"] % 2 == 0]
+        folder_ids = [r["rowid"] // 2 for r in page if r["rowid"] % 2 == 1]
+        files = {
+            r["id"]: dict(r)
+            for r in await db.fetchall(
+                "SELECT id, name, size, mime_type, parent_folder_id FROM live_files "
+                "WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+                (user_id, json.dumps(file_ids)),
+            )
+        } if file_ids else {}
+        folders = {
+            r["id"]: dict(r)
+            for r in await db.fetchall(
+                "SELECT id, name, parent_folder_id FROM live_folders "
+                "WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+                (user_id, json.dumps(folder_ids)),
+            )
+        } if folder_ids else {}
+        excerpts = await db.run(
+            snippets, db.cursor(), [file_rowid(i) for i in file_ids], terms, prefix
+        ) if file_ids else {}
+
+    results = []
+    for hit in page:
+        row_id = hit["rowid"]
+        item = (files if row_id % 2 == 0 else folders).get(row_id // 2)
+        if item is None:
+            continue
+        score = None if hit["score"] is None else round(-hit["score"], 6)
+        result = {"type": "file" if row_id % 2 == 0 else "folder", **item, "score": score}
+        if row_id in excerpts:
+            result["snippet"] = excerpts[row_id]
+        results.append(result)
+    next_page = None
+    if len(hits) > limit:
+        last = page[-1]
+        next_page = encode_cursor({"i": last["rowid"], "k": last["score"], "f": floors, "s": "rank"})
+    return {"query": q, "results": results, "next_cursor": next_page}
@@ -0,0 +1,257 @@
+from fastapi import APIRouter, HTTPException, Depends, Header, Path, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Optional
+import mimetypes
+import time
+
+from app.auth import get_current_user
+from app.database import get_async_db
+from app.folder_tree import is_live_folder
+from app.storage import SpooledUpload, encode_content, insert_file
+from app.upload_sessions import (
+    COMPLETE,
+    OPEN,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_MAX_CHUNK_SIZE,
+    UPLOAD_MAX_PARTS,
+    assemble,
+    completion_errors,
+    delete_sessions,
+    expected_part_size,
+    expected_parts,
+    expires_at,
+    list_parts,
+    new_session_id,
+    put_part,
+)
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+
+class UploadCreate(BaseModel):
+    name: str
+    parent_folder_id: Optional[int] = None
+    size: Optional[int] = Field(None, ge=0)  # total size, if known up front
+    chunk_size: int = Field(UPLOAD_CHUNK_SIZE, ge=1, le=UPLOAD_MAX_CHUNK_SIZE)
+    mime_type: Optional[str] = None
+
+
+class UploadComplete(BaseModel):
+    sha256: Optional[str] = None  # checksum of the whole file, verified before it is stored
+
+
+async def _get_session(db, session_id: str, user_id: int):
+    session = await db.fetchone(
+        "SELECT id, name, parent_folder_id, mime_type, total_size, chunk_size, status, file_id, expires_at "
+        "FROM upload_sessions WHERE id = ? AND user_id = ? AND expires_at > ?",
+        (session_id, user_id, int(time.time())),
+    )
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+def _session_info(session, parts) -> dict:
+    chunk_size = session["chunk_size"]
+    info = {
+        "id": session["id"],
+        "name": session["name"],
+        "parent_folder_id": session["parent_folder_id"],
+        "size": session["total_size"],
+        "chunk_size": chunk_size,
+        "status": session["status"],
+        "file_id": session["file_id"],
+        "expires_at": session["expires_at"],
+        "received_bytes": sum(part["size"] for part in parts),
+        "parts": [
+            {
+                "part_number": part["part_number"],
+                "offset": part["part_number"] * chunk_size,
+                "size": part["size"],
+                "sha256": part["sha256"],
+            }
+            for part in parts
+        ],
+    }
+    if session["total_size"] is not None and session["status"] == OPEN:
+        received = {part["part_number"] for part in parts}
+        info["missing_parts"] = [
+            n for n in range(expected_parts(session["total_size"], chunk_size)) if n not in received
+        ]
+    return info
+
+
+@router.post("", status_code=201)
+async def create_upload(req: UploadCreate, user=Depends(get_current_user)):
+    """
+    Start a resumable upload. Send the content as numbered parts of
+    ``chunk_size`` bytes (``PUT /uploads/{id}/parts/{n}``), then complete it.
+    """
+    user_id = user["id"]
+    if req.size is not None and expected_parts(req.size, req.chunk_size) > UPLOAD_MAX_PARTS:
+        raise HTTPException(
+            status_code=400, detail=f"File too large for chunk_size {req.chunk_size} (max {UPLOAD_MAX_PARTS} parts)"
+        )
+    mime_type = req.mime_type or mimetypes.guess_type(req.name)[0]
+    session_id = new_session_id()
+    now = time.time()
+    async with get_async_db(write=True, user_id=user_id) as db:
+        if req.parent_folder_id is not None and not await db.run(
+            is_live_folder, db.cursor(), req.parent_folder_id, user_id
+        ):
+            raise HTTPException(status_code=400, detail="Destination folder not found")
+        await db.execute(
+            "INSERT INTO upload_sessions (id, user_id, name, parent_folder_id, mime_type, total_size, chunk_size, "
+            "created_at, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (session_id, user_id, req.name, req.parent_folder_id, mime_type, req.size, req.chunk_size,
+             int(now), expires_at(now)),
+        )
+    return {
+        "id": session_id,
+        "name": req.name,
+        "parent_folder_id": req.parent_folder_id,
+        "size": req.size,
+        "chunk_size": req.chunk_size,
+        "max_parts": UPLOAD_MAX_PARTS,
+        "expires_at": expires_at(now),
+    }
+
+
+@router.get("/{session_id}")
+async def get_upload(session_id: str, user=Depends(get_current_user)):
+    """Session state, including which parts (and byte offsets) have been received."""
+    user_id = user["id"]
+    async with get_async_db(user_id=user_id) as db:
+        session = await _get_session(db, session_id, user_id)
+        parts = await db.run(list_parts, db.cursor(), session_id)
+    return _session_info(session, parts)
+
+
+@router.put("/{session_id}/parts/{part_number}")
+async def upload_part(
+    session_id: str,
+    request: Request,
+    part_number: int = Path(ge=0),
+    x_content_sha256: Optional[str] = Header(None),
+    user=Depends(get_current_user),
+):
+    """
+    Store part ``part_number`` (raw bytes as the body). Sending a part again
+    replaces it. With ``X-Content-SHA256`` the part is rejected unless its
+    SHA-256 matches.
+    """
+    user_id = user["id"]
+    async with get_async_db(user_id=user_id) as db:
+        session = await _get_session(db, session_id, user_id)
+    if session["status"] != OPEN:
+        raise HTTPException(status_code=409, detail="Upload session already completed")
+    chunk_size, total_size = session["chunk_size"], session["total_size"]
+    max_parts = expected_parts(total_size, chunk_size) if total_size is not None else UPLOAD_MAX_PARTS
+    if part_number >= max_parts:
+        raise HTTPException(status_code=400, detail=f"Part number must be below {max_parts}")
+
+    with SpooledUpload() as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+            if upload.size > chunk_size:
+                raise HTTPException(status_code=413, detail=f"Part exceeds chunk_size ({chunk_size} bytes)")
+        if x_content_sha256 is not None and x_content_sha256.strip().lower() != upload.checksum:
+            raise HTTPException(status_code=400, detail="Part checksum mismatch")
+        if total_size is not None:
+            expected = expected_part_size(total_size, chunk_size, part_number)
+            if upload.size != expected:
+                raise HTTPException(status_code=400, detail=f"Part {part_number} must be {expected} bytes")
+
+        async with get_async_db(write=True, user_id=user_id) as db:
+            # the session may have been completed or aborted while the body was read
+            current = await _get_session(db, session_id, user_id)
+            if current["status"] != OPEN:
+                raise HTTPException(status_code=409, detail="Upload session already completed")
+            await db.run(put_part, db.cursor(), session_id, part_number, upload)
+            await db.execute("UPDATE upload_sessions SET expires_at = ? WHERE id = ?", (expires_at(), session_id))
+        return {
+            "part_number": part_number,
+            "offset": part_number * chunk_size,
+            "size": upload.size,
+            "sha256": upload.checksum,
+        }
+
+
+async def _completed_file(db, session, user_id: int) -> dict:
+    file = await db.fetchone(
+        "SELECT id, name, size, mime_type, checksum FROM live_files WHERE id = ? AND user_id = ?",
+        (session["file_id"], user_id),
+    )
+    if file is None:
+        raise HTTPException(status_code=409, detail="Upload session already completed")
+    return dict(file)
+
+
+@router.post("/{session_id}/complete")
+async def complete_upload(
+    session_id: str, req: Optional[UploadComplete] = None, user=Depends(get_current_user)
+):
+    """
+    Assemble the received parts into a file. Either the whole file is created
+    and the parts are dropped, or nothing changes. Completing an already
+    completed session returns the same file.
+    """
+    user_id = user["id"]
+    with SpooledUpload() as upload:
+        async with get_async_db(user_id=user_id) as db:
+            session = await _get_session(db, session_id, user_id)
+            if session["status"] == COMPLETE:
+                return await _completed_file(db, session, user_id)
+            parts = await db.run(list_parts, db.cursor(), session_id)
+            errors = completion_errors(parts, session["total_size"], session["chunk_size"])
+            if errors:
+                raise HTTPException(status_code=400, detail="; ".join(errors))
+            # copy the parts out before taking the writer lock
+            await db.run(assemble, db.connection, parts, upload)
+
+        if req is not None and req.sha256 is not None and req.sha256.strip().lower() != upload.checksum:
+            raise HTTPException(status_code=400, detail="File checksum mismatch")
+        mime_type = session["mime_type"]
+        with await run_in_threadpool(encode_content, upload, mime_type) as content:
+            async with get_async_db(write=True, user_id=user_id) as db:
+                current = await _get_session(db, session_id, user_id)
+                if current["status"] == COMPLETE:
+                    return await _completed_file(db, current, user_id)
+                # a part re-sent since it was assembled would be silently lost
+                received = await db.run(list_parts, db.cursor(), session_id)
+                if [(p["part_number"], p["sha256"]) for p in received] != [
+                    (p["part_number"], p["sha256"]) for p in parts
+                ]:
+                    raise HTTPException(status_code=409, detail="Parts changed during completion; retry")
+                # the folder may have been deleted since the session was created
+                parent_folder_id = session["parent_folder_id"]
+                if parent_folder_id is not None and not await db.run(
+                    is_live_folder, db.cursor(), parent_folder_id, user_id
+                ):
+                    raise HTTPException(status_code=409, detail="Destination folder was deleted")
+                meta = await db.run(
+                    insert_file,
+                    db.cursor(),
+                    name=session["name"],
+                    data=content,
+                    mime_type=mime_type,
+                    user_id=user_id,
+                    parent_folder_id=session["parent_folder_id"],
+                )
+                await db.execute("DELETE FROM upload_parts WHERE session_id = ?", (session_id,))
+                # kept until it expires, so a retried completion finds the file
+                await db.execute(
+                    "UPDATE upload_sessions SET status = ?, file_id = ?, expires_at = ? WHERE id = ?",
+                    (COMPLETE, meta["id"], expires_at(), session_id),
+                )
+                return meta
+
+
+@router.delete("/{session_id}")
+async def abort_upload(session_id: str, user=Depends(get_current_user)):
+    user_id = user["id"]
+    async with get_async_db(write=True, user_id=user_id) as db:
+        await _get_session(db, session_id, user_id)
+        await db.run(delete_sessions, db.cursor(), [session_id])
+    return {"detail": "Upload session deleted"}
@@ -0,0 +1,234 @@
+"""Full-text search over file and folder names (migration 012).
+
+``search_index`` is an FTS5 table with one row per file (rowid ``id * 2``)
+and folder (rowid ``id * 2 + 1``). Names are kept in sync by triggers; for
+text files the application also indexes the first ``PROBE_SIZE`` bytes of
+content as ``body``. Every row carries an ``owner`` token (``u<user_id>``)
+and every query is ANDed with it, so the user scope is resolved inside the
+full-text index rather than by filtering another user's matches afterwards.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import unicodedata
+from typing import List, Optional, Tuple
+
+from app.compression import IDENTITY, PROBE_SIZE, DecodingReader
+
+SEARCH_INDEX_TEXT = os.getenv("SEARCH_INDEX_TEXT", "1").lower() in ("1", "true", "yes")
+# bm25 costs a few microseconds per match, so only this many of the most
+# recent matches are ranked (0 ranks all of them)
+SEARCH_MAX_RANKED = int(os.getenv("SEARCH_MAX_RANKED", "20000"))
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_QUERY_TERMS = 16
+SNIPPET_TOKENS = 12
+
+TEXT_TYPES = ("text/", "application/json", "application/xml", "application/x-ndjson", "application/javascript")
+
+# what the unicode61 tokenizer treats as a token: letters and digits
+_TERM_RE = re.compile(r"[^\W_]+")
+
+
+def file_rowid(file_id: int) -> int:
+    return file_id * 2
+
+
+def folder_rowid(folder_id: int) -> int:
+    return folder_id * 2 + 1
+
+
+def query_terms(text: str) -> List[str]:
+    """Split user input into the tokens the index would produce for it."""
+    return [_fold(term) for term in _TERM_RE.findall(text)][:MAX_QUERY_TERMS]
+
+
+def build_query(user_id: int, terms: List[str], prefix: bool = True) -> str:
+    """FTS5 MATCH expression requiring every term in the name or body.
+
+    User input never reaches the FTS5 query parser unquoted: each term is
+    matched as a quoted token. With ``prefix`` every term of two or more
+    characters also matches longer tokens (``rep`` finds ``report``).
+    """
+    phrases = " ".join(f'"{term}"*' if prefix and len(term) >= 2 else f'"{term}"' for term in terms)
+    return f'owner : "u{user_id}" AND {{name body}} : ({phrases})'
+
+
+def _fold(token: str) -> str:
+    # same folding as the unicode61 tokenizer: lower case, no diacritics
+    decomposed = unicodedata.normalize("NFKD", token.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def is_text_type(mime_type: Optional[str]) -> bool:
+    return SEARCH_INDEX_TEXT and bool(mime_type) and mime_type.startswith(TEXT_TYPES)
+
+
+def extract_text(mime_type: Optional[str], head: bytes) -> str:
+    """Text to index as ``body`` for a file starting with ``head`` ('' if none)."""
+    if not head or not is_text_type(mime_type):
+        return ""
+    return head[:PROBE_SIZE].decode("utf-8", "ignore")
+
+
+def index_file_text(cursor: sqlite3.Cursor, file_id: int, text: str) -> None:
+    cursor.execute("UPDATE search_index SET body = ? WHERE rowid = ?", (text, file_rowid(file_id)))
+
+
+PARITIES = {"all": (0, 1), "file": (0,), "folder": (1,)}
+
+
+def rank_floors(cursor: sqlite3.Cursor, query: str, kind: str) -> List[int]:
+    """``[file floor, folder floor]``: the lowest rowid among the ``SEARCH_MAX_RANKED`` newest matches of each kind.
+
+    File and folder rowids come from separate id sequences, so each kind gets
+    its own floor (0, rank everything, if it has fewer matches or is not
+    searched). FTS5 walks a doclist in rowid order, so this costs one pass
+    over at most that many matches per kind instead of scoring all of them.
+    """
+    floors = [0, 0]
+    if not SEARCH_MAX_RANKED:
+        return floors
+    for parity in PARITIES[kind]:
+        cursor.execute(
+            "SELECT rowid FROM search_index WHERE search_index MATCH ? AND rowid % 2 = ? "
+            "ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            (query, parity, SEARCH_MAX_RANKED - 1),
+        )
+        row = cursor.fetchone()
+        floors[parity] = row[0] if row is not None else 0
+    return floors
+
+
+def search(
+    cursor: sqlite3.Cursor,
+    query: str,
+    kind: str,
+    limit: int,
+    floors: Tuple[int, int] = (0, 0),
+    after: Optional[Tuple[Optional[float], int]] = None,
+) -> List[sqlite3.Row]:
+    """One page of ``(rowid, score)`` rows, best match first.
+
+    Matches at or above their kind's floor are ranked; the older ones follow
+    them in rowid order with a ``None`` score. ``after`` is the
+    ``(score, rowid)`` of the last row of the previous page.
+    """
+    params: list = [floors[0], floors[1], query, json.dumps(PARITIES[kind])]
+    if after is None:
+        page = ""
+    elif after[0] is None:
+        page = "WHERE score IS NULL AND rowid > ?"
+        params.append(after[1])
+    else:
+        page = "WHERE score IS NULL OR score > ? OR (score = ? AND rowid > ?)"
+        params.extend([after[0], after[0], after[1]])
+    # bm25 column weights: a hit in the name outranks one in the body
+    cursor.execute(
+        "SELECT rowid, score FROM ("
+        "  SELECT rowid, CASE WHEN rowid >= (CASE rowid % 2 WHEN 0 THEN ? ELSE ? END)"
+        "    THEN bm25(search_index, 10.0, 1.0, 0.0) END AS score FROM search_index"
+        "  WHERE search_index MATCH ? AND rowid % 2 IN (SELECT value FROM json_each(?))"
+        f") {page} "
+        "ORDER BY score IS NULL, score, rowid LIMIT ?",
+        (*params, limit),
+    )
+    return cursor.fetchall()
+
+
+def _matches(token: str, terms: List[str], prefix: bool) -> bool:
+    folded = _fold(token)
+    return any(folded == term or (prefix and len(term) >= 2 and folded.startswith(term)) for term in terms)
+
+
+def make_snippet(text: str, terms: List[str], prefix: bool) -> Optional[str]:
+    """About ``SNIPPET_TOKENS`` tokens of ``text`` around the first match, matches in brackets."""
+    tokens = []
+    hit = None
+    for match in _TERM_RE.finditer(text):
+        tokens.append(match)
+        if hit is None and _matches(match.group(), terms, prefix):
+            hit = len(tokens) - 1
+        if hit is not None and len(tokens) >= max(hit - 3, 0) + SNIPPET_TOKENS + 1:
+            break
+    if hit is None:
+        return None
+    start = max(hit - 3, 0)
+    window = tokens[start:start + SNIPPET_TOKENS]
+    parts = ["... "] if start > 0 else []
+    position = window[0].start()
+    for match in window:
+        parts.append(text[position:match.start()])
+        parts.append(f"[{match.group()}]" if _matches(match.group(), terms, prefix) else match.group())
+        position = match.end()
+    if len(tokens) > start + SNIPPET_TOKENS:
+        parts.append(" ...")
+    return " ".join("".join(parts).split())
+
+
+def snippets(cursor: sqlite3.Cursor, rowids: List[int], terms: List[str], prefix: bool) -> dict:
+    """Body excerpts for the rows of one page.
+
+    Built here rather than with FTS5 ``snippet()``, which would re-run the
+    full-text query (and expand every prefix term) for each row.
+    """
+    cursor.execute(
+        "SELECT rowid, body FROM search_index WHERE rowid IN (SELECT value FROM json_each(?))",
+        (json.dumps(rowids),),
+    )
+    excerpts = {}
+    for rowid, body in cursor.fetchall():
+        excerpt = make_snippet(body, terms, prefix) if body else None
+        if excerpt:
+            excerpts[rowid] = excerpt
+    return excerpts
+
+
+def _read_head(conn: sqlite3.Connection, blob_id: int, codec: str) -> bytes:
+    with conn.blobopen("blobs", "content", blob_id, readonly=True) as blob:
+        if codec == IDENTITY:
+            return blob.read(PROBE_SIZE)
+        reader = DecodingReader(blob, codec)
+        head = b""
+        while len(head) < PROBE_SIZE:
+            chunk = reader.read(PROBE_SIZE - len(head))
+            if not chunk:
+                break
+            head += chunk
+        return head
+
+
+def reindex_user(cursor: sqlite3.Cursor, user_id: int) -> Tuple[int, int]:
+    """Rebuild every index row owned by ``user_id``; returns ``(files, folders)``."""
+    cursor.execute(
+        "DELETE FROM search_index WHERE rowid IN "
+        "(SELECT rowid FROM search_index WHERE search_index MATCH ?)",
+        (f'owner : "u{user_id}"',),
+    )
+    cursor.execute(
+        "INSERT INTO search_index (rowid, name, body, owner) "
+        "SELECT id * 2, name, '', 'u' || user_id FROM files WHERE user_id = ?",
+        (user_id,),
+    )
+    files = cursor.rowcount
+    cursor.execute(
+        "INSERT INTO search_index (rowid, name, body, owner) "
+        "SELECT id * 2 + 1, name, '', 'u' || user_id FROM folders WHERE user_id = ?",
+        (user_id,),
+    )
+    folders = cursor.rowcount
+    if SEARCH_INDEX_TEXT:
+        cursor.execute(
+            "SELECT f.id, f.mime_type, b.id AS blob_id, b.codec FROM files f JOIN blobs b ON b.id = f.blob_id "
+            "WHERE f.user_id = ? AND f.size > 0",
+            (user_id,),
+        )
+        for file_id, mime_type, blob_id, codec in cursor.fetchall():
+            if is_text_type(mime_type):
+                text = extract_text(mime_type, _read_head(cursor.connection, blob_id, codec))
+                if text:
+                    index_file_text(cursor, file_id, text)
+    return files, folders
@@ -0,0 +1,37 @@
+"""Optional ``Server-Timing`` response header with per-request database waits.
+
+Enabled with ``SERVER_TIMING=1`` (the benchmark suite does this). Reports
+``db-wait`` (waiting for a pooled connection, including executor queueing and
+the writer lock) and ``db-lock`` (the part spent in ``BEGIN IMMEDIATE``
+waiting for SQLite's writer lock), both in milliseconds.
+"""
+
+import os
+
+from app.database import begin_request_timing, end_request_timing
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0").lower() in ("1", "true", "yes")
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token, timing = begin_request_timing()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                value = ", ".join(
+                    f"{key.replace('_', '-')};dur={seconds * 1000:.3f}" for key, seconds in timing.items()
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_request_timing(token)
@@ -0,0 +1,289 @@
+"""File content storage helpers.
+
+Uploads are accumulated in a ``SpooledUpload`` (memory up to a threshold, then
+a temp file) while their size and SHA-256 are computed, and are written with
+SQLite incremental blob I/O, so no step needs the whole file in memory at once.
+
+Content lives in the content-addressable ``blobs`` table: each distinct
+SHA-256 is stored once and ``files.blob_id`` points at it. Reference counts
+are maintained by triggers on ``files`` (see migration 004), which also drop
+blobs once nothing references them. Content is compressed per MIME type on
+the way in and decoded on the way out (``app.compression``); ``blobs.size``
+is always the original size. The leading text of text files is added to the
+search index (``app.search``) as the file is inserted.
+"""
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+from typing import AsyncIterator, Iterator, Optional, Union
+
+from app.compression import (
+    IDENTITY,
+    PROBE_SIZE,
+    DecodingReader,
+    choose_codec,
+    decompress,
+    make_compressor,
+    worth_keeping,
+)
+from app.search import extract_text, index_file_text
+from app.tracing import record_span, span
+
+CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", str(1024 * 1024)))
+SPOOL_MAX_MEMORY = int(os.getenv("STORAGE_SPOOL_MAX_MEMORY", str(4 * 1024 * 1024)))
+
+
+class SpooledUpload:
+    """Write-once buffer that tracks size and SHA-256 of what is written."""
+
+    def __init__(self, max_memory: int = SPOOL_MAX_MEMORY):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    @property
+    def checksum(self) -> str:
+        return self._hash.hexdigest()
+
+    def peek(self, size: int) -> bytes:
+        """The first ``size`` bytes written."""
+        self._file.seek(0)
+        return self._file.read(size)
+
+    def iter_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        self._file.seek(0)
+        while True:
+            chunk = self._file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EncodedContent:
+    """Upload content after the storage codec has been applied (see ``encode_content``).
+
+    ``size``, ``checksum`` and ``head`` (the first ``PROBE_SIZE`` bytes)
+    describe the original bytes; ``stored_size`` is what will actually be
+    written to ``blobs.content``.
+    """
+
+    def __init__(self, size: int, checksum: str, codec: str, stored, stored_size: int, head: bytes = b""):
+        self.size = size
+        self.checksum = checksum
+        self.head = head
+        self.codec = codec
+        self.stored_size = stored_size
+        self._stored = stored  # bytes, a SpooledUpload or a spooled temp file
+
+    def iter_stored_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        if isinstance(self._stored, bytes):
+            yield self._stored
+        elif isinstance(self._stored, SpooledUpload):
+            yield from self._stored.iter_chunks(chunk_size)
+        else:
+            self._stored.seek(0)
+            while True:
+                chunk = self._stored.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def close(self) -> None:
+        if not isinstance(self._stored, (bytes, SpooledUpload)):
+            self._stored.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def encode_content(data: Union[bytes, SpooledUpload], mime_type: Optional[str]) -> EncodedContent:
+    """
+    Compress ``data`` according to the per-MIME policy in ``app.compression``.
+    CPU-bound: call it before opening the write transaction, e.g. via
+    ``run_in_threadpool``, so the writer lock is not held while compressing.
+    """
+    if isinstance(data, SpooledUpload):
+        size, checksum, head = data.size, data.checksum, data.peek(PROBE_SIZE)
+    else:
+        size, checksum, head = len(data), hashlib.sha256(data).hexdigest(), data[:PROBE_SIZE]
+    codec, level = choose_codec(mime_type, size, head)
+    if codec == IDENTITY:
+        return EncodedContent(size, checksum, IDENTITY, data, size, head)
+    with span("blob.compress", codec=codec, bytes=size):
+        compressor = make_compressor(codec, level)
+        if isinstance(data, bytes):
+            stored = compressor.compress(data) + compressor.flush()
+            stored_size = len(stored)
+        else:
+            stored = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+            for chunk in data.iter_chunks():
+                stored.write(compressor.compress(chunk))
+            stored.write(compressor.flush())
+            stored_size = stored.tell()
+    if not worth_keeping(stored_size, size):
+        if not isinstance(stored, bytes):
+            stored.close()
+        return EncodedContent(size, checksum, IDENTITY, data, size, head)
+    return EncodedContent(size, checksum, codec, stored, stored_size, head)
+
+
+def put_blob(cursor: sqlite3.Cursor, content: EncodedContent) -> int:
+    """Return the id of the blob holding ``content``, writing it only if new."""
+    cursor.execute("SELECT id FROM blobs WHERE sha256 = ?", (content.checksum,))
+    row = cursor.fetchone()
+    if row is not None:
+        return row[0]
+    # another writer (e.g. a second process) may have stored it since the SELECT
+    cursor.execute(
+        "INSERT INTO blobs (sha256, size, codec, stored_size, content) VALUES (?, ?, ?, ?, zeroblob(?)) "
+        "ON CONFLICT(sha256) DO NOTHING",
+        (content.checksum, content.size, content.codec, content.stored_size, content.stored_size),
+    )
+    if cursor.rowcount == 0:
+        cursor.execute("SELECT id FROM blobs WHERE sha256 = ?", (content.checksum,))
+        return cursor.fetchone()[0]
+    blob_id = cursor.lastrowid
+    if content.stored_size:
+        with span("blob.write", bytes=content.stored_size), \
+                cursor.connection.blobopen("blobs", "content", blob_id) as blob:
+            for chunk in content.iter_stored_chunks():
+                blob.write(chunk)
+    return blob_id
+
+
+def insert_file(
+    cursor: sqlite3.Cursor,
+    *,
+    name: str,
+    data: Union[bytes, SpooledUpload, EncodedContent],
+    mime_type: Optional[str],
+    user_id: int,
+    parent_folder_id: Optional[int],
+) -> dict:
+    """Insert a ``files`` row for ``data`` and return its metadata."""
+    if not isinstance(data, EncodedContent):
+        data = encode_content(data, mime_type)
+    blob_id = put_blob(cursor, data)
+    cursor.execute(
+        "INSERT INTO files (name, size, mime_type, checksum, blob_id, user_id, parent_folder_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (name, data.size, mime_type, data.checksum, blob_id, user_id, parent_folder_id),
+    )
+    file_id = cursor.lastrowid
+    text = extract_text(mime_type, data.head)
+    if text:
+        index_file_text(cursor, file_id, text)
+    return {"id": file_id, "name": name, "size": data.size, "mime_type": mime_type, "checksum": data.checksum}
+
+
+def read_blob(cursor: sqlite3.Cursor, blob_id: Optional[int]) -> bytes:
+    """Return the whole (decoded) content of a blob (empty for files without one)."""
+    if blob_id is None:
+        return b""
+    cursor.execute("SELECT content, codec FROM blobs WHERE id = ?", (blob_id,))
+    row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return b""
+    return decompress(row[1], bytes(row[0]))
+
+
+async def aiter_blob_content(
+    user_id: int, blob_id: int, start: int = 0, end: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """Yield the decoded ``content[start:end]`` of one of ``user_id``'s blobs in ``CHUNK_SIZE`` pieces.
+
+    Meant to be handed to a streaming response, so it never holds a pooled
+    connection (or a read snapshot, which would hold back WAL checkpoints)
+    while a client is slow to read: each chunk of an uncompressed blob is
+    read with its own short checkout. A compressed blob is first copied to a
+    ``SpooledTemporaryFile`` in one checkout and decompressed from there; a
+    range into one has to decode (and discard) everything before ``start``.
+    """
+    from app.database import get_async_db, get_executor, run_in_executor
+
+    async with get_async_db(user_id=user_id) as db:
+        row = await db.fetchone("SELECT codec FROM blobs WHERE id = ?", (blob_id,))
+        codec = row["codec"] if row is not None else IDENTITY
+        spooled = None if codec == IDENTITY else await db.run(_spool_blob, db.connection, blob_id)
+    # one span for the whole stream, counting only time spent reading
+    first_read = time.perf_counter()
+    read_time = 0.0
+    sent = 0
+    try:
+        if spooled is None:
+            position = start
+        else:
+            reader = DecodingReader(spooled, codec, CHUNK_SIZE)
+            position = 0
+        while end is None or start + sent < end:
+            length = CHUNK_SIZE if end is None else min(CHUNK_SIZE, end - position)
+            read_start = time.perf_counter()
+            if spooled is None:
+                async with get_async_db(user_id=user_id) as db:
+                    chunk = await db.run(_read_range, db.connection, blob_id, position, length)
+            else:
+                chunk = await run_in_executor(get_executor(), reader.read, length)
+            read_time += time.perf_counter() - read_start
+            if not chunk:
+                break
+            chunk_start, position = position, position + len(chunk)
+            if position <= start:
+                continue  # decoded bytes before the requested range
+            if chunk_start < start:
+                chunk = chunk[start - chunk_start:]
+            sent += len(chunk)
+            yield chunk
+    finally:
+        if spooled is not None:
+            spooled.close()
+        record_span("blob.read", first_read, read_time, bytes=sent, codec=codec)
+
+
+def _read_range(conn: sqlite3.Connection, blob_id: int, offset: int, length: int) -> bytes:
+    """``length`` bytes of a stored blob from ``offset``; empty once it is gone (deleted mid-stream)."""
+    try:
+        blob = conn.blobopen("blobs", "content", blob_id, readonly=True)
+    except sqlite3.OperationalError:
+        return b""
+    with blob:
+        blob.seek(min(offset, len(blob)))
+        return blob.read(length)
+
+
+def _spool_blob(conn: sqlite3.Connection, blob_id: int) -> tempfile.SpooledTemporaryFile:
+    """Copy a stored (compressed) blob to a temp file, so it can be decoded without a connection."""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    try:
+        blob = conn.blobopen("blobs", "content", blob_id, readonly=True)
+    except sqlite3.OperationalError:
+        return spooled
+    with blob:
+        while True:
+            chunk = blob.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
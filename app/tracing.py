@@ -0,0 +1,229 @@
+"""Request tracing with slow-request and slow-query logs.
+
+Every HTTP request gets an id (a well-formed incoming ``X-Request-ID`` is kept,
+otherwise one is generated) that is echoed in the response. While a request
+runs, spans are collected for JWT decoding, the user lookup, password hashing,
+every SQL statement and blob I/O. The whole trace is written as one JSON line
+when the request takes longer than ``SLOW_REQUEST_MS`` or is sampled
+(``TRACE_SAMPLE_RATE``); statements slower than ``SLOW_QUERY_MS`` are logged
+on their own.
+
+Records are queued and written by a background thread, so the request path
+never blocks on log output. With ``TRACING_ENABLED=0`` the middleware is not
+installed and every hook returns immediately.
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1").lower() in ("1", "true", "yes")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))  # 0 disables
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # 0 disables
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))
+TRACE_LOG = os.getenv("TRACE_LOG", "stderr")  # stderr, stdout or a file path
+
+REQUEST_ID_HEADER = b"x-request-id"
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+_MAX_STATEMENT_CHARS = 1000
+
+
+class Trace:
+    __slots__ = ("request_id", "start", "spans", "dropped")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+
+    def add(self, name: str, start: float, duration: float, attrs: dict) -> None:
+        # list.append is atomic, so executor threads can add spans concurrently
+        if len(self.spans) < TRACE_MAX_SPANS:
+            self.spans.append((name, start, duration, attrs))
+        else:
+            self.dropped += 1
+
+    def to_record(self, scope: dict, status: int, duration: float) -> dict:
+        spans = []
+        for name, start, span_duration, attrs in self.spans:
+            span = {
+                "name": name,
+                "start_ms": round((start - self.start) * 1000, 3),
+                "duration_ms": round(span_duration * 1000, 3),
+            }
+            for key, value in attrs.items():
+                span[key] = _compact_sql(value) if key == "statement" else value
+            spans.append(span)
+        return {
+            "type": "request",
+            "request_id": self.request_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(scope.get("route"), "path", None),
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "spans": spans,
+            "spans_dropped": self.dropped,
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def record_span(name: str, start: float, duration: float, **attrs) -> None:
+    """Attach an already-timed span to the current request, if it is traced."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, start, duration, attrs)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[None]:
+    """Time the enclosed block as a span of the current request."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter() - start, attrs)
+
+
+def record_sql(sql: str, start: float, duration: float) -> None:
+    """Called by the instrumented cursor after every statement."""
+    if not TRACING_ENABLED:
+        return
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add("sql", start, duration, {"statement": sql})
+    if SLOW_QUERY_MS and duration * 1000 >= SLOW_QUERY_MS:
+        _emit({
+            "type": "slow_query",
+            "request_id": trace.request_id if trace is not None else None,
+            "duration_ms": round(duration * 1000, 3),
+            "statement": _compact_sql(sql),
+        })
+
+
+def _compact_sql(sql: str) -> str:
+    # parameters are never logged, only the statement text
+    return " ".join(sql.split())[:_MAX_STATEMENT_CHARS]
+
+
+# --- log output ----------------------------------------------------------------
+
+logger = logging.getLogger("app.tracing")
+logger.propagate = False
+logger.setLevel(logging.INFO)
+
+
+class _PassThroughQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # leave formatting (json.dumps) to the listener thread
+        return record
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, default=str)
+
+
+_log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_lock = threading.Lock()
+logger.addHandler(_PassThroughQueueHandler(_log_queue))
+
+
+def _open_output() -> logging.Handler:
+    if TRACE_LOG == "stderr":
+        handler = logging.StreamHandler(sys.stderr)
+    elif TRACE_LOG == "stdout":
+        handler = logging.StreamHandler(sys.stdout)
+    else:
+        handler = logging.FileHandler(TRACE_LOG)
+    handler.setFormatter(_JsonFormatter())
+    return handler
+
+
+def _emit(record: dict) -> None:
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = logging.handlers.QueueListener(_log_queue, _open_output())
+                _listener.start()
+    logger.info(record)
+
+
+def stop_trace_log() -> None:
+    """Flush queued records and stop the writer thread (application shutdown)."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+
+
+# --- middleware ----------------------------------------------------------------
+
+def _incoming_request_id(scope: dict) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == REQUEST_ID_HEADER:
+            request_id = value.decode("latin-1")
+            return request_id if _REQUEST_ID_RE.match(request_id) else None
+    return None
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware that assigns request ids and logs slow or sampled traces."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace(_incoming_request_id(scope) or uuid.uuid4().hex)
+        token = _current_trace.set(trace)
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER, trace.request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            _current_trace.reset(token)
+            duration = time.perf_counter() - trace.start
+            slow = SLOW_REQUEST_MS and duration * 1000 >= SLOW_REQUEST_MS
+            if slow or (TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE):
+                _emit(trace.to_record(scope, status, duration))
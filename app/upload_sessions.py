@@ -0,0 +1,158 @@
+"""Resumable chunked upload sessions.
+
+A session collects the parts of one large file in ``upload_parts`` (migration
+010). Part ``n`` (0-based) holds bytes ``[n * chunk_size, (n + 1) * chunk_size)``;
+parts may arrive in any order or in parallel, and re-sending a part replaces
+it. Finalizing concatenates the parts into a ``SpooledUpload`` outside the
+write transaction, then creates the ``files`` row and drops the parts in one
+transaction.
+
+A session expires ``UPLOAD_SESSION_TTL`` seconds after it was created or last
+received a part; ``run_cleanup`` deletes expired sessions in the background.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import time
+from typing import List, Optional
+
+from app.storage import CHUNK_SIZE, SpooledUpload
+from app.tracing import span
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_MAX_CHUNK_SIZE = int(os.getenv("UPLOAD_MAX_CHUNK_SIZE", str(64 * 1024 * 1024)))
+UPLOAD_MAX_PARTS = int(os.getenv("UPLOAD_MAX_PARTS", "10000"))
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 60 * 60)))
+UPLOAD_CLEANUP_INTERVAL = float(os.getenv("UPLOAD_CLEANUP_INTERVAL", "300"))  # 0 disables
+UPLOAD_CLEANUP_BATCH = int(os.getenv("UPLOAD_CLEANUP_BATCH", "100"))
+
+OPEN = "open"
+COMPLETE = "complete"
+
+logger = logging.getLogger(__name__)
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(18)
+
+
+def expires_at(now: Optional[float] = None) -> int:
+    return int(now if now is not None else time.time()) + UPLOAD_SESSION_TTL
+
+
+def expected_parts(total_size: int, chunk_size: int) -> int:
+    return -(-total_size // chunk_size)
+
+
+def expected_part_size(total_size: int, chunk_size: int, part_number: int) -> int:
+    return max(0, min(chunk_size, total_size - part_number * chunk_size))
+
+
+def put_part(cursor: sqlite3.Cursor, session_id: str, part_number: int, upload: SpooledUpload) -> None:
+    """Store (or replace) one part, writing its bytes with incremental blob I/O."""
+    cursor.execute(
+        "INSERT OR REPLACE INTO upload_parts (session_id, part_number, size, sha256, content) "
+        "VALUES (?, ?, ?, ?, zeroblob(?))",
+        (session_id, part_number, upload.size, upload.checksum, upload.size),
+    )
+    part_id = cursor.lastrowid
+    if upload.size:
+        with span("blob.write", bytes=upload.size), \
+                cursor.connection.blobopen("upload_parts", "content", part_id) as blob:
+            for chunk in upload.iter_chunks():
+                blob.write(chunk)
+
+
+def list_parts(cursor: sqlite3.Cursor, session_id: str) -> List[sqlite3.Row]:
+    cursor.execute(
+        "SELECT id, part_number, size, sha256 FROM upload_parts WHERE session_id = ? ORDER BY part_number",
+        (session_id,),
+    )
+    return cursor.fetchall()
+
+
+def completion_errors(parts: List[sqlite3.Row], total_size: Optional[int], chunk_size: int) -> List[str]:
+    """Reasons the received parts do not form a complete file (empty if they do)."""
+    numbers = [part["part_number"] for part in parts]
+    count = expected_parts(total_size, chunk_size) if total_size is not None else (numbers[-1] + 1 if numbers else 0)
+    missing = sorted(set(range(count)) - set(numbers))
+    errors = []
+    if missing:
+        errors.append(f"Missing parts: {', '.join(map(str, missing[:20]))}{', ...' if len(missing) > 20 else ''}")
+    extra = [n for n in numbers if n >= count]
+    if extra:
+        errors.append(f"Unexpected parts beyond the declared size: {', '.join(map(str, extra[:20]))}")
+    for part in parts:
+        n = part["part_number"]
+        if n >= count:
+            continue
+        if total_size is not None:
+            expected = expected_part_size(total_size, chunk_size, n)
+            if part["size"] != expected:
+                errors.append(f"Part {n} has {part['size']} bytes, expected {expected}")
+        elif n < count - 1 and part["size"] != chunk_size:
+            errors.append(f"Part {n} has {part['size']} bytes, expected {chunk_size}")
+    return errors
+
+
+def assemble(conn: sqlite3.Connection, parts: List[sqlite3.Row], target: SpooledUpload) -> None:
+    """Concatenate ``parts`` in order into ``target``, reading each blob in pieces."""
+    with span("upload.assemble", parts=len(parts)):
+        for part in parts:
+            if not part["size"]:
+                continue
+            with conn.blobopen("upload_parts", "content", part["id"], readonly=True) as blob:
+                while True:
+                    chunk = blob.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+
+
+def delete_sessions(cursor: sqlite3.Cursor, session_ids: List[str]) -> None:
+    ids = json.dumps(session_ids)
+    cursor.execute("DELETE FROM upload_parts WHERE session_id IN (SELECT value FROM json_each(?))", (ids,))
+    cursor.execute("DELETE FROM upload_sessions WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+
+
+def expire_sessions(cursor: sqlite3.Cursor, now: int, limit: int = UPLOAD_CLEANUP_BATCH) -> int:
+    """Delete up to ``limit`` expired sessions with their parts; returns how many."""
+    cursor.execute("SELECT id FROM upload_sessions WHERE expires_at <= ? LIMIT ?", (now, limit))
+    session_ids = [row[0] for row in cursor.fetchall()]
+    if session_ids:
+        delete_sessions(cursor, session_ids)
+    return len(session_ids)
+
+
+async def cleanup_expired() -> int:
+    """Delete all expired sessions on every shard, one short write transaction per batch."""
+    from app.database import DB_SHARDS, get_async_db
+
+    total = 0
+    for shard in range(DB_SHARDS):
+        while True:
+            async with get_async_db(write=True, shard=shard) as db:
+                deleted = await db.run(expire_sessions, db.cursor(), int(time.time()))
+            total += deleted
+            if deleted < UPLOAD_CLEANUP_BATCH:
+                break
+    return total
+
+
+async def run_cleanup(interval: float = UPLOAD_CLEANUP_INTERVAL) -> None:
+    """Background task started by the application lifespan."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            deleted = await cleanup_expired()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Upload session cleanup failed")
+            continue
+        if deleted:
+            logger.info("Deleted %d expired upload sessions", deleted)
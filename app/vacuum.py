@@ -0,0 +1,179 @@
+"""Free-space reclamation and planner statistics.
+
+Deleting files and folders leaves their pages on the database's freelist:
+SQLite reuses them for new rows but never gives them back to the filesystem.
+With ``auto_vacuum = INCREMENTAL`` (migration 014) ``PRAGMA
+incremental_vacuum(N)`` moves up to ``N`` pages from the end of the file into
+free slots and truncates it (in WAL mode the file shrinks at the next
+checkpoint).
+
+``run_vacuum``, started by the application lifespan, checks every database
+each ``VACUUM_INTERVAL`` seconds. When at least ``VACUUM_MIN_FREE_PAGES`` are
+free it reclaims them ``VACUUM_STEP_PAGES`` at a time, one short write
+transaction per step, and only while the server is quiet: it gives up until
+the next check as soon as more than ``VACUUM_MAX_IN_FLIGHT`` requests are
+running or another write transaction is waiting. Requests in flight are
+counted by the admission middleware, or failing that by the metrics
+middleware; with both disabled the load is unknown and nothing is reclaimed. Every ``OPTIMIZE_INTERVAL``
+seconds it also runs ``PRAGMA optimize``, which re-runs ``ANALYZE`` on
+tables whose statistics went stale, bounded by ``OPTIMIZE_ANALYSIS_LIMIT``.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.admission import ADMISSION_CONTROL, admission
+from app.database import DB_SHARDS, database_path, get_async_db, write_in_progress
+from app.metrics import DB_FREE_PAGES, DB_VACUUMED_PAGES, HTTP_IN_FLIGHT, METRICS_ENABLED
+
+VACUUM_INTERVAL = float(os.getenv("VACUUM_INTERVAL", "300"))  # 0 disables the background task
+VACUUM_STEP_PAGES = int(os.getenv("VACUUM_STEP_PAGES", "1000"))
+VACUUM_MIN_FREE_PAGES = int(os.getenv("VACUUM_MIN_FREE_PAGES", "1000"))
+VACUUM_MAX_IN_FLIGHT = int(os.getenv("VACUUM_MAX_IN_FLIGHT", "2"))
+VACUUM_PAUSE = float(os.getenv("VACUUM_PAUSE_MS", "50")) / 1000
+OPTIMIZE_INTERVAL = float(os.getenv("OPTIMIZE_INTERVAL", "3600"))  # 0 disables
+OPTIMIZE_ANALYSIS_LIMIT = int(os.getenv("OPTIMIZE_ANALYSIS_LIMIT", "1000"))
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+logger = logging.getLogger(__name__)
+
+
+def databases() -> List[Tuple[str, Optional[int]]]:
+    """``(label, shard)`` for the catalog and every shard; shard None is the catalog."""
+    if DB_SHARDS == 1:
+        return [("main", None)]
+    return [("catalog", None)] + [(f"shard{n}", n) for n in range(DB_SHARDS)]
+
+
+def _pragma(cursor: sqlite3.Cursor, name: str) -> int:
+    cursor.execute(f"PRAGMA {name}")
+    return cursor.fetchone()[0]
+
+
+def storage_stats(cursor: sqlite3.Cursor) -> dict:
+    """Size, free space and vacuum mode of the database ``cursor`` is connected to."""
+    page_size = _pragma(cursor, "page_size")
+    page_count = _pragma(cursor, "page_count")
+    free_pages = _pragma(cursor, "freelist_count")
+    return {
+        "auto_vacuum": AUTO_VACUUM_MODES.get(_pragma(cursor, "auto_vacuum"), "unknown"),
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": free_pages,
+        "size_bytes": page_size * page_count,
+        "free_bytes": page_size * free_pages,
+        "free_ratio": round(free_pages / page_count, 4) if page_count else 0.0,
+    }
+
+
+def page_fragmentation(cursor: sqlite3.Cursor) -> Dict[str, dict]:
+    """Per table and index: pages, and the share of pages not directly after the previous one.
+
+    Reads every page through the ``dbstat`` table, so it costs a full scan of
+    the file. A sequential read of a b-tree or blob is fastest near 0.
+    """
+    cursor.execute("SELECT name, pageno FROM dbstat")
+    stats: Dict[str, dict] = {}
+    previous: Dict[str, int] = {}
+    for name, pageno in cursor:
+        entry = stats.setdefault(name, {"pages": 0, "jumps": 0})
+        entry["pages"] += 1
+        if name in previous and pageno != previous[name] + 1:
+            entry["jumps"] += 1
+        previous[name] = pageno
+    return {
+        name: {"pages": entry["pages"], "fragmented": round(entry["jumps"] / max(entry["pages"] - 1, 1), 4)}
+        for name, entry in sorted(stats.items(), key=lambda item: -item[1]["pages"])
+    }
+
+
+def vacuum_step(cursor: sqlite3.Cursor, pages: int = VACUUM_STEP_PAGES) -> int:
+    """Return up to ``pages`` free pages to the filesystem; returns how many were freed."""
+    before = _pragma(cursor, "freelist_count")
+    # SQLite frees one page per step of this pragma, but its result rows have
+    # no columns, so the sqlite3 module resets it after the first step
+    for _ in range(min(pages, before)):
+        cursor.execute("PRAGMA incremental_vacuum")
+    return before - _pragma(cursor, "freelist_count")
+
+
+def checkpoint(cursor: sqlite3.Cursor) -> None:
+    """Copy the WAL back into the database file, which is only truncated then (never waits)."""
+    cursor.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+
+def optimize(cursor: sqlite3.Cursor, analysis_limit: int = OPTIMIZE_ANALYSIS_LIMIT) -> None:
+    cursor.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+    cursor.execute("PRAGMA optimize").fetchall()
+
+
+def requests_in_flight() -> Optional[int]:
+    """HTTP requests being handled, or None when no middleware is counting them."""
+    if ADMISSION_CONTROL:
+        return admission.in_flight()
+    if METRICS_ENABLED:
+        return int(HTTP_IN_FLIGHT.value())
+    return None
+
+
+def _is_quiet(path: str) -> bool:
+    in_flight = requests_in_flight()
+    return in_flight is not None and in_flight <= VACUUM_MAX_IN_FLIGHT and not write_in_progress(path)
+
+
+async def reclaim(label: str, shard: Optional[int], min_free_pages: int = VACUUM_MIN_FREE_PAGES) -> int:
+    """Vacuum one database step by step while the server is quiet; returns pages freed."""
+    path = database_path(shard=shard)
+    async with get_async_db(shard=shard) as db:
+        stats = await db.run(storage_stats, db.cursor())
+    DB_FREE_PAGES.set(stats["freelist_count"], label)
+    if stats["auto_vacuum"] != "incremental" or stats["freelist_count"] < min_free_pages:
+        return 0
+    freed = 0
+    free_pages = stats["freelist_count"]
+    while free_pages > 0 and _is_quiet(path):
+        async with get_async_db(write=True, shard=shard) as db:
+            step = await db.run(vacuum_step, db.cursor())
+        if step <= 0:
+            break
+        freed += step
+        free_pages -= step
+        DB_VACUUMED_PAGES.inc(label, amount=step)
+        DB_FREE_PAGES.set(free_pages, label)
+        await asyncio.sleep(VACUUM_PAUSE)
+    if freed:
+        async with get_async_db(shard=shard) as db:
+            await db.run(checkpoint, db.cursor())
+    return freed
+
+
+async def optimize_all() -> None:
+    for _, shard in databases():
+        async with get_async_db(write=True, shard=shard) as db:
+            await db.run(optimize, db.cursor())
+
+
+async def run_vacuum(interval: float = VACUUM_INTERVAL) -> None:
+    """Background task started by the application lifespan."""
+    if requests_in_flight() is None:
+        logger.warning("ADMISSION_CONTROL and METRICS_ENABLED are both off; background vacuum will not run")
+    last_optimize = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            for label, shard in databases():
+                freed = await reclaim(label, shard)
+                if freed:
+                    logger.info("Incremental vacuum freed %d pages in %s", freed, label)
+            if OPTIMIZE_INTERVAL > 0 and time.monotonic() - last_optimize >= OPTIMIZE_INTERVAL:
+                await optimize_all()
+                last_optimize = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Database vacuum failed")
@@ -0,0 +1,11 @@
+"""Load-testing and latency benchmarks for the DMS API.
+
+Runs the same register/login/folder/file flows as ``tests/smoke_test.py`` with
+many concurrent virtual users and reports throughput, latency percentiles,
+server peak RSS and SQLite wait times per endpoint.
+
+Usage:
+    python -m benchmarks run --concurrency 32 --duration 30 --output results.json
+    python -m benchmarks compare baseline.json results.json
+    PASSWORD_HASH_WORKERS=0 python -m benchmarks run --scenario login-storm --output inline.json
+"""
@@ -0,0 +1,169 @@
+import argparse
+import json
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks.report import compare, print_table, summarize
+from benchmarks.scenarios import SCENARIOS, ScenarioConfig, VirtualUser
+from benchmarks.server import ROOT, LocalServer
+
+
+def server_commits(base_url: str):
+    """The server's ``db_commits_total``, or None if it exposes no metrics."""
+    try:
+        text = requests.get(base_url + "/metrics", timeout=5).text
+    except requests.RequestException:
+        return None
+    match = re.search(r"^db_commits_total (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def run_load(base_url: str, args) -> dict:
+    config = ScenarioConfig(
+        payload_sizes=[int(size) for size in args.payload_sizes.split(",")],
+        dataset_files=args.dataset_files,
+        seed=args.seed,
+    )
+    user_class = SCENARIOS[args.scenario]
+    users = [user_class(base_url, config, index) for index in range(args.concurrency)]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda user: user.setup(), users))
+
+    deadline = time.perf_counter() + args.duration
+    iterations = args.iterations
+
+    def drive(user: VirtualUser) -> None:
+        done = 0
+        while time.perf_counter() < deadline and (iterations is None or done < iterations):
+            user.iteration()
+            done += 1
+
+    # Setup samples (registration, login, dataset load) are reported but kept out of the timed window
+    setup_samples = [s for user in users for s in user.samples]
+    for user in users:
+        user.samples = []
+    commits_before = server_commits(base_url)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=drive, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    commits_after = server_commits(base_url)
+
+    samples = [s for user in users for s in user.samples]
+    endpoints = summarize(samples, elapsed)
+    return {
+        "endpoints": endpoints,
+        "setup": summarize(setup_samples, 1.0),
+        "totals": {
+            "requests": len(samples),
+            "errors": sum(1 for s in samples if s.status >= 400),
+            "rps": len(samples) / elapsed if elapsed else 0.0,
+            "elapsed_s": elapsed,
+            # write transactions committed per second (fsyncs with DB_SYNCHRONOUS=FULL)
+            "commits_per_s": (commits_after - commits_before) / elapsed
+            if commits_before is not None and commits_after is not None and elapsed else None,
+        },
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def cmd_run(args) -> int:
+    server = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        server = LocalServer(port=args.port).start()
+        base_url = server.base_url
+    try:
+        result = run_load(base_url, args)
+        peak = server.peak_rss_bytes() if server else None
+    finally:
+        if server:
+            server.stop()
+    result["server"] = {"base_url": base_url, "peak_rss_mb": round(peak / 2**20, 1) if peak else None}
+    result["meta"] = {
+        "revision": git_revision(),
+        "scenario": args.scenario,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "iterations": args.iterations,
+        "payload_sizes": args.payload_sizes,
+        "dataset_files": args.dataset_files,
+        "seed": args.seed,
+    }
+    print_table(result)
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(result, out, indent=2)
+        print(f"results written to {args.output}")
+    return 0
+
+
+def cmd_compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    scenarios = {result.get("meta", {}).get("scenario", "flow") for result in (baseline, current)}
+    if len(scenarios) > 1:
+        print(f"cannot compare different scenarios: {', '.join(sorted(scenarios))}")
+        return 2
+    regressions = compare(baseline, current, args.threshold)
+    for line in regressions:
+        print("REGRESSION", line)
+    if not regressions:
+        print("no regressions beyond threshold")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="DMS API benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run a load test and report per-endpoint latency")
+    run.add_argument("--base-url", help="benchmark an already running server instead of starting one")
+    run.add_argument("--port", type=int, default=8765, help="port for the local server")
+    run.add_argument(
+        "--scenario", choices=sorted(SCENARIOS), default="flow",
+        help="flow: the smoke-test flow; login-storm: repeated logins with a read in between",
+    )
+    run.add_argument("--concurrency", type=int, default=16, help="concurrent virtual users")
+    run.add_argument("--duration", type=float, default=20.0, help="seconds of measured load")
+    run.add_argument("--iterations", type=int, help="stop each user after this many flows")
+    run.add_argument("--payload-sizes", default="1024,65536", help="comma-separated upload sizes in bytes")
+    run.add_argument("--dataset-files", type=int, default=0, help="files preloaded into each user's home folder")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--output", help="write JSON results to this file")
+    run.set_defaults(func=cmd_run)
+
+    cmp_ = sub.add_parser("compare", help="compare two JSON results; exit 1 on regressions")
+    cmp_.add_argument("baseline")
+    cmp_.add_argument("current")
+    cmp_.add_argument("--threshold", type=float, default=0.10, help="allowed relative change (0.10 = 10%%)")
+    cmp_.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Aggregate samples into per-endpoint statistics and compare runs."""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples: Iterable, elapsed: float) -> Dict[str, dict]:
+    grouped = defaultdict(list)
+    for sample in samples:
+        grouped[sample.endpoint].append(sample)
+    endpoints = {}
+    for endpoint, items in sorted(grouped.items()):
+        latencies = sorted(s.latency for s in items)
+        lock_waits = sorted(s.db_lock for s in items)
+        endpoints[endpoint] = {
+            "count": len(items),
+            "errors": sum(1 for s in items if s.status >= 400),
+            "rps": len(items) / elapsed if elapsed else 0.0,
+            "mean_ms": 1000 * sum(latencies) / len(latencies),
+            "p50_ms": 1000 * percentile(latencies, 0.50),
+            "p95_ms": 1000 * percentile(latencies, 0.95),
+            "p99_ms": 1000 * percentile(latencies, 0.99),
+            "max_ms": 1000 * latencies[-1],
+            "db_wait_mean_ms": 1000 * sum(s.db_wait for s in items) / len(items),
+            "db_lock_mean_ms": 1000 * sum(lock_waits) / len(items),
+            "db_lock_p99_ms": 1000 * percentile(lock_waits, 0.99),
+        }
+    return endpoints
+
+
+def print_table(result: dict) -> None:
+    header = f"{'endpoint':42} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'lock':>7}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, stats in result["endpoints"].items():
+        print(
+            f"{endpoint:42} {stats['count']:7d} {stats['errors']:5d} {stats['rps']:8.1f} "
+            f"{stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f} {stats['db_lock_mean_ms']:7.2f}"
+        )
+    totals = result["totals"]
+    print("-" * len(header))
+    print(
+        f"total: {totals['requests']} requests, {totals['errors']} errors, {totals['rps']:.1f} rps "
+        f"over {totals['elapsed_s']:.1f}s; server peak RSS {result['server'].get('peak_rss_mb') or '?'} MB"
+    )
+    if totals.get("commits_per_s") is not None:
+        print(f"server commits: {totals['commits_per_s']:.1f}/s")
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Return regressions where p99 grew or RPS shrank by more than ``threshold``."""
+    regressions = []
+    for endpoint, new in current["endpoints"].items():
+        old = baseline["endpoints"].get(endpoint)
+        if old is None or old["count"] < 20 or new["count"] < 20:
+            continue
+        if old["p99_ms"] and new["p99_ms"] > old["p99_ms"] * (1 + threshold):
+            regressions.append(f"{endpoint}: p99 {old['p99_ms']:.1f}ms -> {new['p99_ms']:.1f}ms")
+        if old["rps"] and new["rps"] < old["rps"] * (1 - threshold):
+            regressions.append(f"{endpoint}: rps {old['rps']:.1f} -> {new['rps']:.1f}")
+    return regressions
@@ -0,0 +1,122 @@
+"""Virtual-user flows mirroring tests/smoke_test.py, plus a login storm.
+
+Every request goes through ``VirtualUser.call``, which records the endpoint
+label (method + route template), latency, status and the server's
+``Server-Timing`` database waits.
+"""
+
+import base64
+import os
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Type
+
+import requests
+
+TIMING_RE = re.compile(r"([\w-]+);dur=([\d.]+)")
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    latency: float
+    status: int
+    db_wait: float = 0.0
+    db_lock: float = 0.0
+
+
+@dataclass
+class ScenarioConfig:
+    payload_sizes: List[int] = field(default_factory=lambda: [1024])
+    dataset_files: int = 0
+    seed: int = 0
+
+
+class VirtualUser:
+    def __init__(self, base_url: str, config: ScenarioConfig, index: int):
+        self.base_url = base_url
+        self.config = config
+        self.session = requests.Session()
+        self.rng = random.Random(config.seed * 100003 + index)
+        self.samples: List[Sample] = []
+        self.email = f"bench+{uuid.uuid4().hex[:12]}@example.com"
+        self.password = "benchmark"
+        self.home_id: Optional[int] = None
+
+    def call(self, method: str, label: str, path: str, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        resp = self.session.request(method, self.base_url + path, **kwargs)
+        latency = time.perf_counter() - start
+        timing = dict((k, float(v)) for k, v in TIMING_RE.findall(resp.headers.get("server-timing", "")))
+        self.samples.append(
+            Sample(
+                endpoint=f"{method} {label}",
+                latency=latency,
+                status=resp.status_code,
+                db_wait=timing.get("db-wait", 0.0) / 1000,
+                db_lock=timing.get("db-lock", 0.0) / 1000,
+            )
+        )
+        return resp
+
+    def setup(self) -> None:
+        """Register, log in, and build the per-user dataset."""
+        self.call("POST", "/auth/register", "/auth/register", json={"email": self.email, "password": self.password})
+        resp = self.call("POST", "/auth/login", "/auth/login", json={"email": self.email, "password": self.password})
+        resp.raise_for_status()
+        self.session.headers["Authorization"] = "Bearer " + resp.json()["access_token"]
+        resp = self.call("POST", "/folders", "/folders", json={"name": "bench-home"})
+        resp.raise_for_status()
+        self.home_id = resp.json()["id"]
+        remaining = self.config.dataset_files
+        while remaining > 0:
+            batch = min(remaining, 1000)
+            files = [
+                {"name": f"seed-{remaining - i}.txt", "content": base64.b64encode(b"x" * 64).decode(), "parent_folder_id": self.home_id}
+                for i in range(batch)
+            ]
+            self.call("POST", "/files/batch/upload", "/files/batch/upload", json={"files": files}).raise_for_status()
+            remaining -= batch
+
+    def iteration(self) -> None:
+        """One pass of the smoke-test flow."""
+        folder = self.call("POST", "/folders", "/folders", json={"name": "bench", "parent_folder_id": self.home_id})
+        if not folder.ok:
+            return
+        folder_id = folder.json()["id"]
+        size = self.rng.choice(self.config.payload_sizes)
+        upload = self.call(
+            "POST", "/files/upload", "/files/upload",
+            params={"name": "payload.bin", "parent_folder_id": folder_id},
+            data=os.urandom(size),
+        )
+        if upload.ok:
+            file_id = upload.json()["id"]
+            self.call("GET", "/files/{file_id}", f"/files/{file_id}")
+            self.call("GET", "/files/{file_id}/content", f"/files/{file_id}/content")
+            self.call("PATCH", "/files/{file_id}", f"/files/{file_id}", json={"name": "renamed.bin"})
+            self.call("POST", "/files/{file_id}/move", f"/files/{file_id}/move", params={"parent_folder_id": self.home_id})
+            self.call("GET", "/folders/{folder_id}/files", f"/folders/{self.home_id}/files", params={"limit": 100})
+            self.call("DELETE", "/files/{file_id}", f"/files/{file_id}")
+        self.call("GET", "/folders/{folder_id}", f"/folders/{folder_id}")
+        self.call("DELETE", "/folders/{folder_id}", f"/folders/{folder_id}")
+
+
+class LoginStormUser(VirtualUser):
+    """Logs in over and over, with a cheap read between logins.
+
+    Every login is a bcrypt verify, so the read's latency shows how much a
+    burst of logins slows the rest of the API; run it with and without the
+    hashing pool (``PASSWORD_HASH_WORKERS=0``) and ``compare`` the results.
+    """
+
+    def iteration(self) -> None:
+        # the new token is discarded; the session keeps the one from setup
+        self.call("POST", "/auth/login", "/auth/login", json={"email": self.email, "password": self.password})
+        self.call("GET", "/folders/{folder_id}", f"/folders/{self.home_id}")
+
+
+SCENARIOS: Dict[str, Type[VirtualUser]] = {"flow": VirtualUser, "login-storm": LoginStormUser}
@@ -0,0 +1,84 @@
+"""Start a throwaway local uvicorn server for a benchmark run."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LocalServer:
+    """uvicorn on a fresh, migrated database in a temp directory."""
+
+    def __init__(self, port: int = 8765, env: dict = None):
+        self.port = port
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.extra_env = env or {}
+        self.process = None
+        self.tmpdir = None
+
+    def start(self) -> "LocalServer":
+        self.tmpdir = tempfile.mkdtemp(prefix="dms-bench-")
+        env = dict(os.environ)
+        env.update(
+            {
+                "DATABASE_PATH": os.path.join(self.tmpdir, "bench.db"),
+                "SERVER_TIMING": "1",
+            }
+        )
+        env.update(self.extra_env)
+        subprocess.run(
+            [sys.executable, "migrate.py", "upgrade"],
+            cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT, env=env,
+        )
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                if requests.get(self.base_url + "/health", timeout=1).ok:
+                    return self
+            except requests.ConnectionError:
+                pass
+            if self.process.poll() is not None:
+                raise RuntimeError("Benchmark server exited during startup")
+            time.sleep(0.2)
+        raise RuntimeError("Benchmark server did not become healthy")
+
+    def peak_rss_bytes(self):
+        """Peak resident set size of the server process (Linux only)."""
+        if self.process is None:
+            return None
+        try:
+            with open(f"/proc/{self.process.pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return None
+        return None
+
+    def stop(self) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self.tmpdir is not None:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+            self.tmpdir = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,171 @@
+"""
+Database Maintenance Commands
+
+repair-aggregates
+    Recompute every folder's recursive size and item counts from the files
+    and folder closure table, and fix any that drifted from what the
+    triggers maintained. Each user is repaired in its own short write
+    transaction, so it can run against a live database.
+
+rebuild-search
+    Re-create every user's rows in the full-text search index from the
+    files and folders tables, including the leading text of text files,
+    then merge the index segments.
+
+vacuum
+    Return the free pages of every database file to the filesystem with
+    PRAGMA incremental_vacuum, VACUUM_STEP_PAGES per transaction, then run
+    PRAGMA optimize. With --check only report the size, free space and
+    page fragmentation of each file.
+
+With DB_SHARDS > 1 users are read from the catalog and each user is
+processed on its own shard.
+
+Example:
+    python maintenance.py repair-aggregates
+    python maintenance.py repair-aggregates --user-id 42 --check
+    python maintenance.py rebuild-search
+    python maintenance.py vacuum --check
+"""
+
+import argparse
+import sys
+import time
+
+from app.database import DATABASE_PATH, all_database_paths, database_path, get_connection, shard_paths
+from app.folder_tree import recompute_aggregates
+from app.search import reindex_user
+from app.vacuum import checkpoint, optimize, page_fragmentation, storage_stats, vacuum_step
+
+
+class ShardConnections:
+    """One explicit-transaction connection per database, opened on first use."""
+
+    def __init__(self):
+        self._connections = {}
+
+    def get(self, path: str):
+        conn = self._connections.get(path)
+        if conn is None:
+            conn = self._connections[path] = get_connection(path)
+            conn.isolation_level = None  # explicit transactions
+        return conn
+
+    def for_user(self, user_id: int):
+        return self.get(database_path(user_id))
+
+    def close(self) -> None:
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+
+def repair_aggregates(shards: ShardConnections, user_ids, fix: bool, verbose: bool) -> int:
+    """Return the number of folders whose aggregates were wrong."""
+    drifted_total = 0
+    for user_id in user_ids:
+        conn = shards.for_user(user_id)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            drifted = recompute_aggregates(conn.cursor(), user_id, fix=fix)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        drifted_total += len(drifted)
+        if verbose:
+            for folder in drifted:
+                print(f"user {user_id} folder {folder['id']}: stored {folder['stored']}, actual {folder['actual']}")
+    return drifted_total
+
+
+def rebuild_search(shards: ShardConnections, user_ids) -> int:
+    """Return the number of index rows written."""
+    rows = 0
+    for user_id in user_ids:
+        conn = shards.for_user(user_id)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            files, folders = reindex_user(conn.cursor(), user_id)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        rows += files + folders
+    for path in shard_paths():
+        shards.get(path).execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    return rows
+
+
+def vacuum(shards: ShardConnections, check: bool) -> int:
+    """Return the number of pages freed (or still free, with ``check``)."""
+    pages = 0
+    for path in all_database_paths():
+        conn = shards.get(path)
+        stats = storage_stats(conn.cursor())
+        print(f"{path}: {stats['size_bytes']} bytes, {stats['freelist_count']} of {stats['page_count']} pages free, "
+              f"auto_vacuum={stats['auto_vacuum']}")
+        if check:
+            pages += stats["freelist_count"]
+            for name, entry in list(page_fragmentation(conn.cursor()).items())[:10]:
+                print(f"  {name}: {entry['pages']} pages, {entry['fragmented']:.1%} fragmented")
+            continue
+        if stats["auto_vacuum"] != "incremental":
+            print("  skipped: run `python migrate.py upgrade` to enable incremental vacuum")
+            continue
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                freed = vacuum_step(conn.cursor())
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            pages += freed
+            if freed <= 0:
+                break
+        checkpoint(conn.cursor())
+        optimize(conn.cursor())
+    return pages
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Database maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    repair = commands.add_parser("repair-aggregates", help="recompute folder sizes and item counts")
+    repair.add_argument("--user-id", type=int, action="append", help="only this user (repeatable)")
+    repair.add_argument("--check", action="store_true", help="report drift without fixing it (exit status 1 if any)")
+    repair.add_argument("-v", "--verbose", action="store_true", help="print every drifted folder")
+    rebuild = commands.add_parser("rebuild-search", help="rebuild the full-text search index")
+    rebuild.add_argument("--user-id", type=int, action="append", help="only this user (repeatable)")
+    reclaim = commands.add_parser("vacuum", help="return free pages to the filesystem and refresh statistics")
+    reclaim.add_argument("--check", action="store_true", help="report free space and fragmentation only")
+    args = parser.parse_args(argv)
+
+    shards = ShardConnections()
+    started = time.perf_counter()
+    if args.command == "vacuum":
+        pages = vacuum(shards, check=args.check)
+        shards.close()
+        action = "free" if args.check else "freed"
+        print(f"{pages} pages {action} in {time.perf_counter() - started:.1f}s")
+        return 0
+    user_ids = args.user_id or [row[0] for row in shards.get(DATABASE_PATH).execute("SELECT id FROM users ORDER BY id")]
+    if args.command == "rebuild-search":
+        rows = rebuild_search(shards, user_ids)
+        shards.close()
+        print(f"{DATABASE_PATH}: indexed {rows} files and folders of {len(user_ids)} users "
+              f"in {time.perf_counter() - started:.1f}s")
+        return 0
+
+    drifted = repair_aggregates(shards, user_ids, fix=not args.check, verbose=args.verbose)
+    shards.close()
+
+    elapsed = time.perf_counter() - started
+    action = "found" if args.check else "repaired"
+    print(f"{DATABASE_PATH}: {len(user_ids)} users checked, {drifted} folders {action} in {elapsed:.1f}s")
+    return 1 if args.check and drifted else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,8 @@
 """
 Database Migration Runner
 
-This script runs all pending migrations in order or reverts them.
+This script runs all pending migrations in order or reverts them. With
+DB_SHARDS > 1 every migration is applied to the catalog and to every shard.
 """
 
 import os
@@ -10,7 +11,7 @@ import importlib.util
 import argparse
 import sqlite3
 
-from app.database import DATABASE_PATH
+from app.database import all_database_paths
 
 
 def get_migration_files():
@@ -31,23 +32,33 @@ def load_migration_module(filepath):
 
 
 def run_migrations(action="upgrade"):
-    """Run all migrations."""
+    """Run all migrations on every database."""
     migration_files = get_migration_files()
     
     if action == "downgrade":
-        migration_files = reversed(migration_files)
+        migration_files = list(reversed(migration_files))
     
-    for filepath in migration_files:
-        module = load_migration_module(filepath)
-        if action == "upgrade":
-            module.upgrade()
-        elif action == "downgrade":
-            module.downgrade()
+    paths = all_database_paths()
+    for db_path in paths:
+        if len(paths) > 1:
+            print(f"== {db_path}")
+        for filepath in migration_files:
+            module = load_migration_module(filepath)
+            if action == "upgrade":
+                module.upgrade(db_path)
+            elif action == "downgrade":
+                module.downgrade(db_path)
 
 
 def list_migrations():
-    """List all migrations and their status."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    """List all migrations and their status on every database."""
+    for db_path in all_database_paths():
+        list_database_migrations(db_path)
+
+
+def list_database_migrations(db_path):
+    """List all migrations and their status on one database."""
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     # Ensure migrations table exists
@@ -67,7 +78,7 @@ def list_migrations():
     # Get all migration files
     migration_files = get_migration_files()
     
-    print("\nMigrations Status:")
+    print(f"\nMigrations Status ({db_path}):")
     print("-" * 60)
     
     for filepath in migration_files:
@@ -14,9 +14,9 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.database import DATABASE_PATH
 
 
-def upgrade():
+def upgrade(db_path=DATABASE_PATH):
     """Apply the migration."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     # Create migrations tracking table if it doesn't exist
@@ -59,9 +59,9 @@ def upgrade():
     print("Migration 001_create_items_table applied successfully.")
 
 
-def downgrade():
+def downgrade(db_path=DATABASE_PATH):
     """Revert the migration."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     # Drop items table
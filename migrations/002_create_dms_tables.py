@@ -14,8 +14,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.database import DATABASE_PATH
 
 
-def upgrade():
-    conn = sqlite3.connect(DATABASE_PATH)
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     # Create migrations tracking table if it doesn't exist
@@ -78,8 +78,8 @@ def upgrade():
     print("Migration 002_create_dms_tables applied successfully.")
 
 
-def downgrade():
-    conn = sqlite3.connect(DATABASE_PATH)
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     cursor.execute("DROP TABLE IF EXISTS files")
@@ -0,0 +1,82 @@
+"""
+Migration: Add checksum column to files
+Version: 003
+Description: Stores the SHA-256 of each file's content, computed while uploading
+"""
+
+import hashlib
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("003_add_file_checksum",))
+    if cursor.fetchone():
+        print("Migration 003_add_file_checksum already applied. Skipping.")
+        conn.close()
+        return
+
+    cursor.execute("ALTER TABLE files ADD COLUMN checksum TEXT")
+
+    # Backfill existing rows
+    conn.create_function("sha256", 1, lambda b: hashlib.sha256(b).hexdigest() if b is not None else None)
+    cursor.execute("UPDATE files SET checksum = sha256(content)")
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("003_add_file_checksum",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 003_add_file_checksum applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(files)")
+    if "checksum" in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE files DROP COLUMN checksum")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("003_add_file_checksum",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 003_add_file_checksum reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
@@ -0,0 +1,164 @@
+"""
+Migration: Create content-addressable blobs table
+Version: 004
+Description: Moves file content into a blobs table keyed by SHA-256 with
+reference counts, so identical content is stored once
+"""
+
+import re
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("004_create_blobs_table",))
+    if cursor.fetchone():
+        print("Migration 004_create_blobs_table already applied. Skipping.")
+        conn.close()
+        return
+
+    # Create blobs table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sha256 TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            content BLOB,
+            refcount INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    cursor.execute("ALTER TABLE files ADD COLUMN blob_id INTEGER REFERENCES blobs(id)")
+
+    # Move existing content into blobs (one copy per distinct hash)
+    cursor.execute("""
+        INSERT OR IGNORE INTO blobs (sha256, size, content)
+        SELECT checksum, length(content), content FROM files
+        WHERE content IS NOT NULL AND checksum IS NOT NULL
+        ORDER BY id
+    """)
+    cursor.execute("""
+        UPDATE files SET blob_id = (SELECT id FROM blobs WHERE sha256 = files.checksum), content = NULL
+        WHERE content IS NOT NULL AND checksum IS NOT NULL
+    """)
+    cursor.execute("UPDATE blobs SET refcount = (SELECT COUNT(*) FROM files WHERE blob_id = blobs.id)")
+
+    # Keep refcounts in step with files rows; unreferenced blobs are dropped
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_blob_ref AFTER INSERT ON files
+        WHEN NEW.blob_id IS NOT NULL
+        BEGIN
+            UPDATE blobs SET refcount = refcount + 1 WHERE id = NEW.blob_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_blob_unref AFTER DELETE ON files
+        WHEN OLD.blob_id IS NOT NULL
+        BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE id = OLD.blob_id;
+            DELETE FROM blobs WHERE id = OLD.blob_id AND refcount <= 0;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_blob_swap AFTER UPDATE OF blob_id ON files
+        WHEN OLD.blob_id IS NOT NEW.blob_id
+        BEGIN
+            UPDATE blobs SET refcount = refcount + 1 WHERE id = NEW.blob_id;
+            UPDATE blobs SET refcount = refcount - 1 WHERE id = OLD.blob_id;
+            DELETE FROM blobs WHERE id = OLD.blob_id AND refcount <= 0;
+        END
+    """)
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("004_create_blobs_table",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 004_create_blobs_table applied successfully.")
+
+
+def _drop_blob_id(cursor):
+    """Rebuild files without blob_id.
+
+    ALTER TABLE ... DROP COLUMN refuses a column with a REFERENCES clause (and
+    older SQLite has no DROP COLUMN), so copy the rows into a new table.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'files'")
+    create_sql = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'files' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    )
+    dependents = [row[0] for row in cursor.fetchall() if "blob_id" not in row[0]]
+    cursor.execute("PRAGMA table_info(files)")
+    columns = ", ".join(row[1] for row in cursor.fetchall() if row[1] != "blob_id")
+
+    create_sql = re.sub(r",\s*blob_id INTEGER REFERENCES blobs\(id\)", "", create_sql)
+    create_sql = re.sub(r"^CREATE TABLE \"?files\"?", "CREATE TABLE files_new", create_sql)
+    cursor.execute(create_sql)
+    cursor.execute(f"INSERT INTO files_new ({columns}) SELECT {columns} FROM files")
+    cursor.execute("DROP TABLE files")
+    cursor.execute("ALTER TABLE files_new RENAME TO files")
+    for sql in dependents:
+        cursor.execute(sql)
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("DROP TRIGGER IF EXISTS files_blob_ref")
+    cursor.execute("DROP TRIGGER IF EXISTS files_blob_unref")
+    cursor.execute("DROP TRIGGER IF EXISTS files_blob_swap")
+
+    cursor.execute("PRAGMA table_info(files)")
+    if "blob_id" in [row[1] for row in cursor.fetchall()]:
+        # Copy content back inline before dropping the reference
+        cursor.execute("""
+            UPDATE files SET content = (SELECT content FROM blobs WHERE id = files.blob_id)
+            WHERE blob_id IS NOT NULL
+        """)
+        _drop_blob_id(cursor)
+    cursor.execute("DROP TABLE IF EXISTS blobs")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("004_create_blobs_table",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 004_create_blobs_table reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
@@ -0,0 +1,147 @@
+"""
+Migration: Create folder closure table
+Version: 005
+Description: Indexes folder ancestry as (ancestor, descendant, depth) rows kept
+current by triggers, so subtree and ancestor queries are single statements
+"""
+
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("005_create_folder_closure",))
+    if cursor.fetchone():
+        print("Migration 005_create_folder_closure already applied. Skipping.")
+        conn.close()
+        return
+
+    # One row per (ancestor, descendant) pair, including each folder with itself
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS folder_closure (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID
+    """)
+
+    # Backfill from the existing parent pointers. No path is longer than the
+    # number of folders; a parent_folder_id cycle would reach the same pair
+    # twice within that bound and fail the primary key instead of looping
+    try:
+        cursor.execute("""
+            WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+                SELECT id, id, 0 FROM folders
+                UNION ALL
+                SELECT tree.ancestor_id, folders.id, tree.depth + 1
+                FROM tree JOIN folders ON folders.parent_folder_id = tree.descendant_id
+                WHERE tree.depth < (SELECT COUNT(*) FROM folders)
+            )
+            INSERT INTO folder_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, depth FROM tree
+        """)
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        conn.close()
+        raise RuntimeError(
+            "Migration 005_create_folder_closure: folders.parent_folder_id contains a cycle; "
+            "fix the affected folders and run the migration again"
+        )
+    # built after the backfill, which is faster than maintaining it row by row
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_folder_closure_descendant
+        ON folder_closure (descendant_id, depth)
+    """)
+
+    # Keep the closure in step with folders
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_closure_insert AFTER INSERT ON folders
+        BEGIN
+            INSERT INTO folder_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, NEW.id, depth + 1 FROM folder_closure
+            WHERE descendant_id = NEW.parent_folder_id
+            UNION ALL
+            SELECT NEW.id, NEW.id, 0;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_closure_move AFTER UPDATE OF parent_folder_id ON folders
+        WHEN OLD.parent_folder_id IS NOT NEW.parent_folder_id
+        BEGIN
+            DELETE FROM folder_closure
+            WHERE descendant_id IN (SELECT descendant_id FROM folder_closure WHERE ancestor_id = NEW.id)
+              AND ancestor_id NOT IN (SELECT descendant_id FROM folder_closure WHERE ancestor_id = NEW.id);
+            INSERT INTO folder_closure (ancestor_id, descendant_id, depth)
+            SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+            FROM folder_closure AS above, folder_closure AS below
+            WHERE above.descendant_id = NEW.parent_folder_id AND below.ancestor_id = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_closure_delete AFTER DELETE ON folders
+        BEGIN
+            DELETE FROM folder_closure WHERE descendant_id = OLD.id;
+            DELETE FROM folder_closure WHERE ancestor_id = OLD.id;
+        END
+    """)
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("005_create_folder_closure",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 005_create_folder_closure applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("DROP TRIGGER IF EXISTS folders_closure_insert")
+    cursor.execute("DROP TRIGGER IF EXISTS folders_closure_move")
+    cursor.execute("DROP TRIGGER IF EXISTS folders_closure_delete")
+    cursor.execute("DROP TABLE IF EXISTS folder_closure")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("005_create_folder_closure",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 005_create_folder_closure reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
@@ -0,0 +1,86 @@
+"""
+Migration: Add access path indexes
+Version: 006
+Description: Adds composite (user_id, parent_folder_id) indexes on folders and
+files so per-user listings and deletes stop scanning whole tables
+"""
+
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("006_add_access_path_indexes",))
+    if cursor.fetchone():
+        print("Migration 006_add_access_path_indexes already applied. Skipping.")
+        conn.close()
+        return
+
+    # Folder/file listings and subtree deletes filter on (user_id, parent_folder_id);
+    # name is included so listings can be returned in name order from the index
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_folders_user_parent
+        ON folders (user_id, parent_folder_id, name)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_files_user_parent
+        ON files (user_id, parent_folder_id, name)
+    """)
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("006_add_access_path_indexes",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 006_add_access_path_indexes applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("DROP INDEX IF EXISTS idx_folders_user_parent")
+    cursor.execute("DROP INDEX IF EXISTS idx_files_user_parent")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("006_add_access_path_indexes",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 006_add_access_path_indexes reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
@@ -0,0 +1,85 @@
+"""
+Migration: Add listing id indexes
+Version: 007
+Description: Adds (user_id, parent_folder_id, id) indexes so paginated folder
+listings sorted by id are served in index order
+"""
+
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("007_add_listing_id_indexes",))
+    if cursor.fetchone():
+        print("Migration 007_add_listing_id_indexes already applied. Skipping.")
+        conn.close()
+        return
+
+    # Keyset pagination in id order within one folder
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_folders_user_parent_id
+        ON folders (user_id, parent_folder_id, id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_files_user_parent_id
+        ON files (user_id, parent_folder_id, id)
+    """)
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("007_add_listing_id_indexes",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 007_add_listing_id_indexes applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("DROP INDEX IF EXISTS idx_folders_user_parent_id")
+    cursor.execute("DROP INDEX IF EXISTS idx_files_user_parent_id")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("007_add_listing_id_indexes",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 007_add_listing_id_indexes reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
@@ -0,0 +1,149 @@
+"""
+Migration: Add row versions
+Version: 008
+Description: Adds trigger-maintained version counters used for ETags:
+files.version and folders.version change when the row itself changes, and
+folders.listing_version changes whenever a direct child is added, removed,
+renamed, moved or re-uploaded
+"""
+
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("008_add_row_versions",))
+    if cursor.fetchone():
+        print("Migration 008_add_row_versions already applied. Skipping.")
+        conn.close()
+        return
+
+    cursor.execute("PRAGMA table_info(files)")
+    if "version" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE files ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    cursor.execute("PRAGMA table_info(folders)")
+    folder_columns = [row[1] for row in cursor.fetchall()]
+    if "version" not in folder_columns:
+        cursor.execute("ALTER TABLE folders ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    if "listing_version" not in folder_columns:
+        cursor.execute("ALTER TABLE folders ADD COLUMN listing_version INTEGER NOT NULL DEFAULT 1")
+
+    # A file's own version, and its folder's listing, change with any visible field
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_version_insert AFTER INSERT ON files
+        WHEN NEW.parent_folder_id IS NOT NULL
+        BEGIN
+            UPDATE folders SET listing_version = listing_version + 1 WHERE id = NEW.parent_folder_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_version_update
+        AFTER UPDATE OF name, size, mime_type, checksum, blob_id, parent_folder_id ON files
+        BEGIN
+            UPDATE files SET version = version + 1 WHERE id = NEW.id;
+            UPDATE folders SET listing_version = listing_version + 1
+            WHERE id IN (OLD.parent_folder_id, NEW.parent_folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_version_delete AFTER DELETE ON files
+        WHEN OLD.parent_folder_id IS NOT NULL
+        BEGIN
+            UPDATE folders SET listing_version = listing_version + 1 WHERE id = OLD.parent_folder_id;
+        END
+    """)
+
+    # Same for folders; bumping a counter column does not re-fire these triggers
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_version_insert AFTER INSERT ON folders
+        WHEN NEW.parent_folder_id IS NOT NULL
+        BEGIN
+            UPDATE folders SET listing_version = listing_version + 1 WHERE id = NEW.parent_folder_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_version_update AFTER UPDATE OF name, parent_folder_id ON folders
+        BEGIN
+            UPDATE folders SET version = version + 1 WHERE id = NEW.id;
+            UPDATE folders SET listing_version = listing_version + 1
+            WHERE id IN (OLD.parent_folder_id, NEW.parent_folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_version_delete AFTER DELETE ON folders
+        WHEN OLD.parent_folder_id IS NOT NULL
+        BEGIN
+            UPDATE folders SET listing_version = listing_version + 1 WHERE id = OLD.parent_folder_id;
+        END
+    """)
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("008_add_row_versions",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 008_add_row_versions applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    for trigger in (
+        "files_version_insert", "files_version_update", "files_version_delete",
+        "folders_version_insert", "folders_version_update", "folders_version_delete",
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    cursor.execute("PRAGMA table_info(files)")
+    if "version" in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE files DROP COLUMN version")
+    cursor.execute("PRAGMA table_info(folders)")
+    folder_columns = [row[1] for row in cursor.fetchall()]
+    if "version" in folder_columns:
+        cursor.execute("ALTER TABLE folders DROP COLUMN version")
+    if "listing_version" in folder_columns:
+        cursor.execute("ALTER TABLE folders DROP COLUMN listing_version")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("008_add_row_versions",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 008_add_row_versions reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
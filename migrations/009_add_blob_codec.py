@@ -0,0 +1,93 @@
+"""
+Migration: Add blob codec
+Version: 009
+Description: Records the storage codec (identity, zlib, lzma) and the stored
+byte size of each blob. Existing blobs are left uncompressed
+"""
+
+import lzma
+import sqlite3
+import sys
+import os
+import zlib
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("009_add_blob_codec",))
+    if cursor.fetchone():
+        print("Migration 009_add_blob_codec already applied. Skipping.")
+        conn.close()
+        return
+
+    cursor.execute("PRAGMA table_info(blobs)")
+    columns = [row[1] for row in cursor.fetchall()]
+    if "codec" not in columns:
+        cursor.execute("ALTER TABLE blobs ADD COLUMN codec TEXT NOT NULL DEFAULT 'identity'")
+    if "stored_size" not in columns:
+        cursor.execute("ALTER TABLE blobs ADD COLUMN stored_size INTEGER")
+    cursor.execute("UPDATE blobs SET stored_size = length(content) WHERE stored_size IS NULL")
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("009_add_blob_codec",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 009_add_blob_codec applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(blobs)")
+    columns = [row[1] for row in cursor.fetchall()]
+    if "codec" in columns:
+        # Older code reads blobs as raw bytes: decompress everything first
+        decoders = {"zlib": zlib.decompress, "lzma": lzma.decompress}
+        conn.create_function("decode_blob", 2, lambda codec, data: decoders[codec](data), deterministic=True)
+        cursor.execute("UPDATE blobs SET content = decode_blob(codec, content) WHERE codec != 'identity'")
+        cursor.execute("ALTER TABLE blobs DROP COLUMN codec")
+    if "stored_size" in columns:
+        cursor.execute("ALTER TABLE blobs DROP COLUMN stored_size")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("009_add_blob_codec",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 009_add_blob_codec reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
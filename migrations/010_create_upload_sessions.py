@@ -0,0 +1,110 @@
+"""
+Migration: Create upload sessions
+Version: 010
+Description: Creates upload_sessions and upload_parts for resumable chunked
+uploads; parts are kept until the session is finalized, aborted or expires
+"""
+
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("010_create_upload_sessions",))
+    if cursor.fetchone():
+        print("Migration 010_create_upload_sessions already applied. Skipping.")
+        conn.close()
+        return
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            parent_folder_id INTEGER,
+            mime_type TEXT,
+            total_size INTEGER,
+            chunk_size INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'open',
+            file_id INTEGER,
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires
+        ON upload_sessions (expires_at)
+    """)
+
+    # One row per received part; re-sending a part replaces it
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS upload_parts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            part_number INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            content BLOB,
+            UNIQUE (session_id, part_number),
+            FOREIGN KEY(session_id) REFERENCES upload_sessions(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("010_create_upload_sessions",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 010_create_upload_sessions applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("DROP TABLE IF EXISTS upload_parts")
+    cursor.execute("DROP TABLE IF EXISTS upload_sessions")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("010_create_upload_sessions",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 010_create_upload_sessions reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
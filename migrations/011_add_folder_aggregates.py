@@ -0,0 +1,173 @@
+"""
+Migration: Add folder aggregates
+Version: 011
+Description: Adds recursive per-folder aggregates maintained by triggers:
+folders.total_size (bytes of every file in the subtree), folders.file_count
+and folders.folder_count (descendant folders, excluding the folder itself)
+"""
+
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+AGGREGATE_COLUMNS = ("total_size", "file_count", "folder_count")
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("011_add_folder_aggregates",))
+    if cursor.fetchone():
+        print("Migration 011_add_folder_aggregates already applied. Skipping.")
+        conn.close()
+        return
+
+    cursor.execute("PRAGMA table_info(folders)")
+    folder_columns = [row[1] for row in cursor.fetchall()]
+    for column in AGGREGATE_COLUMNS:
+        if column not in folder_columns:
+            cursor.execute(f"ALTER TABLE folders ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+
+    # Every change is applied to all ancestors of the affected folder through
+    # the closure table. Each trigger looks ancestors up from the *parent*,
+    # whose closure rows are untouched by the closure triggers on the same row,
+    # so the result does not depend on trigger order. Subtrees must be deleted
+    # bottom-up (see app.folder_tree.purge_batch).
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_aggregate_insert AFTER INSERT ON files
+        WHEN NEW.parent_folder_id IS NOT NULL
+        BEGIN
+            UPDATE folders SET total_size = total_size + NEW.size, file_count = file_count + 1
+            WHERE id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = NEW.parent_folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_aggregate_update AFTER UPDATE OF size, parent_folder_id ON files
+        WHEN OLD.parent_folder_id IS NOT NEW.parent_folder_id OR OLD.size IS NOT NEW.size
+        BEGIN
+            UPDATE folders SET total_size = total_size - OLD.size, file_count = file_count - 1
+            WHERE id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = OLD.parent_folder_id);
+            UPDATE folders SET total_size = total_size + NEW.size, file_count = file_count + 1
+            WHERE id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = NEW.parent_folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_aggregate_delete AFTER DELETE ON files
+        WHEN OLD.parent_folder_id IS NOT NULL
+        BEGIN
+            UPDATE folders SET total_size = total_size - OLD.size, file_count = file_count - 1
+            WHERE id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = OLD.parent_folder_id);
+        END
+    """)
+
+    # A folder carries its whole subtree (its own aggregates plus itself)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_aggregate_insert AFTER INSERT ON folders
+        WHEN NEW.parent_folder_id IS NOT NULL
+        BEGIN
+            UPDATE folders SET total_size = total_size + NEW.total_size,
+                file_count = file_count + NEW.file_count, folder_count = folder_count + NEW.folder_count + 1
+            WHERE id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = NEW.parent_folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_aggregate_move AFTER UPDATE OF parent_folder_id ON folders
+        WHEN OLD.parent_folder_id IS NOT NEW.parent_folder_id
+        BEGIN
+            UPDATE folders SET total_size = total_size - OLD.total_size,
+                file_count = file_count - OLD.file_count, folder_count = folder_count - OLD.folder_count - 1
+            WHERE id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = OLD.parent_folder_id);
+            UPDATE folders SET total_size = total_size + OLD.total_size,
+                file_count = file_count + OLD.file_count, folder_count = folder_count + OLD.folder_count + 1
+            WHERE id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = NEW.parent_folder_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_aggregate_delete AFTER DELETE ON folders
+        WHEN OLD.parent_folder_id IS NOT NULL
+        BEGIN
+            UPDATE folders SET total_size = total_size - OLD.total_size,
+                file_count = file_count - OLD.file_count, folder_count = folder_count - OLD.folder_count - 1
+            WHERE id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = OLD.parent_folder_id);
+        END
+    """)
+
+    # Backfill existing folders
+    cursor.execute("""
+        UPDATE folders SET
+            total_size = (
+                SELECT COALESCE(SUM(f.size), 0) FROM folder_closure c
+                JOIN files f ON f.user_id = folders.user_id AND f.parent_folder_id = c.descendant_id
+                WHERE c.ancestor_id = folders.id
+            ),
+            file_count = (
+                SELECT COUNT(*) FROM folder_closure c
+                JOIN files f ON f.user_id = folders.user_id AND f.parent_folder_id = c.descendant_id
+                WHERE c.ancestor_id = folders.id
+            ),
+            folder_count = (SELECT COUNT(*) - 1 FROM folder_closure WHERE ancestor_id = folders.id)
+    """)
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("011_add_folder_aggregates",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 011_add_folder_aggregates applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    for trigger in (
+        "files_aggregate_insert", "files_aggregate_update", "files_aggregate_delete",
+        "folders_aggregate_insert", "folders_aggregate_move", "folders_aggregate_delete",
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    cursor.execute("PRAGMA table_info(folders)")
+    folder_columns = [row[1] for row in cursor.fetchall()]
+    for column in AGGREGATE_COLUMNS:
+        if column in folder_columns:
+            cursor.execute(f"ALTER TABLE folders DROP COLUMN {column}")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("011_add_folder_aggregates",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 011_add_folder_aggregates reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
@@ -0,0 +1,141 @@
+"""
+Migration: Create search index
+Version: 012
+Description: Creates the search_index FTS5 table over file and folder names
+(plus the leading text of text files), kept in sync by triggers. Rowids are
+files.id * 2 and folders.id * 2 + 1; the owner column holds "u<user_id>" so a
+search is scoped to one user inside the full-text query itself
+"""
+
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("012_create_search_index",))
+    if cursor.fetchone():
+        print("Migration 012_create_search_index already applied. Skipping.")
+        conn.close()
+        return
+
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            name, body, owner,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+
+    # Moves change neither name nor owner, so only insert, rename and delete
+    # touch the index. The body of text files is filled in by the application.
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_search_insert AFTER INSERT ON files
+        BEGIN
+            INSERT INTO search_index (rowid, name, body, owner) VALUES (NEW.id * 2, NEW.name, '', 'u' || NEW.user_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_search_rename AFTER UPDATE OF name ON files
+        WHEN OLD.name IS NOT NEW.name
+        BEGIN
+            UPDATE search_index SET name = NEW.name WHERE rowid = NEW.id * 2;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_search_delete AFTER DELETE ON files
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 2;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_search_insert AFTER INSERT ON folders
+        BEGIN
+            INSERT INTO search_index (rowid, name, body, owner) VALUES (NEW.id * 2 + 1, NEW.name, '', 'u' || NEW.user_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_search_rename AFTER UPDATE OF name ON folders
+        WHEN OLD.name IS NOT NEW.name
+        BEGIN
+            UPDATE search_index SET name = NEW.name WHERE rowid = NEW.id * 2 + 1;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_search_delete AFTER DELETE ON folders
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 2 + 1;
+        END
+    """)
+
+    # Backfill names; `python maintenance.py rebuild-search` also indexes the
+    # text of existing files
+    cursor.execute("""
+        INSERT INTO search_index (rowid, name, body, owner)
+        SELECT id * 2, name, '', 'u' || user_id FROM files
+    """)
+    cursor.execute("""
+        INSERT INTO search_index (rowid, name, body, owner)
+        SELECT id * 2 + 1, name, '', 'u' || user_id FROM folders
+    """)
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("012_create_search_index",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 012_create_search_index applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    for trigger in (
+        "files_search_insert", "files_search_rename", "files_search_delete",
+        "folders_search_insert", "folders_search_rename", "folders_search_delete",
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS search_index")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("012_create_search_index",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 012_create_search_index reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
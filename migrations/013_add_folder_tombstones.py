@@ -0,0 +1,136 @@
+"""
+Migration: Add folder tombstones
+Version: 013
+Description: Adds folders.deleted_at, which marks a folder whose subtree is
+being purged in the background, the purge_jobs table tracking each purge,
+and the live_folders / live_files views, which hide everything below a
+tombstone. Tombstoning a folder takes its subtree out of its ancestors'
+aggregates and bumps its parent's listing_version
+"""
+
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("013_add_folder_tombstones",))
+    if cursor.fetchone():
+        print("Migration 013_add_folder_tombstones already applied. Skipping.")
+        conn.close()
+        return
+
+    cursor.execute("PRAGMA table_info(folders)")
+    if "deleted_at" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE folders ADD COLUMN deleted_at INTEGER")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS purge_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            folder_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            files_deleted INTEGER NOT NULL DEFAULT 0,
+            folders_deleted INTEGER NOT NULL DEFAULT 0,
+            created_at INTEGER NOT NULL,
+            finished_at INTEGER,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_purge_jobs_status
+        ON purge_jobs (status)
+    """)
+
+    # A folder is live unless it or one of its ancestors is a tombstone; the
+    # check is one indexed closure lookup per ancestor
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS live_folders AS
+        SELECT * FROM folders WHERE NOT EXISTS (
+            SELECT 1 FROM folder_closure c JOIN folders tombstone ON tombstone.id = c.ancestor_id
+            WHERE c.descendant_id = folders.id AND tombstone.deleted_at IS NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS live_files AS
+        SELECT * FROM files WHERE parent_folder_id IS NULL OR NOT EXISTS (
+            SELECT 1 FROM folder_closure c JOIN folders tombstone ON tombstone.id = c.ancestor_id
+            WHERE c.descendant_id = files.parent_folder_id AND tombstone.deleted_at IS NOT NULL
+        )
+    """)
+
+    # The subtree leaves its ancestors' aggregates at once, as if deleted;
+    # the purge worker compensates for the delete triggers that follow
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS folders_tombstone AFTER UPDATE OF deleted_at ON folders
+        WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL AND NEW.parent_folder_id IS NOT NULL
+        BEGIN
+            UPDATE folders SET listing_version = listing_version + 1 WHERE id = NEW.parent_folder_id;
+            UPDATE folders SET total_size = total_size - NEW.total_size,
+                file_count = file_count - NEW.file_count, folder_count = folder_count - NEW.folder_count - 1
+            WHERE id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = NEW.parent_folder_id);
+        END
+    """)
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("013_add_folder_tombstones",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 013_add_folder_tombstones applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("DROP TRIGGER IF EXISTS folders_tombstone")
+    cursor.execute("DROP VIEW IF EXISTS live_files")
+    cursor.execute("DROP VIEW IF EXISTS live_folders")
+    cursor.execute("DROP TABLE IF EXISTS purge_jobs")
+
+    cursor.execute("PRAGMA table_info(folders)")
+    if "deleted_at" in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE folders DROP COLUMN deleted_at")
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("013_add_folder_tombstones",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 013_add_folder_tombstones reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
@@ -0,0 +1,94 @@
+"""
+Migration: Enable incremental vacuum
+Version: 014
+Description: Switches the database to auto_vacuum = INCREMENTAL so that pages
+freed by deletes can be returned to the filesystem with
+PRAGMA incremental_vacuum (see app.vacuum). Changing the mode of an existing
+database requires a full VACUUM, which rewrites the file: it needs about as
+much free disk space as the database and holds the write lock throughout
+"""
+
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DATABASE_PATH
+
+NONE = 0
+INCREMENTAL = 2
+
+
+def _set_auto_vacuum(conn, mode):
+    conn.commit()
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA auto_vacuum")
+    if cursor.fetchone()[0] != mode:
+        cursor.execute(f"PRAGMA auto_vacuum = {mode}")
+        # takes effect only once the file is rebuilt; VACUUM cannot run in a transaction
+        conn.isolation_level = None
+        cursor.execute("VACUUM")
+        conn.isolation_level = ""
+
+
+def upgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Create migrations tracking table if it doesn't exist
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Check if this migration has already been applied
+    cursor.execute("SELECT 1 FROM _migrations WHERE name = ?", ("014_enable_incremental_vacuum",))
+    if cursor.fetchone():
+        print("Migration 014_enable_incremental_vacuum already applied. Skipping.")
+        conn.close()
+        return
+
+    _set_auto_vacuum(conn, INCREMENTAL)
+
+    # Record this migration
+    cursor.execute("INSERT INTO _migrations (name) VALUES (?)", ("014_enable_incremental_vacuum",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 014_enable_incremental_vacuum applied successfully.")
+
+
+def downgrade(db_path=DATABASE_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    _set_auto_vacuum(conn, NONE)
+
+    cursor.execute("DELETE FROM _migrations WHERE name = ?", ("014_enable_incremental_vacuum",))
+
+    conn.commit()
+    conn.close()
+    print("Migration 014_enable_incremental_vacuum reverted successfully.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run database migration")
+    parser.add_argument(
+        "action",
+        choices=["upgrade", "downgrade"],
+        help="Migration action to perform"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "upgrade":
+        upgrade()
+    elif args.action == "downgrade":
+        downgrade()
@@ -0,0 +1,307 @@
+"""
+Synthetic Dataset Seeder
+
+Bulk-loads users, folders, files and items straight into the database for
+benchmarks and capacity tests. Rows are written with batched ``executemany``
+through the migrated schema, so the schema's triggers keep the folder closure
+table and blob reference counts consistent exactly as the API would. Blob
+content is encoded with the upload path's codec policy and text bodies are
+indexed for search, so seeded files look like uploaded ones.
+
+With DB_SHARDS > 1 users go to the catalog and each user's folders, files
+and blobs to that user's shard, as the API would place them.
+
+Every random choice comes from ``--seed`` (each user has its own derived
+generator), so the same arguments always produce the same dataset.
+
+Example:
+    python migrate.py upgrade
+    python seed.py --users 100 --files-per-user 10000 --fanout 2-6 --depth 5 \\
+        --deep-chain 2000 --sizes 1k:70,64k:25,1m:5 --dedup-ratio 0.3
+"""
+
+import argparse
+import bisect
+import itertools
+import mimetypes
+import random
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.auth import hash_password
+from app.database import DATABASE_PATH, all_database_paths, database_path, get_connection
+from app.search import extract_text, index_file_text, is_text_type
+from app.storage import encode_content
+
+EXTENSIONS = [".txt", ".pdf", ".png", ".jpg", ".json", ".csv", ".bin", ".docx"]
+SIZE_SUFFIXES = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+# vocabulary for text file bodies; fixed, so every seed draws from the same words
+WORDS = [
+    "".join(random.Random(n).choices("abcdefghijklmnopqrstuvwxyz", k=3 + n % 8)).encode() for n in range(2000)
+]
+
+
+def parse_size(text: str) -> int:
+    """Parse ``512``, ``64k`` or ``1m`` into bytes."""
+    text = text.strip().lower()
+    if text and text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def parse_range(text: str) -> Tuple[int, int]:
+    """Parse ``4`` or ``2-8`` into an inclusive ``(low, high)`` range."""
+    low, _, high = text.partition("-")
+    low = int(low)
+    high = int(high) if high else low
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f"invalid range: {text}")
+    return low, high
+
+
+class SizeHistogram:
+    """Weighted choice over file sizes, e.g. ``1k:70,64k:25,1m:5``."""
+
+    def __init__(self, spec: str):
+        self.sizes: List[int] = []
+        self.cumulative: List[float] = []
+        total = 0.0
+        for part in spec.split(","):
+            size, _, weight = part.partition(":")
+            total += float(weight or 1)
+            self.sizes.append(parse_size(size))
+            self.cumulative.append(total)
+        if not self.sizes or total <= 0:
+            raise argparse.ArgumentTypeError(f"invalid size histogram: {spec}")
+
+    def sample(self, rng: random.Random) -> int:
+        return self.sizes[bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+def batched(rows: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Seeder:
+    def __init__(self, connections: Dict[str, sqlite3.Connection], args):
+        # the catalog and every shard, by path; the user being seeded selects ``self.conn``
+        self.connections = connections
+        self.catalog = self.conn = connections[DATABASE_PATH]
+        self.path = DATABASE_PATH
+        self.args = args
+        self.histogram = SizeHistogram(args.sizes)
+        self.counts = {"users": 0, "folders": 0, "files": 0, "blobs": 0, "items": 0}
+        self.next_id = {
+            (path, table): conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0] + 1
+            for path, conn in connections.items()
+            for table in ("users", "folders", "files", "blobs")
+        }
+
+    def allocate(self, table: str) -> int:
+        """Hand out explicit ids so children can reference parents within a batch."""
+        key = (DATABASE_PATH if table == "users" else self.path, table)
+        row_id = self.next_id[key]
+        self.next_id[key] += 1
+        return row_id
+
+    def use_shard(self, user_id: int) -> None:
+        self.path = database_path(user_id)
+        self.conn = self.connections[self.path]
+
+    def insert(self, sql: str, rows: Iterable[tuple], conn: Optional[sqlite3.Connection] = None) -> int:
+        conn = conn or self.conn
+        count = 0
+        for batch in batched(rows, self.args.batch_size):
+            with conn:
+                conn.executemany(sql, batch)
+            count += len(batch)
+        return count
+
+    def user_rng(self, index: int) -> random.Random:
+        return random.Random(f"{self.args.seed}:{index}")
+
+    def seed_users(self) -> List[int]:
+        # bcrypt is deliberately slow: hash once, share the hash
+        password_hash = hash_password(self.args.password)
+        first = self.next_id[(DATABASE_PATH, "users")]
+        user_ids = [self.allocate("users") for _ in range(self.args.users)]
+        rows = (
+            (user_id, f"seed{self.args.seed}-user{index}@example.com", password_hash)
+            for index, user_id in enumerate(user_ids)
+        )
+        self.counts["users"] += self.insert(
+            "INSERT INTO users (id, email, password_hash) VALUES (?, ?, ?)", rows, self.catalog
+        )
+        print(f"users: {len(user_ids)} (ids {first}..{first + len(user_ids) - 1}, password '{self.args.password}')")
+        return user_ids
+
+    def folder_rows(self, rng: random.Random, user_id: int, folder_ids: List[int]) -> Iterator[tuple]:
+        """Breadth-first tree of ``--fanout`` children up to ``--depth``, then a ``--deep-chain``.
+
+        Parents are always yielded before their children, which the closure
+        trigger relies on.
+        """
+        low, high = self.args.fanout
+        frontier: List[Tuple[Optional[int], int]] = [(None, 0)]
+        remaining = self.args.folders_per_user
+        while frontier and remaining > 0:
+            parent_id, depth = frontier.pop(0)
+            if depth >= self.args.depth:
+                continue
+            for n in range(min(rng.randint(low, high), remaining)):
+                folder_id = self.allocate("folders")
+                folder_ids.append(folder_id)
+                remaining -= 1
+                frontier.append((folder_id, depth + 1))
+                yield folder_id, f"folder-{depth + 1}-{n}", user_id, parent_id
+        parent_id = None
+        for level in range(self.args.deep_chain):
+            folder_id = self.allocate("folders")
+            folder_ids.append(folder_id)
+            yield folder_id, f"deep-{level}", user_id, parent_id
+            parent_id = folder_id
+
+    def content_for(self, rng: random.Random, size: int, mime_type: Optional[str]) -> bytes:
+        """Words for text types, so compression and body search see realistic text; random bytes otherwise."""
+        if not is_text_type(mime_type):
+            return rng.randbytes(size)
+        words: List[bytes] = []
+        length = 0
+        while length < size:
+            words.append(rng.choice(WORDS))
+            length += len(words[-1]) + 1
+        return b" ".join(words)[:size]
+
+    def blob_for(self, rng: random.Random, pool: List[Tuple[int, int, str, bytes]], new_blobs: list,
+                 mime_type: Optional[str]) -> Tuple[int, int, str, bytes]:
+        """Reuse an earlier blob with probability ``--dedup-ratio``, else create one.
+
+        New content goes through ``encode_content``, so blobs get the codec
+        and stored size the upload path would give them.
+        """
+        if pool and rng.random() < self.args.dedup_ratio:
+            return rng.choice(pool)
+        with encode_content(self.content_for(rng, self.histogram.sample(rng), mime_type), mime_type) as data:
+            blob = (self.allocate("blobs"), data.size, data.checksum, data.head)
+            stored = b"".join(data.iter_stored_chunks())
+        new_blobs.append((blob[0], data.checksum, data.size, data.codec, data.stored_size, stored))
+        if len(pool) < self.args.dedup_pool:
+            pool.append(blob)
+        else:
+            pool[rng.randrange(len(pool))] = blob
+        return blob
+
+    def seed_files(self, rng: random.Random, user_id: int, count: int, folder_ids: List[int]) -> int:
+        """Insert ``count`` files with their blobs and indexed text bodies, one transaction per batch."""
+        pool: List[Tuple[int, int, str, bytes]] = []
+        for batch_start in range(0, count, self.args.batch_size):
+            new_blobs: list = []
+            rows = []
+            bodies = []
+            for n in range(batch_start, min(count, batch_start + self.args.batch_size)):
+                name = f"file-{n:07d}{rng.choice(EXTENSIONS)}"
+                mime_type, _ = mimetypes.guess_type(name)
+                parent_id = rng.choice(folder_ids) if folder_ids and rng.random() >= self.args.root_ratio else None
+                blob_id, size, checksum, head = self.blob_for(rng, pool, new_blobs, mime_type)
+                file_id = self.allocate("files")
+                rows.append((file_id, name, size, mime_type, user_id, parent_id, checksum, blob_id))
+                text = extract_text(mime_type, head)
+                if text:
+                    bodies.append((file_id, text))
+            with self.conn:
+                # blobs must exist before the files that reference them
+                self.conn.executemany(
+                    "INSERT INTO blobs (id, sha256, size, codec, stored_size, content) VALUES (?, ?, ?, ?, ?, ?)",
+                    new_blobs,
+                )
+                self.conn.executemany(
+                    "INSERT INTO files (id, name, size, mime_type, user_id, parent_folder_id, checksum, blob_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                # the insert trigger indexed the names; add the bodies as an upload would
+                cursor = self.conn.cursor()
+                for file_id, text in bodies:
+                    index_file_text(cursor, file_id, text)
+            self.counts["blobs"] += len(new_blobs)
+        return count
+
+    def seed_user_content(self, user_ids: List[int]) -> None:
+        for index, user_id in enumerate(user_ids):
+            rng = self.user_rng(index)
+            self.use_shard(user_id)
+            folder_ids: List[int] = []
+            self.counts["folders"] += self.insert(
+                "INSERT INTO folders (id, name, user_id, parent_folder_id) VALUES (?, ?, ?, ?)",
+                self.folder_rows(rng, user_id, folder_ids),
+            )
+            files = self.args.heavy_files if index < self.args.heavy_users else self.args.files_per_user
+            self.counts["files"] += self.seed_files(rng, user_id, files, folder_ids)
+            if (index + 1) % max(1, len(user_ids) // 20) == 0 or index + 1 == len(user_ids):
+                print(f"  {index + 1}/{len(user_ids)} users, {self.counts['folders']} folders, {self.counts['files']} files")
+
+    def seed_items(self) -> None:
+        rows = ((f"item-{self.args.seed}-{n}",) for n in range(self.args.items))
+        self.counts["items"] += self.insert("INSERT INTO items (name) VALUES (?)", rows, self.catalog)
+
+
+def tune_for_bulk_load(conn) -> None:
+    """Trade durability for speed; a crashed seed run is simply re-run."""
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Seed the database with a synthetic dataset")
+    parser.add_argument("--seed", type=int, default=1, help="random seed; same seed, same dataset")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--password", default="password123", help="password shared by every seeded user")
+    parser.add_argument("--folders-per-user", type=int, default=200, help="cap on tree folders per user")
+    parser.add_argument("--fanout", type=parse_range, default=(2, 6), help="children per folder, N or MIN-MAX")
+    parser.add_argument("--depth", type=int, default=4, help="maximum depth of each user's folder tree")
+    parser.add_argument("--deep-chain", type=int, default=0, help="extra chain of nested folders per user")
+    parser.add_argument("--files-per-user", type=int, default=1000)
+    parser.add_argument("--heavy-users", type=int, default=0, help="the first N users get --heavy-files files")
+    parser.add_argument("--heavy-files", type=int, default=100000)
+    parser.add_argument("--root-ratio", type=float, default=0.1, help="share of files placed at the root")
+    parser.add_argument("--sizes", default="1k:60,16k:30,256k:9,4m:1", help="file size histogram SIZE:WEIGHT,...")
+    parser.add_argument("--dedup-ratio", type=float, default=0.2, help="share of files reusing an existing blob")
+    parser.add_argument("--dedup-pool", type=int, default=1000, help="recent blobs eligible for reuse, per user")
+    parser.add_argument("--items", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    connections = {}
+    for path in all_database_paths():
+        conn = connections[path] = get_connection(path)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if not {"users", "folders", "files", "blobs", "folder_closure"} <= tables:
+            print(f"{path} is not fully migrated; run `python migrate.py upgrade` first", file=sys.stderr)
+            return 1
+        tune_for_bulk_load(conn)
+
+    started = time.perf_counter()
+    seeder = Seeder(connections, args)
+    user_ids = seeder.seed_users()
+    seeder.seed_user_content(user_ids)
+    seeder.seed_items()
+    for conn in connections.values():
+        conn.execute("ANALYZE")
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    summary = ", ".join(f"{count} {table}" for table, count in seeder.counts.items())
+    print(f"Seeded {DATABASE_PATH}: {summary} in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
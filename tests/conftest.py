@@ -0,0 +1,136 @@
+"""Shared fixtures: a freshly migrated database per test.
+
+The migrations run once per session into a template file; every test gets
+its own copy, opened with the application's connection settings. ``api``
+serves the application on that copy, called in-process over ASGI.
+"""
+import asyncio
+import json
+import shutil
+import sys
+from urllib.parse import urlencode
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import migrate  # noqa: E402
+from app.database import get_connection  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def migrated_template(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp("template") / "template.db")
+    for filepath in migrate.get_migration_files():
+        module = migrate.load_migration_module(filepath)
+        module.upgrade(db_path)
+    return db_path
+
+
+@pytest.fixture
+def db_path(migrated_template, tmp_path):
+    path = str(tmp_path / "app.db")
+    shutil.copyfile(migrated_template, path)
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    conn = get_connection(db_path)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def cursor(db):
+    return db.cursor()
+
+
+class Api:
+    """Calls the application in-process over ASGI as one signed-in user."""
+
+    def __init__(self, app, loop, token):
+        self.app = app
+        self.loop = loop
+        self.token = token
+
+    def request(self, method, path, *, params=None, headers=None, body=b"", json_body=None, token=True):
+        headers = dict(headers or {})
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers.setdefault("content-type", "application/json")
+        if token:
+            headers.setdefault("authorization", f"Bearer {self.token if token is True else token}")
+        if body:
+            headers.setdefault("content-length", str(len(body)))
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http",
+            "method": method, "path": path, "raw_path": path.encode(), "root_path": "",
+            "query_string": urlencode(params or {}, doseq=True).encode(),
+            "headers": [(k.lower().encode("latin-1"), str(v).encode("latin-1")) for k, v in headers.items()],
+            "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+        }
+        return self.loop.run_until_complete(self._call(scope, body))
+
+    async def _call(self, scope, body):
+        sent = []
+        requested = False
+        disconnected = asyncio.Event()
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await disconnected.wait()  # the client stays connected
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await self.app(scope, receive, send)
+        start = next(m for m in sent if m["type"] == "http.response.start")
+        content = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+        return ApiResponse(start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, content)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+
+class ApiResponse:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+@pytest.fixture
+def api(db, db_path, monkeypatch):
+    """The application on the per-test database, signed in as user 1 (``api.user_id``)."""
+    from app import auth, database
+    from app.group_commit import close_committers
+    from app.main import app
+
+    monkeypatch.setattr(database, "DATABASE_PATH", db_path)
+    monkeypatch.setattr(database, "DB_SHARDS", 1)
+    auth.principal_cache.clear()
+    db.execute("INSERT INTO users (id, email, password_hash) VALUES (1, 'alice@example.com', 'x')")
+    db.execute("INSERT INTO users (id, email, password_hash) VALUES (2, 'bob@example.com', 'x')")
+    db.commit()
+    loop = asyncio.new_event_loop()
+    client = Api(app, loop, auth.create_access_token({"sub": 1}))
+    client.user_id = 1
+    client.other_token = auth.create_access_token({"sub": 2})
+    yield client
+    loop.run_until_complete(close_committers())
+    loop.close()
+    database.close_pool()
+    auth.principal_cache.clear()
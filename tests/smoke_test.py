@@ -85,6 +85,17 @@ def upload_file(name, content_bytes, parent=None):
     return resp
 
 
+def upload_file_stream(name, content_bytes, parent=None):
+    url = f"{BASE_URL}/files/upload"
+    params = {"name": name}
+    if parent is not None:
+        params["parent_folder_id"] = parent
+    resp = session.post(url, params=params, data=content_bytes)
+    print_step(f"UPLOAD FILE (STREAM) -> {name}")
+    pretty(dump_resp(resp))
+    return resp
+
+
 def get_file_meta(file_id):
     url = f"{BASE_URL}/files/{file_id}"
     resp = session.get(url)
@@ -143,6 +154,14 @@ def delete_folder(folder_id):
     return resp
 
 
+def get_purge_job(job_id):
+    url = f"{BASE_URL}/folders/jobs/{job_id}"
+    resp = session.get(url)
+    print_step(f"PURGE JOB -> {job_id}")
+    pretty(dump_resp(resp))
+    return resp
+
+
 def run_smoke():
     # generate unique user
     uniq = str(uuid.uuid4())[:8]
@@ -163,6 +182,11 @@ def run_smoke():
     udata = ur.json() if ur.ok else {}
     file_id = udata.get("id")
 
+    sr = upload_file_stream("hello-stream.txt", content, parent=folder_id)
+    stream_id = (sr.json() if sr.ok else {}).get("id")
+    if stream_id:
+        delete_file(stream_id)
+
     if file_id:
         get_file_meta(file_id)
         download_file(file_id)
@@ -181,7 +205,10 @@ def run_smoke():
     if 'dest_id' in locals() and dest_id:
         delete_folder(dest_id)
     if folder_id:
-        delete_folder(folder_id)
+        dr = delete_folder(folder_id)
+        job_id = (dr.json() if dr.ok else {}).get("job_id")
+        if job_id:
+            get_purge_job(job_id)
 
     print_step("SMOKE TEST COMPLETE")
 
@@ -0,0 +1,250 @@
+"""Admission control (``app.admission``), driven without a server.
+
+Usage: python -m pytest tests/test_admission.py
+"""
+import asyncio
+
+import pytest
+
+from app.admission import HEAVY, LIGHT, AdmissionController, AdmissionMiddleware, Rejected, _client_key, classify
+from app.auth import create_access_token
+
+
+def controller(limit=2, queue=2, user_limit=2, upload_bytes=1000, user_upload_bytes=1000, timeout=0.05):
+    return AdmissionController(
+        light=(limit, queue, user_limit),
+        heavy=(limit, queue, user_limit),
+        upload_bytes=upload_bytes,
+        user_upload_bytes=user_upload_bytes,
+        queue_timeout=timeout,
+    )
+
+
+async def rejected(coro):
+    try:
+        await coro
+    except Rejected as exc:
+        return exc
+    raise AssertionError("admitted")
+
+
+def scope(method="GET", path="/folders/", client="10.0.0.1", headers=()):
+    return {"type": "http", "method": method, "path": path, "client": (client, 1234), "headers": list(headers)}
+
+
+class App:
+    """ASGI app that streams a two-part response, pausing between the parts until ``proceed`` is set."""
+
+    def __init__(self):
+        self.proceed = asyncio.Event()
+        self.started = asyncio.Event()
+        self.body = b""
+
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+            self.body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"first", "more_body": True})
+        self.started.set()
+        await self.proceed.wait()
+        await send({"type": "http.response.body", "body": b"last"})
+
+
+async def call(middleware, request_scope, chunks=(b"",)):
+    messages = [{"type": "http.request", "body": chunk, "more_body": n < len(chunks) - 1}
+                for n, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(request_scope, receive, send)
+    return sent
+
+
+def status_and_headers(sent):
+    start = sent[0]
+    return start["status"], dict(start["headers"])
+
+
+@pytest.mark.parametrize("method, path, kind", [
+    ("POST", "/files/upload", HEAVY),
+    ("POST", "/files/", HEAVY),
+    ("POST", "/files/batch/move", HEAVY),
+    ("GET", "/files/7/download", HEAVY),
+    ("PUT", "/uploads/abc/parts/3", HEAVY),
+    ("POST", "/uploads/abc/complete", HEAVY),
+    ("POST", "/folders/7/move", HEAVY),
+    ("GET", "/search", HEAVY),
+    ("GET", "/admin/stats", HEAVY),
+    ("GET", "/files/7", LIGHT),
+    ("GET", "/folders/7/contents", LIGHT),
+    ("POST", "/folders/", LIGHT),
+    # a folder delete only writes a tombstone; the subtree is purged in the background
+    ("DELETE", "/folders/7", LIGHT),
+    ("DELETE", "/files/7", LIGHT),
+    ("POST", "/auth/login", LIGHT),
+])
+def test_classify(method, path, kind):
+    assert classify(method, path) == kind
+
+
+def test_clients_are_keyed_by_token_user_else_address():
+    bearer = ("Bearer " + create_access_token({"sub": 42})).encode()
+    assert _client_key(scope(client="10.0.0.1", headers=[(b"authorization", bearer)])) == "user:42"
+    assert _client_key(scope(client="10.0.0.2", headers=[(b"authorization", bearer)])) == "user:42"
+    assert _client_key(scope(client="10.0.0.1", headers=[(b"authorization", b"Bearer forged")])) == "addr:10.0.0.1"
+    assert _client_key(scope(client="10.0.0.1")) == "addr:10.0.0.1"
+
+
+def test_user_limit_is_429_and_leaves_other_users_alone():
+    async def main():
+        admission = controller(limit=10, user_limit=1)
+        await admission.admit(HEAVY, "user:1", 0)
+        exc = await rejected(admission.admit(HEAVY, "user:1", 0))
+        assert (exc.status_code, exc.reason) == (429, "user_limit")
+        # the other class and other users still get in
+        await admission.admit(LIGHT, "user:1", 0)
+        await admission.admit(HEAVY, "user:2", 0)
+        assert admission.stats()["heavy_running"] == 2
+    asyncio.run(main())
+
+
+def test_full_queue_is_503():
+    async def main():
+        admission = controller(limit=1, queue=0)
+        await admission.admit(HEAVY, "a", 0)
+        exc = await rejected(admission.admit(HEAVY, "b", 0))
+        assert (exc.status_code, exc.reason) == (503, "queue_full")
+        assert admission.stats()["clients"] == 1
+    asyncio.run(main())
+
+
+def test_queue_timeout_is_503_and_cleans_up():
+    async def main():
+        admission = controller(limit=1, queue=1, timeout=0.01)
+        await admission.admit(HEAVY, "a", 0)
+        exc = await rejected(admission.admit(HEAVY, "b", 100))
+        assert (exc.status_code, exc.reason) == (503, "queue_timeout")
+        assert admission.stats() == {
+            "upload_bytes": 0, "clients": 1, "light_running": 0, "light_queued": 0,
+            "heavy_running": 1, "heavy_queued": 0,
+        }
+    asyncio.run(main())
+
+
+def test_queued_request_gets_the_released_slot():
+    async def main():
+        admission = controller(limit=1, queue=1, timeout=1)
+        await admission.admit(HEAVY, "a", 0)
+        waiting = asyncio.ensure_future(admission.admit(HEAVY, "b", 0))
+        await asyncio.sleep(0)
+        assert admission.in_flight() == 2
+        admission.release(HEAVY, "a", 0)
+        await waiting
+        assert admission.stats()["heavy_running"] == 1
+        assert admission.stats()["heavy_queued"] == 0
+    asyncio.run(main())
+
+
+def test_upload_bytes_are_reserved_and_released():
+    async def main():
+        admission = controller(upload_bytes=1000, user_upload_bytes=600, limit=10, user_limit=10)
+        await admission.admit(HEAVY, "a", 500)
+        await admission.admit(HEAVY, "b", 400)
+        assert admission.bytes_in_flight == 900
+
+        exc = await rejected(admission.admit(HEAVY, "c", 200))
+        assert (exc.status_code, exc.reason) == (503, "upload_bytes")
+        exc = await rejected(admission.admit(HEAVY, "a", 200))
+        assert (exc.status_code, exc.reason) == (429, "user_bytes")
+        # requests without a body are not held back by uploads
+        await admission.admit(LIGHT, "c", 0)
+
+        admission.release(HEAVY, "a", 500)
+        assert admission.bytes_in_flight == 400
+        await admission.admit(HEAVY, "c", 200)
+        assert admission.bytes_in_flight == 600
+    asyncio.run(main())
+
+
+def test_oversized_body_is_admitted_when_nothing_else_is_in_flight():
+    async def main():
+        admission = controller(upload_bytes=1000, user_upload_bytes=100)
+        await admission.admit(HEAVY, "a", 5000)
+        exc = await rejected(admission.admit(HEAVY, "b", 1))
+        assert exc.reason == "upload_bytes"
+        admission.release(HEAVY, "a", 5000)
+        assert admission.stats()["clients"] == 0
+    asyncio.run(main())
+
+
+def test_middleware_rejects_with_retry_after():
+    async def main():
+        app = App()
+        middleware = AdmissionMiddleware(app, controller(limit=10, user_limit=1))
+        first = asyncio.ensure_future(call(middleware, scope("GET", "/search")))
+        await app.started.wait()
+
+        sent = await call(middleware, scope("POST", "/files/upload", headers=[(b"content-length", b"10")]), [b"x" * 10])
+        status, headers = status_and_headers(sent)
+        assert status == 429
+        assert headers[b"retry-after"] == b"1"
+        assert headers[b"connection"] == b"close"
+
+        app.proceed.set()
+        await first
+    asyncio.run(main())
+
+
+def test_exempt_paths_are_never_limited():
+    async def main():
+        app = App()
+        app.proceed.set()
+        middleware = AdmissionMiddleware(app, controller(limit=1, queue=0, user_limit=0))
+        status, _ = status_and_headers(await call(middleware, scope("GET", "/health")))
+        assert status == 200
+    asyncio.run(main())
+
+
+def test_slot_and_bytes_are_held_until_the_response_has_streamed():
+    async def main():
+        app = App()
+        admission = controller(limit=10, user_limit=10)
+        middleware = AdmissionMiddleware(app, admission)
+        request = scope("POST", "/files/upload", headers=[(b"content-length", b"3")])
+        # the body turns out longer than declared; the extra bytes are counted as they arrive
+        response = asyncio.ensure_future(call(middleware, request, [b"abc", b"defgh"]))
+        await app.started.wait()
+        assert app.body == b"abcdefgh"
+        assert admission.stats()["heavy_running"] == 1
+        assert admission.bytes_in_flight == 8
+
+        app.proceed.set()
+        sent = await response
+        assert [m.get("body") for m in sent[1:]] == [b"first", b"last"]
+        assert admission.stats() == {
+            "upload_bytes": 0, "clients": 0, "light_running": 0, "light_queued": 0,
+            "heavy_running": 0, "heavy_queued": 0,
+        }
+    asyncio.run(main())
+
+
+def test_slot_is_released_when_the_app_fails():
+    async def main():
+        admission = controller()
+
+        async def failing(scope, receive, send):
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await call(AdmissionMiddleware(failing, admission), scope())
+        assert admission.in_flight() == 0
+        assert admission.stats()["clients"] == 0
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""Authentication caches in ``app.auth``: ``PrincipalCache`` and ``token_subject``.
+
+Usage: python -m pytest tests/test_auth_cache.py
+"""
+import time
+import types
+from datetime import timedelta
+
+import pytest
+
+from app import auth
+from app.auth import PrincipalCache, create_access_token, token_subject
+
+ALICE = {"id": 1, "email": "alice@example.com"}
+BOB = {"id": 2, "email": "bob@example.com"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the clock ``app.auth`` reads; advance it with ``clock.now += seconds``."""
+    fake = types.SimpleNamespace(now=1700000000.0)
+    fake.time = lambda: fake.now
+    monkeypatch.setattr(auth, "time", fake)
+    return fake
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = PrincipalCache(max_size=10, ttl=60)
+    cache.put("t1", ALICE)
+    clock.now += 59
+    assert cache.get("t1") == ALICE
+    clock.now += 1
+    assert cache.get("t1") is None
+    assert cache.stats()["size"] == 0
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_entries_expire_with_the_token(clock):
+    cache = PrincipalCache(max_size=10, ttl=60)
+    cache.put("t1", ALICE, token_exp=clock.now + 5)
+    clock.now += 5
+    assert cache.get("t1") is None
+    # an already expired token is never served
+    cache.put("t2", ALICE, token_exp=clock.now - 1)
+    assert cache.get("t2") is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = PrincipalCache(max_size=2, ttl=60)
+    cache.put("a", ALICE)
+    cache.put("b", BOB)
+    assert cache.get("a") == ALICE  # "b" is now the oldest
+    cache.put("c", BOB)
+    assert cache.get("b") is None
+    assert cache.get("a") == ALICE
+    assert cache.get("c") == BOB
+    assert cache.stats()["size"] == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_replacing_a_token_does_not_evict(clock):
+    cache = PrincipalCache(max_size=2, ttl=60)
+    cache.put("a", ALICE)
+    cache.put("b", BOB)
+    cache.put("a", ALICE)
+    assert cache.stats()["evictions"] == 0
+    assert cache.get("b") == BOB
+
+
+def test_invalidate_user(clock):
+    cache = PrincipalCache(max_size=10, ttl=60)
+    cache.put("a1", ALICE)
+    cache.put("a2", ALICE)
+    cache.put("b1", BOB)
+    cache.invalidate_user(ALICE["id"])
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.get("b1") == BOB
+    cache.invalidate_user(ALICE["id"])  # nothing left to drop
+    assert cache.stats()["size"] == 1
+
+
+@pytest.mark.parametrize("max_size, ttl", [(0, 60), (10, 0)])
+def test_disabled_cache_stores_nothing(clock, max_size, ttl):
+    cache = PrincipalCache(max_size=max_size, ttl=ttl)
+    cache.put("a", ALICE)
+    assert cache.get("a") is None
+
+
+def test_expired_token_is_not_served_from_the_cache(api, clock):
+    """Principals cached while a token was valid are not used once it has expired."""
+    token = create_access_token({"sub": api.user_id}, expires_delta=timedelta(seconds=-10))
+    expires_at = time.time() - 10
+    clock.now = expires_at - 30  # when the token was still valid
+    auth.principal_cache.put(token, {"id": api.user_id, "email": "alice@example.com"}, token_exp=expires_at)
+    auth._subjects[token] = (expires_at, api.user_id)
+    assert auth.principal_cache.get(token) is not None
+    assert token_subject(f"Bearer {token}") == api.user_id
+
+    clock.now = time.time()
+    assert auth.principal_cache.get(token) is None
+    assert token_subject(f"Bearer {token}") is None
+    assert api.get("/folders/jobs/999999", token=token).status_code == 401
+    assert api.get("/folders/jobs/999999").status_code == 404  # a valid token still works
+
+
+def test_token_subject():
+    token = create_access_token({"sub": 7})
+    assert token_subject(f"Bearer {token}") == 7
+    assert token_subject(f"bearer  {token} ") == 7
+    assert token_subject(token) is None  # no scheme
+    assert token_subject(f"Basic {token}") is None
+    assert token_subject("Bearer not-a-jwt") is None
+    assert token_subject(None) is None
@@ -0,0 +1,118 @@
+"""Batch file endpoints (``/files/batch/*``): per-item results in one transaction.
+
+Usage: python -m pytest tests/test_batch_files.py
+"""
+import base64
+
+import pytest
+
+from app.routes.files import MAX_BATCH_SIZE
+
+MISSING = 999999
+
+
+def b64(data):
+    return base64.b64encode(data).decode()
+
+
+def upload(api, name, token=True, parent=None):
+    params = {"name": name} if parent is None else {"name": name, "parent_folder_id": parent}
+    response = api.post("/files/upload", params=params, body=name.encode(), token=token)
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+@pytest.fixture
+def files(api):
+    """Two of the caller's files, one of another user's, and one in a deleted folder."""
+    doomed = api.post("/folders", json_body={"name": "doomed"}).json()["id"]
+    ids = {
+        "a": upload(api, "a.txt"),
+        "b": upload(api, "b.txt"),
+        "foreign": upload(api, "theirs.txt", token=api.other_token),
+        "deleted": upload(api, "gone.txt", parent=doomed),
+    }
+    assert api.request("DELETE", f"/folders/{doomed}").status_code == 202
+    return ids
+
+
+def test_batch_get_mixed(api, files):
+    ids = [files["a"], files["foreign"], MISSING, files["b"], files["a"], files["deleted"]]
+    results = api.post("/files/batch/get", json_body={"ids": ids}).json()["results"]
+    assert [(r["id"], r["status"]) for r in results] == [
+        (files["a"], "ok"), (files["foreign"], "not_found"), (MISSING, "not_found"),
+        (files["b"], "ok"), (files["deleted"], "not_found"),
+    ]
+    assert results[0]["name"] == "a.txt"
+    assert "name" not in results[1]  # nothing about another user's file leaks
+
+
+def test_batch_move_applies_what_it_can(api, files):
+    target = api.post("/folders", json_body={"name": "target"}).json()["id"]
+    ids = [files["a"], files["foreign"], MISSING, files["a"], files["b"]]
+    response = api.post("/files/batch/move", json_body={"ids": ids, "parent_folder_id": target})
+    assert response.status_code == 200
+    assert [(r["id"], r["status"]) for r in response.json()["results"]] == [
+        (files["a"], "moved"), (files["foreign"], "not_found"), (MISSING, "not_found"), (files["b"], "moved"),
+    ]
+    listed = api.get(f"/folders/{target}/files").json()["files"]
+    assert sorted(f["id"] for f in listed) == sorted([files["a"], files["b"]])
+    folder = api.get(f"/folders/{target}").json()
+    assert folder["file_count"] == 2
+    # the other user's file did not move
+    theirs = api.post("/files/batch/get", json_body={"ids": [files["foreign"]]}, token=api.other_token)
+    assert theirs.json()["results"][0]["status"] == "ok"
+
+
+def test_batch_move_to_a_foreign_folder_moves_nothing(api, files):
+    theirs = api.post("/folders", json_body={"name": "theirs"}, token=api.other_token).json()["id"]
+    response = api.post("/files/batch/move", json_body={"ids": [files["a"]], "parent_folder_id": theirs})
+    assert response.status_code == 400
+    assert api.get(f"/files/{files['a']}").status_code == 200
+    assert api.get(f"/folders/{theirs}/files", token=api.other_token).json()["files"] == []
+
+
+def test_batch_delete_mixed(api, files):
+    ids = [files["a"], files["foreign"], MISSING, files["a"]]
+    results = api.post("/files/batch/delete", json_body={"ids": ids}).json()["results"]
+    assert [(r["id"], r["status"]) for r in results] == [
+        (files["a"], "deleted"), (files["foreign"], "not_found"), (MISSING, "not_found"),
+    ]
+    assert api.get(f"/files/{files['a']}").status_code == 404
+    assert api.get(f"/files/{files['b']}").status_code == 200
+    assert api.get(f"/files/{files['foreign']}", token=api.other_token).status_code == 200
+
+
+def test_batch_upload_reports_each_entry(api):
+    mine = api.post("/folders", json_body={"name": "mine"}).json()["id"]
+    theirs = api.post("/folders", json_body={"name": "theirs"}, token=api.other_token).json()["id"]
+    entries = [
+        {"name": "one.txt", "content": b64(b"one")},
+        {"name": "bad.txt", "content": "***not base64***"},
+        {"name": "foreign.txt", "content": b64(b"x"), "parent_folder_id": theirs},
+        {"name": "missing.txt", "content": b64(b"x"), "parent_folder_id": MISSING},
+        {"name": "two.txt", "content": b64(b"two"), "parent_folder_id": mine},
+    ]
+    results = api.post("/files/batch/upload", json_body={"files": entries}).json()["results"]
+    assert [(r["index"], r["status"]) for r in results] == [
+        (0, "created"), (1, "error"), (2, "error"), (3, "error"), (4, "created"),
+    ]
+    assert results[1]["detail"] == "Invalid base64 content"
+    assert results[2]["detail"] == results[3]["detail"] == "Parent folder not found"
+    assert api.get(f"/folders/{mine}").json()["file_count"] == 1
+    assert api.get(f"/folders/{theirs}", token=api.other_token).json()["file_count"] == 0
+    created = api.get(f"/files/{results[4]['id']}/content")
+    assert created.content == b"two"
+
+
+@pytest.mark.parametrize("path", ["/files/batch/get", "/files/batch/move", "/files/batch/delete"])
+def test_batch_size_limits(api, files, path):
+    assert api.post(path, json_body={"ids": []}).status_code == 422
+    assert api.post(path, json_body={"ids": list(range(1, MAX_BATCH_SIZE + 2))}).status_code == 422
+    assert api.post(path, json_body={"ids": list(range(1, MAX_BATCH_SIZE + 1))}).status_code == 200
+
+
+def test_batch_upload_size_limits(api):
+    assert api.post("/files/batch/upload", json_body={"files": []}).status_code == 422
+    entries = [{"name": "x", "content": ""}] * (MAX_BATCH_SIZE + 1)
+    assert api.post("/files/batch/upload", json_body={"files": entries}).status_code == 422
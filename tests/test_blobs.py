@@ -0,0 +1,108 @@
+"""Content-addressed blobs (migration 004): deduplication and reference counting.
+
+Usage: python -m pytest tests/test_blobs.py
+"""
+import threading
+
+import pytest
+
+from app.database import get_connection
+from app.storage import encode_content, insert_file, put_blob, read_blob
+
+USER = 1
+
+
+@pytest.fixture
+def user(db, cursor):
+    cursor.execute("INSERT INTO users (id, email, password_hash) VALUES (?, 'a@example.com', 'x')", (USER,))
+    db.commit()
+
+
+def add_file(cursor, name, data):
+    return insert_file(cursor, name=name, data=data, mime_type=None, user_id=USER, parent_folder_id=None)["id"]
+
+
+def blobs(cursor):
+    return [tuple(row) for row in cursor.execute("SELECT id, refcount FROM blobs ORDER BY id")]
+
+
+def blob_of(cursor, file_id):
+    return cursor.execute("SELECT blob_id FROM files WHERE id = ?", (file_id,)).fetchone()[0]
+
+
+def test_same_content_is_stored_once(cursor, user):
+    first = add_file(cursor, "a.txt", b"same bytes")
+    second = add_file(cursor, "b.txt", b"same bytes")
+    other = add_file(cursor, "c.txt", b"other bytes")
+
+    blob_id = blob_of(cursor, first)
+    assert blob_of(cursor, second) == blob_id
+    assert blobs(cursor) == [(blob_id, 2), (blob_of(cursor, other), 1)]
+    assert read_blob(cursor, blob_id) == b"same bytes"
+
+
+def test_deletes_release_references(cursor, user):
+    first = add_file(cursor, "a.txt", b"same bytes")
+    second = add_file(cursor, "b.txt", b"same bytes")
+    blob_id = blob_of(cursor, first)
+
+    cursor.execute("DELETE FROM files WHERE id = ?", (first,))
+    assert blobs(cursor) == [(blob_id, 1)]
+    assert read_blob(cursor, blob_of(cursor, second)) == b"same bytes"
+
+    cursor.execute("DELETE FROM files WHERE id = ?", (second,))
+    assert blobs(cursor) == []
+
+
+def test_changing_a_files_blob_moves_the_reference(cursor, user):
+    file_id = add_file(cursor, "a.txt", b"old bytes")
+    old_blob = blob_of(cursor, file_id)
+    new_blob = put_blob(cursor, encode_content(b"new bytes", None))
+    assert blobs(cursor) == [(old_blob, 1), (new_blob, 0)]
+
+    cursor.execute("UPDATE files SET blob_id = ? WHERE id = ?", (new_blob, file_id))
+    assert blobs(cursor) == [(new_blob, 1)]
+
+
+def test_concurrent_put_blob_of_the_same_content(db_path, user):
+    """Both writers miss the blob in their first lookup; the second one's INSERT conflicts."""
+    content = encode_content(b"uploaded twice at once", None)
+    both_looked_up = threading.Barrier(2, timeout=10)
+    results, statements, lookups, errors = {}, {}, {}, []
+
+    def writer(name):
+        conn = get_connection(db_path)
+        statements[name] = []
+
+        def trace(sql):
+            statements[name].append(sql)
+            if sql.startswith("INSERT INTO blobs"):
+                both_looked_up.wait()
+
+        conn.set_trace_callback(trace)
+        try:
+            cursor = conn.cursor()
+            results[name] = put_blob(cursor, content)
+            lookups[name] = sum(sql.startswith("SELECT id FROM blobs") for sql in statements[name])
+            add_file(cursor, name, content)
+            conn.commit()
+        except Exception as exc:  # reported by the main thread
+            errors.append(exc)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=writer, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert results["a"] == results["b"]
+    assert sorted(lookups.values()) == [1, 2]  # the loser looked the winner's row up again
+    conn = get_connection(db_path)
+    try:
+        assert [tuple(row) for row in conn.execute("SELECT id, refcount FROM blobs")] == [(results["a"], 2)]
+        assert read_blob(conn.cursor(), results["a"]) == b"uploaded twice at once"
+    finally:
+        conn.close()
@@ -0,0 +1,131 @@
+"""Storage codecs (``app.compression``) and compressed blobs in ``app.storage``.
+
+Usage: python -m pytest tests/test_compression.py
+"""
+import io
+import os
+import zlib
+
+import pytest
+
+from app.compression import (
+    IDENTITY,
+    LZMA,
+    ZLIB,
+    DecodingReader,
+    choose_codec,
+    decompress,
+    make_compressor,
+)
+from app.storage import SpooledUpload, encode_content, insert_file, read_blob
+
+TEXT = b"".join(b"line %d of a very repetitive log file\n" % n for n in range(20000))
+RANDOM = os.urandom(64 * 1024)
+
+
+def compress(codec, data, level=6):
+    compressor = make_compressor(codec, level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def stored_bytes(encoded):
+    return b"".join(encoded.iter_stored_chunks())
+
+
+@pytest.mark.parametrize("mime_type, size, head, expected", [
+    ("text/plain", 10000, b"hello", ZLIB),
+    ("application/json", 10000, b"{", ZLIB),
+    ("application/x-tar", 10000, b"x", LZMA),
+    ("image/svg+xml", 10000, b"<svg", ZLIB),
+    ("image/png", 10000, b"x", IDENTITY),
+    ("application/zip", 10000, b"x", IDENTITY),
+    ("text/plain", 10000, b"\x1f\x8bgzip inside", IDENTITY),
+    ("text/plain", 100, b"too small", IDENTITY),
+    (None, len(TEXT), TEXT[:65536], ZLIB),
+    ("application/octet-stream", len(RANDOM), RANDOM, IDENTITY),
+])
+def test_choose_codec(mime_type, size, head, expected):
+    assert choose_codec(mime_type, size, head)[0] == expected
+
+
+@pytest.mark.parametrize("codec", [IDENTITY, ZLIB, LZMA])
+def test_decompress_round_trip(codec):
+    stored = TEXT if codec == IDENTITY else compress(codec, TEXT)
+    assert decompress(codec, stored) == TEXT
+
+
+@pytest.mark.parametrize("codec", [ZLIB, LZMA])
+@pytest.mark.parametrize("read_size", [1, 7, 4096])
+def test_decoding_reader_round_trip(codec, read_size):
+    reader = DecodingReader(io.BytesIO(compress(codec, TEXT)), codec, read_size)
+    out = []
+    while True:
+        chunk = reader.read(10000)
+        if not chunk:
+            break
+        assert len(chunk) <= 10000
+        out.append(chunk)
+    assert b"".join(out) == TEXT
+
+
+def test_decoding_reader_bounds_output_of_highly_compressible_content():
+    data = b"\0" * (16 * 1024 * 1024)
+    reader = DecodingReader(io.BytesIO(compress(ZLIB, data, 9)), ZLIB)
+    sizes = []
+    while True:
+        chunk = reader.read(65536)
+        if not chunk:
+            break
+        sizes.append(len(chunk))
+    assert max(sizes) <= 65536
+    assert sum(sizes) == len(data)
+
+
+def test_decoding_reader_rejects_unknown_codec():
+    with pytest.raises(ValueError):
+        DecodingReader(io.BytesIO(b""), "brotli")
+
+
+def test_encode_content_compresses_text():
+    encoded = encode_content(TEXT, "text/plain")
+    assert encoded.codec == ZLIB
+    assert encoded.size == len(TEXT)
+    assert encoded.stored_size < len(TEXT) // 10
+    assert zlib.decompress(stored_bytes(encoded)) == TEXT
+
+
+def test_encode_content_keeps_incompressible_content_as_is():
+    encoded = encode_content(RANDOM, "text/plain")
+    assert encoded.codec == IDENTITY
+    assert encoded.stored_size == len(RANDOM)
+    assert stored_bytes(encoded) == RANDOM
+
+
+def test_encode_spooled_upload_matches_bytes():
+    with SpooledUpload(max_memory=1024) as upload:
+        for start in range(0, len(TEXT), 5000):
+            upload.write(TEXT[start:start + 5000])
+        encoded = encode_content(upload, "text/csv")
+        from_bytes = encode_content(TEXT, "text/csv")
+        assert (encoded.size, encoded.checksum, encoded.codec) == (from_bytes.size, from_bytes.checksum, ZLIB)
+        assert decompress(encoded.codec, stored_bytes(encoded)) == TEXT
+        encoded.close()
+
+
+@pytest.mark.parametrize("data, mime_type, codec", [
+    (TEXT, "text/plain", ZLIB),
+    (TEXT, "application/x-tar", LZMA),
+    (RANDOM, "image/jpeg", IDENTITY),
+    (b"", "text/plain", IDENTITY),
+])
+def test_stored_blob_round_trip(cursor, data, mime_type, codec):
+    cursor.execute("INSERT INTO users (id, email, password_hash) VALUES (1, 'a@example.com', 'x')")
+    meta = insert_file(cursor, name="f", data=data, mime_type=mime_type, user_id=1, parent_folder_id=None)
+    cursor.execute(
+        "SELECT b.id, b.codec, b.size, b.stored_size FROM files f JOIN blobs b ON b.id = f.blob_id WHERE f.id = ?",
+        (meta["id"],),
+    )
+    blob_id, stored_codec, size, stored_size = cursor.fetchone()
+    assert (stored_codec, size) == (codec, len(data))
+    assert stored_size <= len(data)
+    assert read_blob(cursor, blob_id) == data
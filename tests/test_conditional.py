@@ -0,0 +1,137 @@
+"""ETags and ``If-None-Match`` (``app.conditional``) on folder and file reads.
+
+Usage: python -m pytest tests/test_conditional.py
+"""
+import pytest
+
+from app.conditional import etag_matches, make_etag
+
+ETAG = make_etag("folder", 1, 2)
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ("", False),
+    (ETAG, True),
+    (f"W/{ETAG}", True),  # If-None-Match uses the weak comparison
+    ("*", True),
+    (f'"other", {ETAG}', True),
+    (f'"other",W/{ETAG} , "more"', True),
+    ('"other", W/"more"', False),
+    (ETAG.strip('"'), False),  # unquoted
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, ETAG) is matches
+
+
+def test_make_etag_is_stable_and_specific():
+    assert make_etag("folder", 1, 2) == ETAG
+    assert make_etag("folder", 1, 3) != ETAG
+    assert make_etag("files", 1, 2) != ETAG
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+
+
+def create_folder(api, name, parent=None):
+    return api.post("/folders", json_body={"name": name, "parent_folder_id": parent}).json()["id"]
+
+
+def upload(api, name, data, parent=None):
+    params = {"name": name} if parent is None else {"name": name, "parent_folder_id": parent}
+    return api.post("/files/upload", params=params, body=data).json()["id"]
+
+
+def etag_of(api, path):
+    response = api.get(path)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "private, no-cache"
+    return response.headers["etag"]
+
+
+def assert_not_modified(api, path, etag, if_none_match=None):
+    response = api.get(path, headers={"if-none-match": if_none_match or etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+
+@pytest.fixture
+def tree(api):
+    """docs/{reports/{q1}} with one file in reports."""
+    docs = create_folder(api, "docs")
+    reports = create_folder(api, "reports", docs)
+    q1 = create_folder(api, "q1", reports)
+    file_id = upload(api, "summary.txt", b"first draft", reports)
+    return {"docs": docs, "reports": reports, "q1": q1, "file": file_id}
+
+
+@pytest.mark.parametrize("path", [
+    "/folders/{reports}",
+    "/folders/{reports}/files",
+    "/folders/{reports}/subfolders",
+    "/files/{file}/download",
+    "/files/{file}/content",
+])
+def test_unchanged_resource_is_304(api, tree, path):
+    path = path.format(**tree)
+    etag = etag_of(api, path)
+    assert_not_modified(api, path, etag)
+    assert_not_modified(api, path, etag, f'"stale", W/{etag}')
+    assert_not_modified(api, path, etag, "*")
+    assert etag_of(api, path) == etag
+
+
+def test_folder_etag_follows_its_own_changes(api, tree):
+    path = f"/folders/{tree['reports']}"
+    before = etag_of(api, path)
+    api.request("PATCH", path, json_body={"name": "Reports"})
+    after_rename = etag_of(api, path)
+    assert after_rename != before
+    upload(api, "new.txt", b"new", tree["reports"])
+    assert etag_of(api, path) != after_rename
+
+
+def test_folder_etag_follows_children_and_ancestors(api, tree):
+    path = f"/folders/{tree['reports']}"
+    etags = [etag_of(api, path)]
+    # a direct child renamed
+    api.request("PATCH", f"/folders/{tree['q1']}", json_body={"name": "Q1"})
+    etags.append(etag_of(api, path))
+    # content deeper in the subtree (only the aggregates change)
+    upload(api, "deep.txt", b"deep", tree["q1"])
+    etags.append(etag_of(api, path))
+    # an ancestor renamed (the breadcrumb path changes)
+    api.request("PATCH", f"/folders/{tree['docs']}", json_body={"name": "Documents"})
+    etags.append(etag_of(api, path))
+    assert len(set(etags)) == len(etags)
+    # a sibling of the parent does not change it
+    create_folder(api, "elsewhere")
+    assert etag_of(api, path) == etags[-1]
+
+
+def test_listing_etag_follows_direct_children(api, tree):
+    path = f"/folders/{tree['reports']}/files"
+    before = etag_of(api, path)
+    upload(api, "deep.txt", b"deep", tree["q1"])  # not a direct child
+    assert etag_of(api, path) == before
+    upload(api, "next.txt", b"next", tree["reports"])
+    assert etag_of(api, path) != before
+
+
+def test_file_etags(api, tree):
+    download = f"/files/{tree['file']}/download"
+    content = f"/files/{tree['file']}/content"
+    before = etag_of(api, download), etag_of(api, content)
+    api.request("PATCH", f"/files/{tree['file']}", json_body={"name": "final.txt"})
+    # the download includes the name; the raw content ETag is the content hash
+    assert etag_of(api, download) != before[0]
+    assert etag_of(api, content) == before[1]
+    # identical bytes share the content ETag
+    copy = upload(api, "copy.txt", b"first draft")
+    assert etag_of(api, f"/files/{copy}/content") == before[1]
+
+
+def test_other_users_get_404_not_304(api, tree):
+    path = f"/folders/{tree['reports']}"
+    etag = etag_of(api, path)
+    response = api.get(path, headers={"if-none-match": etag}, token=api.other_token)
+    assert response.status_code == 404
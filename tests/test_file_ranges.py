@@ -0,0 +1,89 @@
+"""``Range`` requests on ``GET /files/{id}/content``.
+
+Usage: python -m pytest tests/test_file_ranges.py
+"""
+import os
+
+import pytest
+
+TEXT = b"".join(b"line %05d of a compressible text file\n" % n for n in range(2000))
+RANDOM = os.urandom(50000)
+
+
+@pytest.fixture(params=[("log.txt", TEXT), ("photo.bin", RANDOM)], ids=["zlib", "identity"])
+def stored(request, api):
+    name, data = request.param
+    response = api.post("/files/upload", params={"name": name}, body=data)
+    assert response.status_code == 200
+    return response.json()["id"], data
+
+
+def get_range(api, file_id, value, **headers):
+    return api.get(f"/files/{file_id}/content", headers={"range": value, **headers})
+
+
+def test_full_content_advertises_ranges(api, stored):
+    file_id, data = stored
+    response = api.get(f"/files/{file_id}/content")
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == data
+
+
+@pytest.mark.parametrize("value, start, end", [
+    ("bytes=0-99", 0, 100),
+    ("bytes=1000-1000", 1000, 1001),
+    ("bytes=40000-", 40000, None),  # open-ended
+    ("bytes=-500", -500, None),  # suffix
+    ("bytes=-99999999", 0, None),  # suffix longer than the file
+    ("bytes=100-99999999", 100, None),  # end past the file
+])
+def test_satisfiable_range_is_206(api, stored, value, start, end):
+    file_id, data = stored
+    response = get_range(api, file_id, value)
+    expected = data[start:end]
+    first = start if start >= 0 else len(data) + start
+    assert response.status_code == 206
+    assert response.content == expected
+    assert response.headers["content-length"] == str(len(expected))
+    assert response.headers["content-range"] == f"bytes {first}-{first + len(expected) - 1}/{len(data)}"
+
+
+@pytest.mark.parametrize("value", ["bytes=200000-", "bytes=200000-200010", "bytes=-0"])
+def test_unsatisfiable_range_is_416(api, stored, value):
+    file_id, data = stored
+    response = get_range(api, file_id, value)
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(data)}"
+
+
+@pytest.mark.parametrize("value", [
+    "bytes=abc",
+    "bytes=20-5",  # last before first
+    "bytes=-",
+    "bytes=+5-10",
+    "bytes=0-1,5-9",  # multiple ranges are not supported
+    "items=0-9",
+])
+def test_invalid_range_is_ignored(api, stored, value):
+    file_id, data = stored
+    response = get_range(api, file_id, value)
+    assert response.status_code == 200
+    assert response.content == data
+    assert "content-range" not in response.headers
+
+
+def test_if_range(api, stored):
+    file_id, data = stored
+    etag = api.get(f"/files/{file_id}/content").headers["etag"]
+    assert get_range(api, file_id, "bytes=0-9", **{"if-range": etag}).content == data[:10]
+    stale = get_range(api, file_id, "bytes=0-9", **{"if-range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == data
+
+
+def test_empty_file_ignores_range(api):
+    file_id = api.post("/files/upload", params={"name": "empty.bin"}).json()["id"]
+    response = get_range(api, file_id, "bytes=0-9")
+    assert response.status_code == 200
+    assert response.content == b""
@@ -0,0 +1,136 @@
+"""Folder aggregate triggers (migration 011).
+
+Every mutation of files and folders must leave ``total_size``,
+``file_count`` and ``folder_count`` equal to what ``recompute_aggregates``
+derives from scratch.
+
+Usage: python -m pytest tests/test_folder_aggregates.py
+"""
+import pytest
+
+from app.folder_tree import recompute_aggregates
+
+USER = 1
+
+
+@pytest.fixture
+def tree(db, cursor):
+    """root/{a/{a1, a2}, b/{b1}} with two files in a1 and one in b1."""
+    cursor.execute("INSERT INTO users (id, email, password_hash) VALUES (?, 'a@example.com', 'x')", (USER,))
+    ids = {}
+    for name, parent in [("root", None), ("a", "root"), ("a1", "a"), ("a2", "a"), ("b", "root"), ("b1", "b")]:
+        ids[name] = make_folder(cursor, name, ids.get(parent))
+    ids["f1"] = make_file(cursor, "f1", 100, ids["a1"])
+    ids["f2"] = make_file(cursor, "f2", 20, ids["a1"])
+    ids["f3"] = make_file(cursor, "f3", 3, ids["b1"])
+    db.commit()
+    return ids
+
+
+def make_folder(cursor, name, parent_id, user_id=USER):
+    cursor.execute(
+        "INSERT INTO folders (name, user_id, parent_folder_id) VALUES (?, ?, ?)", (name, user_id, parent_id)
+    )
+    return cursor.lastrowid
+
+
+def make_file(cursor, name, size, parent_id, user_id=USER):
+    cursor.execute(
+        "INSERT INTO files (name, size, user_id, parent_folder_id) VALUES (?, ?, ?, ?)",
+        (name, size, user_id, parent_id),
+    )
+    return cursor.lastrowid
+
+
+def aggregates(cursor, folder_id):
+    cursor.execute("SELECT total_size, file_count, folder_count FROM folders WHERE id = ?", (folder_id,))
+    return tuple(cursor.fetchone())
+
+
+def assert_consistent(cursor):
+    assert recompute_aggregates(cursor, USER, fix=False) == []
+
+
+def test_inserts(cursor, tree):
+    assert aggregates(cursor, tree["root"]) == (123, 3, 5)
+    assert aggregates(cursor, tree["a"]) == (120, 2, 2)
+    assert aggregates(cursor, tree["a1"]) == (120, 2, 0)
+    assert aggregates(cursor, tree["b"]) == (3, 1, 1)
+    assert_consistent(cursor)
+
+
+def test_root_level_file_counts_nowhere(cursor, tree):
+    make_file(cursor, "loose", 1000, None)
+    assert aggregates(cursor, tree["root"]) == (123, 3, 5)
+    assert_consistent(cursor)
+
+
+def test_file_delete(cursor, tree):
+    cursor.execute("DELETE FROM files WHERE id = ?", (tree["f1"],))
+    assert aggregates(cursor, tree["root"]) == (23, 2, 5)
+    assert aggregates(cursor, tree["a1"]) == (20, 1, 0)
+    assert_consistent(cursor)
+
+
+def test_file_resize(cursor, tree):
+    cursor.execute("UPDATE files SET size = 500 WHERE id = ?", (tree["f2"],))
+    assert aggregates(cursor, tree["root"]) == (603, 3, 5)
+    assert aggregates(cursor, tree["a"]) == (600, 2, 2)
+    assert_consistent(cursor)
+
+
+def test_file_move_across_subtrees(cursor, tree):
+    cursor.execute("UPDATE files SET parent_folder_id = ? WHERE id = ?", (tree["b1"], tree["f1"]))
+    assert aggregates(cursor, tree["a"]) == (20, 1, 2)
+    assert aggregates(cursor, tree["b"]) == (103, 2, 1)
+    assert aggregates(cursor, tree["root"]) == (123, 3, 5)
+    assert_consistent(cursor)
+
+
+def test_file_move_to_and_from_root_level(cursor, tree):
+    cursor.execute("UPDATE files SET parent_folder_id = NULL WHERE id = ?", (tree["f3"],))
+    assert aggregates(cursor, tree["root"]) == (120, 2, 5)
+    cursor.execute("UPDATE files SET parent_folder_id = ? WHERE id = ?", (tree["a2"], tree["f3"]))
+    assert aggregates(cursor, tree["a2"]) == (3, 1, 0)
+    assert_consistent(cursor)
+
+
+def test_file_move_and_resize_at_once(cursor, tree):
+    cursor.execute("UPDATE files SET parent_folder_id = ?, size = 7 WHERE id = ?", (tree["a2"], tree["f1"]))
+    assert aggregates(cursor, tree["a1"]) == (20, 1, 0)
+    assert aggregates(cursor, tree["a2"]) == (7, 1, 0)
+    assert aggregates(cursor, tree["root"]) == (30, 3, 5)
+    assert_consistent(cursor)
+
+
+def test_folder_move_across_subtrees(cursor, tree):
+    cursor.execute("UPDATE folders SET parent_folder_id = ? WHERE id = ?", (tree["b1"], tree["a1"]))
+    assert aggregates(cursor, tree["a"]) == (0, 0, 1)
+    assert aggregates(cursor, tree["b"]) == (123, 3, 2)
+    assert aggregates(cursor, tree["b1"]) == (123, 3, 1)
+    assert aggregates(cursor, tree["root"]) == (123, 3, 5)
+    assert_consistent(cursor)
+
+
+def test_folder_move_out_of_the_tree(cursor, tree):
+    cursor.execute("UPDATE folders SET parent_folder_id = NULL WHERE id = ?", (tree["a"],))
+    assert aggregates(cursor, tree["root"]) == (3, 1, 2)
+    assert aggregates(cursor, tree["a"]) == (120, 2, 2)
+    assert_consistent(cursor)
+
+
+def test_folder_delete_bottom_up(cursor, tree):
+    cursor.execute("DELETE FROM files WHERE parent_folder_id = ?", (tree["a1"],))
+    cursor.execute("DELETE FROM folders WHERE id = ?", (tree["a1"],))
+    assert aggregates(cursor, tree["a"]) == (0, 0, 1)
+    assert aggregates(cursor, tree["root"]) == (3, 1, 4)
+    assert_consistent(cursor)
+
+
+def test_recompute_repairs_drift(cursor, tree):
+    cursor.execute("UPDATE folders SET total_size = 0, file_count = 9 WHERE id = ?", (tree["a"],))
+    drifted = recompute_aggregates(cursor, USER)
+    assert [d["id"] for d in drifted] == [tree["a"]]
+    assert drifted[0]["actual"] == {"total_size": 120, "file_count": 2, "folder_count": 2}
+    assert aggregates(cursor, tree["a"]) == (120, 2, 2)
+    assert_consistent(cursor)
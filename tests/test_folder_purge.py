@@ -0,0 +1,131 @@
+"""Folder tombstones and the background purge (migration 013, ``app.purge``).
+
+Usage: python -m pytest tests/test_folder_purge.py
+"""
+import pytest
+
+from app.folder_tree import is_live_folder, purge_batch, recompute_aggregates, tombstone_folder
+from app.purge import DONE, pending_jobs, run_job_batch
+from app.storage import insert_file
+
+USER = 1
+NOW = 1700000000
+
+
+@pytest.fixture
+def tree(db, cursor):
+    """root/{keep, doomed/{d1/{d11}, d2}}; doomed's subtree holds 7 files, one sharing its blob with keep's file."""
+    cursor.execute("INSERT INTO users (id, email, password_hash) VALUES (?, 'a@example.com', 'x')", (USER,))
+    ids = {}
+    for name, parent in [("root", None), ("keep", "root"), ("doomed", "root"), ("d1", "doomed"),
+                         ("d11", "d1"), ("d2", "doomed")]:
+        cursor.execute(
+            "INSERT INTO folders (name, user_id, parent_folder_id) VALUES (?, ?, ?)", (name, USER, ids.get(parent))
+        )
+        ids[name] = cursor.lastrowid
+    add_file(cursor, "shared", b"shared content", ids["keep"])
+    for n, folder in enumerate(["doomed", "d1", "d1", "d11", "d11", "d11", "d2"]):
+        add_file(cursor, f"f{n}", b"shared content" if n == 0 else f"only here {n}".encode(), ids[folder])
+    db.commit()
+    return ids
+
+
+def add_file(cursor, name, data, parent_id):
+    return insert_file(cursor, name=name, data=data, mime_type=None, user_id=USER, parent_folder_id=parent_id)["id"]
+
+
+def scalar(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    return cursor.fetchone()[0]
+
+
+def aggregates(cursor, folder_id):
+    cursor.execute("SELECT total_size, file_count, folder_count FROM folders WHERE id = ?", (folder_id,))
+    return tuple(cursor.fetchone())
+
+
+def purge(cursor, job_id, folder_id, limit):
+    batches = 0
+    while not run_job_batch(cursor, job_id, folder_id, USER, limit):
+        batches += 1
+        assert recompute_aggregates(cursor, USER, fix=False) == []
+    return batches + 1
+
+
+def test_tombstone_hides_subtree(cursor, tree):
+    root_before = aggregates(cursor, tree["root"])
+    tombstone_folder(cursor, tree["doomed"], USER, NOW)
+
+    subtree = [tree[name] for name in ("doomed", "d1", "d11", "d2")]
+    assert not any(is_live_folder(cursor, folder_id, USER) for folder_id in subtree)
+    assert is_live_folder(cursor, tree["keep"], USER)
+    live = {r[0] for r in cursor.execute("SELECT id FROM live_folders WHERE user_id = ?", (USER,))}
+    assert live == {tree["root"], tree["keep"]}
+    assert scalar(cursor, "SELECT COUNT(*) FROM live_files WHERE user_id = ?", (USER,)) == 1
+    assert scalar(cursor, "SELECT COUNT(*) FROM files WHERE user_id = ?", (USER,)) == 8
+
+    # the ancestors lose the subtree at once
+    size_doomed = aggregates(cursor, tree["doomed"])[0]
+    assert aggregates(cursor, tree["root"]) == (root_before[0] - size_doomed, 1, 1)
+    assert recompute_aggregates(cursor, USER, fix=False) == []
+
+
+def test_tombstone_records_pending_job(cursor, tree):
+    job_id = tombstone_folder(cursor, tree["doomed"], USER, NOW)
+    assert [tuple(job) for job in pending_jobs(cursor)] == [(job_id, USER, tree["doomed"])]
+
+
+def test_purge_runs_in_batches_to_completion(cursor, tree):
+    job_id = tombstone_folder(cursor, tree["doomed"], USER, NOW)
+    root_after_tombstone = aggregates(cursor, tree["root"])
+
+    batches = purge(cursor, job_id, tree["doomed"], limit=2)
+
+    assert batches > 2
+    cursor.execute("SELECT status, files_deleted, folders_deleted, finished_at FROM purge_jobs WHERE id = ?", (job_id,))
+    status, files_deleted, folders_deleted, finished_at = cursor.fetchone()
+    assert (status, files_deleted, folders_deleted) == (DONE, 7, 4)
+    assert finished_at is not None
+    assert pending_jobs(cursor) == []
+    remaining = {r[0] for r in cursor.execute("SELECT id FROM folders WHERE user_id = ?", (USER,))}
+    assert remaining == {tree["root"], tree["keep"]}
+    assert scalar(cursor, "SELECT COUNT(*) FROM folder_closure WHERE descendant_id = ?", (tree["d11"],)) == 0
+    assert scalar(cursor, "SELECT COUNT(*) FROM files WHERE user_id = ?", (USER,)) == 1
+    assert aggregates(cursor, tree["root"]) == root_after_tombstone
+    assert recompute_aggregates(cursor, USER, fix=False) == []
+
+
+def test_purge_drops_unreferenced_blobs(cursor, tree):
+    assert scalar(cursor, "SELECT COUNT(*) FROM blobs") == 7
+    job_id = tombstone_folder(cursor, tree["doomed"], USER, NOW)
+    purge(cursor, job_id, tree["doomed"], limit=3)
+
+    cursor.execute("SELECT refcount FROM blobs")
+    assert [r[0] for r in cursor.fetchall()] == [1]
+    assert scalar(cursor, "SELECT COUNT(*) FROM blobs WHERE refcount <= 0") == 0
+
+
+def test_nested_tombstones(cursor, tree):
+    inner_job = tombstone_folder(cursor, tree["d1"], USER, NOW)
+    outer_job = tombstone_folder(cursor, tree["doomed"], USER, NOW + 1)
+    assert recompute_aggregates(cursor, USER, fix=False) == []
+
+    purge(cursor, inner_job, tree["d1"], limit=1)
+    assert recompute_aggregates(cursor, USER, fix=False) == []
+    purge(cursor, outer_job, tree["doomed"], limit=1)
+
+    assert aggregates(cursor, tree["root"]) == (len(b"shared content"), 1, 1)
+    assert recompute_aggregates(cursor, USER, fix=False) == []
+
+
+def test_purge_batch_of_missing_folder_is_done(cursor, tree):
+    assert purge_batch(cursor, 999999, USER, 10) == (0, 0, True)
+
+
+def test_new_files_beside_purge_keep_aggregates(cursor, tree):
+    job_id = tombstone_folder(cursor, tree["doomed"], USER, NOW)
+    run_job_batch(cursor, job_id, tree["doomed"], USER, 2)
+    add_file(cursor, "late", b"written during the purge", tree["keep"])
+    purge(cursor, job_id, tree["doomed"], limit=2)
+    assert aggregates(cursor, tree["root"])[1:] == (2, 1)
+    assert recompute_aggregates(cursor, USER, fix=False) == []
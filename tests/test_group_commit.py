@@ -0,0 +1,109 @@
+"""Group commit of small writes (``app.group_commit``).
+
+Usage: python -m pytest tests/test_group_commit.py
+"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from app import database, group_commit
+from app.group_commit import GroupCommitter, close_committers, run_write
+
+USER = 1
+
+
+@pytest.fixture
+def catalog(db, cursor, db_path, monkeypatch):
+    """The per-test database as the application's (unsharded) database."""
+    cursor.execute("INSERT INTO users (id, email, password_hash) VALUES (?, 'a@example.com', 'x')", (USER,))
+    db.commit()
+    monkeypatch.setattr(database, "DATABASE_PATH", db_path)
+    monkeypatch.setattr(database, "DB_SHARDS", 1)
+    yield db
+    database.close_pool()
+
+
+def add_folder(cursor, name, batches=None):
+    if batches is not None:
+        batches.append(cursor)  # one cursor per flushed batch
+    cursor.execute("INSERT INTO folders (name, user_id) VALUES (?, ?)", (name, USER))
+    return cursor.lastrowid
+
+
+def add_folder_then_fail(cursor, name):
+    add_folder(cursor, name)
+    raise LookupError(name)
+
+
+def folder_names(db):
+    return [row[0] for row in db.execute("SELECT name FROM folders ORDER BY id")]
+
+
+def run_batch(*ops, window=0.05, max_ops=64):
+    """Submit ``(fn, *args)`` operations to one committer at once; returns results or exceptions in order."""
+    async def main():
+        committer = GroupCommitter(None, window=window, max_ops=max_ops)
+        try:
+            return await asyncio.gather(*(committer.submit(*op) for op in ops), return_exceptions=True)
+        finally:
+            await committer.close()
+    return asyncio.run(main())
+
+
+def test_operations_share_one_transaction(catalog):
+    batches = []
+    results = run_batch(*((add_folder, f"f{n}", batches) for n in range(5)))
+    assert len(set(results)) == 5
+    assert len({id(cursor) for cursor in batches}) == 1
+    assert folder_names(catalog) == [f"f{n}" for n in range(5)]
+
+
+def test_failed_operation_is_rolled_back_alone(catalog):
+    results = run_batch((add_folder, "a"), (add_folder_then_fail, "b"), (add_folder, "c"))
+    assert isinstance(results[0], int) and isinstance(results[2], int)
+    assert isinstance(results[1], LookupError)
+    assert folder_names(catalog) == ["a", "c"]
+
+
+def test_constraint_violation_is_rolled_back_alone(catalog):
+    results = run_batch((add_folder, "a"), (add_folder, None), (add_folder, "c"))
+    assert isinstance(results[1], sqlite3.IntegrityError)
+    assert folder_names(catalog) == ["a", "c"]
+
+
+def test_batches_are_capped_at_max_ops(catalog):
+    batches = []
+    run_batch(*((add_folder, f"f{n}", batches) for n in range(5)), max_ops=2)
+    sizes = [len(list(group)) for group in _runs(batches)]
+    assert sizes == [2, 2, 1]
+    assert len(folder_names(catalog)) == 5
+
+
+def _runs(items):
+    """Consecutive runs of the same object."""
+    run = []
+    for item in items:
+        if run and item is not run[-1]:
+            yield run
+            run = []
+        run.append(item)
+    if run:
+        yield run
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_run_write(catalog, monkeypatch, enabled):
+    monkeypatch.setattr(group_commit, "GROUP_COMMIT", enabled)
+
+    async def main():
+        try:
+            first = await run_write(add_folder, "a", user_id=USER)
+            with pytest.raises(LookupError):
+                await run_write(add_folder_then_fail, "b", user_id=USER)
+            return first
+        finally:
+            await close_committers()
+
+    assert isinstance(asyncio.run(main()), int)
+    assert folder_names(catalog) == ["a"]
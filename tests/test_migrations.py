@@ -0,0 +1,78 @@
+"""Migrations that backfill derived data from existing rows.
+
+Usage: python -m pytest tests/test_migrations.py
+"""
+import sqlite3
+
+import pytest
+
+import migrate
+from app.database import get_connection
+from app.folder_tree import get_ancestors, is_descendant
+
+USER = 1
+
+
+def migrate_until(db_path, name):
+    """Apply the migrations before ``name``; returns the module for ``name``."""
+    for filepath in migrate.get_migration_files():
+        module = migrate.load_migration_module(filepath)
+        if filepath.endswith(f"{name}.py"):
+            return module
+        module.upgrade(db_path)
+    raise LookupError(name)
+
+
+def add_chain(conn, depth):
+    """A single path of ``depth`` nested folders; returns their ids from the top down."""
+    ids = []
+    for level in range(depth):
+        cursor = conn.execute(
+            "INSERT INTO folders (name, user_id, parent_folder_id) VALUES (?, ?, ?)",
+            (f"level {level}", USER, ids[-1] if ids else None),
+        )
+        ids.append(cursor.lastrowid)
+    return ids
+
+
+@pytest.fixture
+def before_closure(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    module = migrate_until(db_path, "005_create_folder_closure")
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users (id, email, password_hash) VALUES (?, 'a@example.com', 'x')", (USER,))
+    yield db_path, conn, module
+    conn.close()
+
+
+def test_closure_backfill_covers_deep_trees(before_closure):
+    db_path, conn, module = before_closure
+    chain = add_chain(conn, 1001)
+    conn.commit()
+    module.upgrade(db_path)
+
+    db = get_connection(db_path)
+    try:
+        deepest = chain[-1]
+        assert db.execute("SELECT COUNT(*) FROM folder_closure").fetchone()[0] == 1001 * 1002 // 2
+        assert db.execute(
+            "SELECT MAX(depth) FROM folder_closure WHERE descendant_id = ?", (deepest,)
+        ).fetchone()[0] == 1000
+        assert [row["id"] for row in get_ancestors(db.cursor(), deepest, USER)] == chain
+        assert is_descendant(db.cursor(), deepest, chain[0])
+    finally:
+        db.close()
+
+
+def test_closure_backfill_rejects_parent_cycles(before_closure):
+    db_path, conn, module = before_closure
+    first, second, third = add_chain(conn, 3)
+    conn.execute("UPDATE folders SET parent_folder_id = ? WHERE id = ?", (third, first))
+    conn.commit()
+
+    with pytest.raises(RuntimeError, match="cycle"):
+        module.upgrade(db_path)
+
+    applied = conn.execute("SELECT COUNT(*) FROM _migrations WHERE name = '005_create_folder_closure'")
+    assert applied.fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM folder_closure").fetchone()[0] == 0
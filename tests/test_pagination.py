@@ -0,0 +1,124 @@
+"""Keyset pagination (``app.pagination``) of folder listings and items.
+
+Usage: python -m pytest tests/test_pagination.py
+"""
+import base64
+import json
+
+import pytest
+
+from app.pagination import decode_cursor, encode_cursor
+
+# duplicate and case-variant names, so the name order has ties broken by id
+NAMES = ["b", "a", "B", "a", "c", "a", "b", "A", "a b", "a", "", "b"]
+
+
+@pytest.fixture
+def folder(api, db):
+    parent = api.post("/folders", json_body={"name": "parent"}).json()["id"]
+    for name in NAMES:
+        assert api.post("/folders", json_body={"name": name, "parent_folder_id": parent}).status_code == 200
+        assert api.post("/files/upload", params={"name": name or "-", "parent_folder_id": parent}, body=b"x").status_code == 200
+    return parent
+
+
+def walk(api, path, **params):
+    """Every row of a paginated listing, page by page."""
+    key = path.rsplit("/", 1)[-1]
+    rows, cursor, pages = [], None, 0
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        response = api.get(path, params=query)
+        assert response.status_code == 200
+        body = response.json()
+        rows += body[key]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return rows, pages
+
+
+def expected(db, table, parent, sort):
+    order = "name, id" if sort == "name" else "id"
+    return [row[0] for row in db.execute(
+        f"SELECT id FROM {table} WHERE parent_folder_id = ? ORDER BY {order}", (parent,)
+    )]
+
+
+@pytest.mark.parametrize("listing, table", [("files", "files"), ("subfolders", "folders")])
+@pytest.mark.parametrize("sort", ["name", "id"])
+@pytest.mark.parametrize("limit", [1, 2, 5, 12, 100])
+def test_walk_every_page(api, db, folder, listing, table, sort, limit):
+    rows, pages = walk(api, f"/folders/{folder}/{listing}", sort=sort, limit=limit)
+    ids = [row["id"] for row in rows]
+    assert ids == expected(db, table, folder, sort)
+    assert len(ids) == len(set(ids)) == len(NAMES)
+    # a full last page carries no cursor, so there is never an empty extra page
+    assert pages == -(-len(NAMES) // limit)
+
+
+def test_rows_added_before_the_cursor_are_not_repeated(api, db, folder):
+    path = f"/folders/{folder}/files"
+    first = api.get(path, params={"sort": "name", "limit": 4}).json()
+    api.post("/files/upload", params={"name": "", "parent_folder_id": folder}, body=b"x")  # sorts first
+    api.post("/files/upload", params={"name": "zzz", "parent_folder_id": folder}, body=b"x")  # sorts last
+    rest, _ = walk(api, path, sort="name", limit=4, cursor=first["next_cursor"])
+    seen = [row["id"] for row in first["files"] + rest]
+    assert len(seen) == len(set(seen))
+    assert rest[-1]["name"] == "zzz"
+
+
+def test_empty_listing(api, folder):
+    empty = api.post("/folders", json_body={"name": "empty"}).json()["id"]
+    body = api.get(f"/folders/{empty}/files").json()
+    assert body == {"folder_id": empty, "files": [], "next_cursor": None}
+
+
+def test_items_walk(api, db):
+    for n in range(7):
+        api.post("/items", json_body={"name": f"item {n}"})
+    ids = [row[0] for row in db.execute("SELECT id FROM items ORDER BY id")]
+    rows, pages = walk(api, "/items", limit=3)
+    assert [row["id"] for row in rows] == ids
+    assert pages == -(-len(ids) // 3)
+
+
+def forge(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "%%%",
+    forge([1, 2]),
+    forge({"k": "a"}),  # no id
+    forge({"i": "7", "s": "name", "k": "a"}),
+    forge({"i": 7, "s": "name"}),  # name sort without a name
+    forge({"i": 7, "s": "name", "k": 3}),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_invalid_cursor_is_400(api, folder, cursor):
+    response = api.get(f"/folders/{folder}/files", params={"sort": "name", "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_cursor_is_bound_to_its_sort(api, folder):
+    path = f"/folders/{folder}/subfolders"
+    by_id = api.get(path, params={"sort": "id", "limit": 2}).json()["next_cursor"]
+    response = api.get(path, params={"sort": "name", "cursor": by_id})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor does not match sort order"
+    by_name = api.get(path, params={"sort": "name", "limit": 2}).json()["next_cursor"]
+    assert api.get(path, params={"sort": "id", "cursor": by_name}).status_code == 400
+    # a search cursor is no listing cursor
+    assert api.get(path, params={"sort": "name", "cursor": forge({"i": 3, "s": "rank", "k": 1.0})}).status_code == 400
+
+
+def test_cursor_round_trip():
+    values = {"i": 12, "s": "name", "k": "Résumé, \"final\".pdf"}
+    token = encode_cursor(values)
+    assert "=" not in token
+    assert decode_cursor(token, "name") == values
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
@@ -0,0 +1,97 @@
+"""Query-plan regression tests.
+
+Collects every literal SQL statement in the ``app`` package (string constants
+starting with SELECT/INSERT/UPDATE/DELETE/WITH), plus the statements inside
+schema triggers, runs
+``EXPLAIN QUERY PLAN`` for each against a freshly migrated database and fails
+if any of them scans a table that grows with the data set.
+
+Usage: python -m pytest tests/test_query_plans.py
+"""
+import ast
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import migrate  # noqa: E402
+
+LARGE_TABLES = {"users", "folders", "files", "blobs", "folder_closure", "items", "upload_sessions", "upload_parts", "purge_jobs"}
+
+# Statements that are expected to scan, with the reason
+ALLOWED_SCANS = {}
+
+ALIAS_RE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+STATEMENT_RE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\s")
+SQL_KEYWORDS = {"WHERE", "JOIN", "ON", "SET", "VALUES", "ORDER", "GROUP", "LIMIT", "LEFT", "INNER", "CROSS", "USING"}
+
+
+def collect_app_statements():
+    statements = []
+    for path in sorted((ROOT / "app").rglob("*.py")):
+        tree = ast.parse(path.read_text(), filename=str(path))
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and STATEMENT_RE.match(node.value):
+                sql = " ".join(node.value.split())
+                statements.append((f"{path.relative_to(ROOT)}:{node.lineno}", sql))
+    return statements
+
+
+def collect_trigger_statements(conn):
+    statements = []
+    rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    for name, sql in rows:
+        body = sql[sql.upper().index("BEGIN") + len("BEGIN"):sql.upper().rindex("END")]
+        for stmt in body.split(";"):
+            stmt = " ".join(stmt.split())
+            if stmt:
+                statements.append((f"trigger {name}", re.sub(r"\b(?:NEW|OLD)\.\w+", "?", stmt)))
+    return statements
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp("plans") / "plans.db")
+    for filepath in migrate.get_migration_files():
+        module = migrate.load_migration_module(filepath)
+        module.upgrade(db_path)
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def scanned_tables(conn, sql):
+    aliases = {}
+    for table, alias in ALIAS_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    params = [None] * sql.count("?")
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    scans = []
+    for row in plan:
+        match = re.match(r"SCAN (\w+)", row[3])
+        if match:
+            scans.append((aliases.get(match.group(1), match.group(1)), row[3]))
+    return scans
+
+
+def test_app_statements_found():
+    assert len(collect_app_statements()) > 20
+
+
+def test_no_large_table_scans(conn):
+    statements = collect_app_statements() + collect_trigger_statements(conn)
+    failures = []
+    for where, sql in statements:
+        if sql in ALLOWED_SCANS:
+            continue
+        for table, detail in scanned_tables(conn, sql):
+            if table in LARGE_TABLES:
+                failures.append(f"{where}: {detail}\n    {sql}")
+    assert not failures, "Full table scans found:\n" + "\n".join(failures)
@@ -0,0 +1,164 @@
+"""Full-text search (migration 012, ``app.search``).
+
+Usage: python -m pytest tests/test_search.py
+"""
+import pytest
+
+from app import search as search_module
+from app.search import (
+    MAX_QUERY_TERMS,
+    build_query,
+    file_rowid,
+    folder_rowid,
+    make_snippet,
+    query_terms,
+    rank_floors,
+    reindex_user,
+    search,
+)
+from app.storage import insert_file
+
+ALICE = 1
+BOB = 2
+
+
+@pytest.fixture
+def items(db, cursor):
+    for user_id, email in [(ALICE, "alice@example.com"), (BOB, "bob@example.com")]:
+        cursor.execute("INSERT INTO users (id, email, password_hash) VALUES (?, ?, 'x')", (user_id, email))
+    ids = {
+        "reports": add_folder(cursor, "Quarterly Reports", ALICE),
+        "report": add_file(cursor, "report-2024.pdf", b"%PDF binary", "application/pdf", ALICE),
+        "notes": add_file(cursor, "notes.txt", b"meeting about the annual report and budget", "text/plain", ALICE),
+        "cafe": add_file(cursor, "Café menu.txt", b"espresso", "text/plain", ALICE),
+        "bob_report": add_file(cursor, "report.txt", b"bob's report", "text/plain", BOB),
+    }
+    db.commit()
+    return ids
+
+
+def add_folder(cursor, name, user_id):
+    cursor.execute("INSERT INTO folders (name, user_id) VALUES (?, ?)", (name, user_id))
+    return cursor.lastrowid
+
+
+def add_file(cursor, name, data, mime_type, user_id):
+    return insert_file(cursor, name=name, data=data, mime_type=mime_type, user_id=user_id, parent_folder_id=None)["id"]
+
+
+def find(cursor, user_id, text, kind="all", prefix=True):
+    return [row["rowid"] for row in search(cursor, build_query(user_id, query_terms(text), prefix), kind, 100)]
+
+
+def test_query_terms_fold_like_the_tokenizer():
+    assert query_terms("Café-Menu_2024!") == ["cafe", "menu", "2024"]
+    assert query_terms("'\" OR NOT *") == ["or", "not"]
+    assert len(query_terms(" ".join(f"t{n}" for n in range(40)))) == MAX_QUERY_TERMS
+
+
+def test_query_syntax_is_never_interpreted(cursor, items):
+    # operators in user input are plain tokens, not FTS5 syntax
+    assert find(cursor, ALICE, "report OR budget") == []
+    assert find(cursor, ALICE, 'report" OR owner:u2 "') == []
+
+
+def test_results_are_scoped_to_the_owner(cursor, items):
+    alice = find(cursor, ALICE, "report")
+    assert file_rowid(items["bob_report"]) not in alice
+    assert set(alice) == {file_rowid(items["report"]), file_rowid(items["notes"]), folder_rowid(items["reports"])}
+    assert find(cursor, BOB, "report") == [file_rowid(items["bob_report"])]
+    assert find(cursor, BOB, "quarterly") == []
+
+
+def test_prefix_queries(cursor, items):
+    assert find(cursor, ALICE, "quart") == [folder_rowid(items["reports"])]
+    assert find(cursor, ALICE, "quart", prefix=False) == []
+    assert find(cursor, ALICE, "quarterly", prefix=False) == [folder_rowid(items["reports"])]
+    # single characters are never expanded
+    assert find(cursor, ALICE, "q") == []
+
+
+def test_every_term_must_match(cursor, items):
+    assert find(cursor, ALICE, "report budget") == [file_rowid(items["notes"])]
+    assert find(cursor, ALICE, "report espresso") == []
+
+
+def test_accents_fold(cursor, items):
+    assert find(cursor, ALICE, "cafe") == [file_rowid(items["cafe"])]
+    assert find(cursor, ALICE, "CAFÉ") == [file_rowid(items["cafe"])]
+
+
+def test_kind_filter(cursor, items):
+    assert find(cursor, ALICE, "report", kind="folder") == [folder_rowid(items["reports"])]
+    assert folder_rowid(items["reports"]) not in find(cursor, ALICE, "report", kind="file")
+
+
+def test_name_hits_rank_above_body_hits(cursor, items):
+    ranked = find(cursor, ALICE, "report", kind="file")
+    assert ranked == [file_rowid(items["report"]), file_rowid(items["notes"])]
+
+
+def test_pages_continue_after_the_last_row(cursor, items):
+    query = build_query(ALICE, ["report"])
+    first = search(cursor, query, "all", 2)
+    rest = search(cursor, query, "all", 10, after=(first[-1]["score"], first[-1]["rowid"]))
+    assert [r["rowid"] for r in first + rest] == find(cursor, ALICE, "report")
+
+
+def test_index_follows_renames_and_deletes(cursor, items):
+    cursor.execute("UPDATE files SET name = 'summary.pdf' WHERE id = ?", (items["report"],))
+    cursor.execute("UPDATE folders SET name = 'Archive' WHERE id = ?", (items["reports"],))
+    assert find(cursor, ALICE, "summary") == [file_rowid(items["report"])]
+    assert find(cursor, ALICE, "archive") == [folder_rowid(items["reports"])]
+    cursor.execute("DELETE FROM files WHERE id = ?", (items["notes"],))
+    assert find(cursor, ALICE, "report") == []
+
+
+def test_reindex_user_rebuilds_names_and_text(cursor, items):
+    cursor.execute("DELETE FROM search_index")
+    assert find(cursor, ALICE, "budget") == []
+    assert reindex_user(cursor, ALICE) == (3, 1)
+    assert find(cursor, ALICE, "budget") == [file_rowid(items["notes"])]
+    assert find(cursor, ALICE, "quarterly") == [folder_rowid(items["reports"])]
+    assert find(cursor, BOB, "report") == []
+
+
+def test_make_snippet():
+    text = "one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen sixteen"
+    assert make_snippet(text, ["seven"], False) == (
+        "... four five six [seven] eight nine ten eleven twelve thirteen fourteen fifteen ..."
+    )
+    assert make_snippet("The Reports are due", ["rep"], True) == "The [Reports] are due"
+    assert make_snippet("nothing here", ["report"], True) is None
+
+
+
+def test_rank_cap_is_per_kind_and_keeps_the_rest(cursor, items, monkeypatch):
+    monkeypatch.setattr(search_module, "SEARCH_MAX_RANKED", 3)
+    archive = add_folder(cursor, "report archive", ALICE)
+    newer = [add_file(cursor, f"report {n}.txt", b"", "text/plain", ALICE) for n in range(6)]
+    query = build_query(ALICE, ["report"])
+    folders = [folder_rowid(items["reports"]), folder_rowid(archive)]
+
+    # newer files must not push the folders out of a folder search
+    assert rank_floors(cursor, query, "folder") == [0, 0]
+    assert sorted(find(cursor, ALICE, "report", kind="folder")) == folders
+
+    floors = rank_floors(cursor, query, "all")
+    assert floors == [file_rowid(newer[3]), 0]
+    rows = search(cursor, query, "all", 100, floors)
+    ranked = [r["rowid"] for r in rows if r["score"] is not None]
+    rest = [r["rowid"] for r in rows if r["score"] is None]
+    assert sorted(ranked) == sorted([file_rowid(i) for i in newer[3:]] + folders)
+    assert rest == sorted([file_rowid(items["report"]), file_rowid(items["notes"])] + [file_rowid(i) for i in newer[:3]])
+    assert [r["rowid"] for r in rows] == ranked + rest
+
+    # pages run on from the ranked rows into the unranked ones
+    pages, after = [], None
+    while True:
+        page = search(cursor, query, "all", 2, floors, after)
+        pages += [r["rowid"] for r in page]
+        if len(page) < 2:
+            break
+        after = (page[-1]["score"], page[-1]["rowid"])
+    assert pages == ranked + rest
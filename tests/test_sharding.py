@@ -0,0 +1,104 @@
+"""Per-user database sharding (``DB_SHARDS``, ``app.database``).
+
+Usage: python -m pytest tests/test_sharding.py
+"""
+import collections
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import migrate
+from app import database
+from app.database import all_database_paths, database_path, get_db, shard_for, shard_path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    """Four shards next to a catalog in a temp directory, migrated like ``migrate.py upgrade``."""
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "app.db"))
+    monkeypatch.setattr(database, "DB_SHARDS", 4)
+    monkeypatch.setattr(database, "DB_SHARD_PATH", "{root}-shard{n}{ext}")
+    migrate.run_migrations("upgrade")
+    yield tmp_path
+    database.close_pool()
+
+
+def schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'").fetchall()
+        applied = {row[0] for row in conn.execute("SELECT name FROM _migrations")}
+    finally:
+        conn.close()
+    return set(rows), applied
+
+
+def test_unsharded_uses_database_path(monkeypatch):
+    monkeypatch.setattr(database, "DB_SHARDS", 1)
+    assert shard_for(12345) == 0
+    assert database_path(user_id=12345) == database.DATABASE_PATH
+    assert all_database_paths() == [database.DATABASE_PATH]
+
+
+def test_shard_for_is_pinned(monkeypatch):
+    # changing the hash would strand every existing user's data in the wrong file
+    monkeypatch.setattr(database, "DB_SHARDS", 4)
+    assert [shard_for(user_id) for user_id in range(1, 13)] == [2, 0, 1, 2, 0, 0, 2, 2, 1, 0, 2, 3]
+
+
+def test_shard_for_is_stable_across_processes():
+    code = "from app.database import shard_for; print([shard_for(u) for u in range(1, 200)])"
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True,
+            env={**os.environ, "DB_SHARDS": "7", "PYTHONHASHSEED": seed},
+        ).stdout
+        for seed in ("1", "2")
+    }
+    assert len(outputs) == 1
+
+
+def test_shard_for_spreads_users(monkeypatch):
+    monkeypatch.setattr(database, "DB_SHARDS", 4)
+    counts = collections.Counter(shard_for(user_id) for user_id in range(1, 10001))
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 2200
+
+
+def test_shard_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "app.db"))
+    monkeypatch.setattr(database, "DB_SHARDS", 2)
+    monkeypatch.setattr(database, "DB_SHARD_PATH", "{root}-shard{n}{ext}")
+    assert shard_path(1) == str(tmp_path / "app-shard1.db")
+    assert all_database_paths() == [str(tmp_path / name) for name in ("app.db", "app-shard0.db", "app-shard1.db")]
+    assert database_path() == str(tmp_path / "app.db")
+    assert database_path(shard=0) == str(tmp_path / "app-shard0.db")
+
+
+def test_every_shard_gets_the_full_schema(sharded):
+    catalog_schema, catalog_applied = schema(str(sharded / "app.db"))
+    assert len(catalog_applied) == len(migrate.get_migration_files())
+    for n in range(4):
+        path = sharded / f"app-shard{n}.db"
+        assert path.exists()
+        assert schema(str(path)) == (catalog_schema, catalog_applied)
+
+
+def test_user_data_lands_in_its_shard_only(sharded):
+    user_id = 2  # shard 0
+    with get_db() as conn:
+        conn.execute("INSERT INTO users (id, email, password_hash) VALUES (?, 'a@example.com', 'x')", (user_id,))
+    with get_db(user_id=user_id) as conn:
+        conn.execute("INSERT INTO folders (name, user_id) VALUES ('home', ?)", (user_id,))
+
+    counts = {}
+    for path in all_database_paths():
+        conn = sqlite3.connect(path)
+        counts[os.path.basename(path)] = conn.execute("SELECT COUNT(*) FROM folders").fetchone()[0]
+        conn.close()
+    assert counts == {"app.db": 0, "app-shard0.db": 1, "app-shard1.db": 0, "app-shard2.db": 0, "app-shard3.db": 0}
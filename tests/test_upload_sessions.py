@@ -0,0 +1,133 @@
+"""Resumable upload sessions (``app.upload_sessions``): part storage, completeness checks, assembly.
+
+Usage: python -m pytest tests/test_upload_sessions.py
+"""
+import hashlib
+import os
+
+import pytest
+
+from app.storage import SpooledUpload
+from app.upload_sessions import (
+    assemble,
+    completion_errors,
+    expected_part_size,
+    expected_parts,
+    expire_sessions,
+    list_parts,
+    put_part,
+)
+
+CHUNK = 1000
+NOW = 1700000000
+
+
+def spooled(data):
+    upload = SpooledUpload(max_memory=256)
+    upload.write(data)
+    return upload
+
+
+def parts(*sizes):
+    """Rows as ``list_parts`` returns them, for numbered parts of the given sizes (None skips a number)."""
+    return [{"part_number": n, "size": size} for n, size in enumerate(sizes) if size is not None]
+
+
+@pytest.fixture
+def session(db, cursor):
+    cursor.execute("INSERT INTO users (id, email, password_hash) VALUES (1, 'a@example.com', 'x')")
+    cursor.execute(
+        "INSERT INTO upload_sessions (id, user_id, name, chunk_size, created_at, expires_at) "
+        "VALUES ('s1', 1, 'big.bin', ?, ?, ?)",
+        (CHUNK, NOW, NOW + 60),
+    )
+    db.commit()
+    return "s1"
+
+
+@pytest.mark.parametrize("total, count, last", [(0, 0, None), (1, 1, 1), (1000, 1, 1000), (1001, 2, 1), (2500, 3, 500)])
+def test_expected_parts(total, count, last):
+    assert expected_parts(total, CHUNK) == count
+    if count:
+        assert expected_part_size(total, CHUNK, count - 1) == last
+        assert expected_part_size(total, CHUNK, count) == 0
+
+
+def test_complete_with_declared_size():
+    assert completion_errors(parts(1000, 1000, 500), 2500, CHUNK) == []
+
+
+def test_complete_without_declared_size():
+    assert completion_errors(parts(1000, 1000, 17), None, CHUNK) == []
+
+
+def test_missing_parts():
+    assert completion_errors(parts(1000, None, 500), 2500, CHUNK) == ["Missing parts: 1"]
+    assert completion_errors(parts(None, 1000, 7), None, CHUNK) == ["Missing parts: 0"]
+
+
+def test_missing_parts_are_truncated():
+    errors = completion_errors([], 30 * CHUNK, CHUNK)
+    assert errors == ["Missing parts: " + ", ".join(map(str, range(20))) + ", ..."]
+
+
+def test_parts_beyond_declared_size():
+    assert completion_errors(parts(1000, 1000, 500, 10), 2500, CHUNK) == [
+        "Unexpected parts beyond the declared size: 3"
+    ]
+
+
+def test_wrong_part_sizes():
+    assert completion_errors(parts(1000, 999, 500), 2500, CHUNK) == ["Part 1 has 999 bytes, expected 1000"]
+    assert completion_errors(parts(1000, 1000, 400), 2500, CHUNK) == ["Part 2 has 400 bytes, expected 500"]
+    assert completion_errors(parts(900, 1000, 3), None, CHUNK) == ["Part 0 has 900 bytes, expected 1000"]
+
+
+def test_empty_session():
+    assert completion_errors([], 0, CHUNK) == []
+    assert completion_errors([], None, CHUNK) == []
+
+
+def test_parts_in_any_order_assemble_in_order(db, cursor, session):
+    data = os.urandom(2500)
+    for n in (2, 0, 1):
+        put_part(cursor, session, n, spooled(data[n * CHUNK:(n + 1) * CHUNK]))
+    rows = list_parts(cursor, session)
+    assert [row["part_number"] for row in rows] == [0, 1, 2]
+    assert [row["sha256"] for row in rows] == [
+        hashlib.sha256(data[n * CHUNK:(n + 1) * CHUNK]).hexdigest() for n in range(3)
+    ]
+    assert completion_errors(rows, len(data), CHUNK) == []
+
+    with SpooledUpload(max_memory=256) as target:
+        assemble(db, rows, target)
+        assert target.size == len(data)
+        assert target.checksum == hashlib.sha256(data).hexdigest()
+        assert target.peek(len(data)) == data
+
+
+def test_resent_part_replaces_the_old_one(db, cursor, session):
+    put_part(cursor, session, 0, spooled(b"a" * CHUNK))
+    put_part(cursor, session, 0, spooled(b"b" * CHUNK))
+    rows = list_parts(cursor, session)
+    assert len(rows) == 1
+    with SpooledUpload() as target:
+        assemble(db, rows, target)
+        assert target.peek(CHUNK) == b"b" * CHUNK
+
+
+def test_empty_part(db, cursor, session):
+    put_part(cursor, session, 0, spooled(b""))
+    rows = list_parts(cursor, session)
+    assert [row["size"] for row in rows] == [0]
+    with SpooledUpload() as target:
+        assemble(db, rows, target)
+        assert target.size == 0
+
+
+def test_expire_sessions(cursor, session):
+    put_part(cursor, session, 0, spooled(b"x" * 10))
+    assert expire_sessions(cursor, NOW) == 0
+    assert expire_sessions(cursor, NOW + 60) == 1
+    assert cursor.execute("SELECT COUNT(*) FROM upload_sessions").fetchone()[0] == 0
+    assert cursor.execute("SELECT COUNT(*) FROM upload_parts").fetchone()[0] == 0
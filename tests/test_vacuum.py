@@ -0,0 +1,101 @@
+"""Incremental vacuum (migration 014, ``app.vacuum``).
+
+Usage: python -m pytest tests/test_vacuum.py
+"""
+import asyncio
+import os
+
+import pytest
+
+from app import database, vacuum
+from app.admission import HEAVY, admission
+from app.storage import insert_file
+from app.vacuum import reclaim, storage_stats, vacuum_step
+
+USER = 1
+
+
+@pytest.fixture
+def free_pages(db, cursor):
+    """Deletes a file of a few hundred pages; returns the resulting freelist size."""
+    cursor.execute("INSERT INTO users (id, email, password_hash) VALUES (?, 'a@example.com', 'x')", (USER,))
+    file_id = insert_file(
+        cursor, name="big.bin", data=os.urandom(2 * 1024 * 1024), mime_type="image/png", user_id=USER,
+        parent_folder_id=None,
+    )["id"]
+    db.commit()
+    cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
+    db.commit()
+    free = storage_stats(cursor)["freelist_count"]
+    assert free > 400
+    return free
+
+
+@pytest.fixture
+def app_db(db_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_PATH", db_path)
+    monkeypatch.setattr(database, "DB_SHARDS", 1)
+    monkeypatch.setattr(vacuum, "VACUUM_PAUSE", 0)
+    yield db_path
+    database.close_pool()
+
+
+def test_vacuum_step_returns_free_pages(cursor, free_pages):
+    before = storage_stats(cursor)
+    assert before["auto_vacuum"] == "incremental"
+
+    assert vacuum_step(cursor, 100) == 100
+    assert storage_stats(cursor)["freelist_count"] == free_pages - 100
+
+    assert vacuum_step(cursor, free_pages) == free_pages - 100
+    after = storage_stats(cursor)
+    assert after["freelist_count"] == 0
+    assert after["page_count"] == before["page_count"] - free_pages
+    assert vacuum_step(cursor, 100) == 0
+
+
+def test_reclaim_when_quiet(cursor, free_pages, app_db):
+    assert asyncio.run(reclaim("main", None, min_free_pages=1)) == free_pages
+    assert storage_stats(cursor)["freelist_count"] == 0
+
+
+def test_reclaim_waits_for_enough_free_pages(cursor, free_pages, app_db):
+    assert asyncio.run(reclaim("main", None, min_free_pages=free_pages + 1)) == 0
+    assert storage_stats(cursor)["freelist_count"] == free_pages
+
+
+def test_reclaim_skips_while_a_write_is_in_progress(cursor, free_pages, app_db):
+    async def main():
+        lock = database._get_write_lock(app_db)
+        await lock.acquire()
+        try:
+            assert database.write_in_progress(app_db)
+            return await reclaim("main", None, min_free_pages=1)
+        finally:
+            lock.release()
+
+    assert asyncio.run(main()) == 0
+    assert storage_stats(cursor)["freelist_count"] == free_pages
+
+
+def test_reclaim_skips_while_busy(cursor, free_pages, app_db, monkeypatch):
+    monkeypatch.setattr(vacuum, "ADMISSION_CONTROL", True)
+    monkeypatch.setattr(vacuum, "VACUUM_MAX_IN_FLIGHT", 0)
+
+    async def main():
+        await admission.admit(HEAVY, "busy client", 0)
+        try:
+            return await reclaim("main", None, min_free_pages=1)
+        finally:
+            admission.release(HEAVY, "busy client", 0)
+
+    assert asyncio.run(main()) == 0
+    assert storage_stats(cursor)["freelist_count"] == free_pages
+
+
+def test_reclaim_skips_when_load_is_unknown(cursor, free_pages, app_db, monkeypatch):
+    monkeypatch.setattr(vacuum, "ADMISSION_CONTROL", False)
+    monkeypatch.setattr(vacuum, "METRICS_ENABLED", False)
+    assert vacuum.requests_in_flight() is None
+    assert asyncio.run(reclaim("main", None, min_free_pages=1)) == 0
+    assert storage_stats(cursor)["freelist_count"] == free_pages